@@ -9,6 +9,39 @@ export function useUnifiedTimeline(stockData: StockData | null) {
   return useMemo(() => {
     if (!stockData) return null;
 
+    // 後端已提供合併好的事件流：依序走訪，沿用最近一筆成交／五檔索引
+    if (stockData.timeline) {
+      const { types, indices } = stockData.timeline;
+      const timestamps: string[] = [];
+      const data: { timestamp: string; tradeIndex: number; depthIndex: number }[] = [];
+      let tradeIndex = -1;
+      let depthIndex = -1;
+
+      for (let i = 0; i < types.length; i++) {
+        let timestamp: string;
+        if (types[i] === 0) {
+          tradeIndex = indices[i];
+          timestamp = stockData.chart!.timestamps[tradeIndex];
+        } else {
+          depthIndex = indices[i];
+          timestamp = stockData.depth_history[depthIndex].timestamp;
+        }
+
+        // 相同時間點合併為一筆，索引取該時間點最後一筆
+        if (timestamp === timestamps[timestamps.length - 1]) {
+          data[data.length - 1] = { timestamp, tradeIndex, depthIndex };
+        } else {
+          timestamps.push(timestamp);
+          data.push({ timestamp, tradeIndex, depthIndex });
+        }
+      }
+
+      return {
+        timestamps,
+        data,
+      };
+    }
+
     // 收集所有時間戳
     const timeSet = new Set<string>();
 
@@ -88,20 +88,36 @@ export const useStockStore = create<StockStore>((set, get) => ({
       const stockData = await stockAPI.getStockData(date, stockCode);
 
       // 建立統一時間軸（合併成交和五檔的所有時間點）
-      const unifiedTimestamps = new Set<string>();
+      let sortedTimestamps: string[];
+
+      if (stockData.timeline) {
+        // 後端已預先合併並排序，只需依序走訪（相同時間點只保留一次）
+        const { types, indices } = stockData.timeline;
+        sortedTimestamps = [];
+        for (let i = 0; i < types.length; i++) {
+          const timestamp = types[i] === 0
+            ? stockData.chart!.timestamps[indices[i]]
+            : stockData.depth_history[indices[i]].timestamp;
+          if (timestamp !== sortedTimestamps[sortedTimestamps.length - 1]) {
+            sortedTimestamps.push(timestamp);
+          }
+        }
+      } else {
+        const unifiedTimestamps = new Set<string>();
 
-      // 添加成交時間
-      if (stockData.chart?.timestamps) {
-        stockData.chart.timestamps.forEach(t => unifiedTimestamps.add(t));
-      }
+        // 添加成交時間
+        if (stockData.chart?.timestamps) {
+          stockData.chart.timestamps.forEach(t => unifiedTimestamps.add(t));
+        }
 
-      // 添加五檔時間
-      if (stockData.depth_history) {
-        stockData.depth_history.forEach(d => unifiedTimestamps.add(d.timestamp));
-      }
+        // 添加五檔時間
+        if (stockData.depth_history) {
+          stockData.depth_history.forEach(d => unifiedTimestamps.add(d.timestamp));
+        }
 
-      // 排序並存儲統一時間軸
-      let sortedTimestamps = Array.from(unifiedTimestamps).sort();
+        // 排序並存儲統一時間軸
+        sortedTimestamps = Array.from(unifiedTimestamps).sort();
+      }
 
       // 效能優化：自動過濾
       const currentInterval = get().timelineInterval;
@@ -48,6 +48,14 @@ export interface Statistics {
   change_pct: number;
 }
 
+// 統一時間軸事件流（後端預先合併，type: 0=成交, 1=五檔）
+export interface EventTimeline {
+  types: number[];
+  indices: number[];
+  times_us: number[];
+  minute_index: Record<string, number>;
+}
+
 // 完整股票資料型別
 export interface StockData {
   chart: ChartData | null;
@@ -57,6 +65,7 @@ export interface StockData {
   stats: Statistics | null;
   stock_code: string;
   date: string;
+  timeline?: EventTimeline | null; // 後端預先合併的事件流
   unifiedTimeline?: string[]; // 統一時間軸（合併成交和五檔）
 }
 
@@ -8,22 +8,48 @@ OTC/TSE Quote 批次解碼程式（優化版）
 - 多線程並行處理
 - 自動跳過已處理檔案
 - 詳細的進度顯示和日誌
+- 盤中追蹤模式（--follow）：追蹤當日持續增長的 Quote 檔案，以 checkpoint 續傳
+- 逐階段計時（--json-log）：read / filter / parse / frame_build / sort / write 輸出為 JSON Lines
+- 效能剖析（--profile）：每個 worker 執行緒以 cProfile 剖析，合併為 pstats 與 collapsed stack
+- 每日合併模式（--consolidate date|market）：每個日期（或日期 × 市場）只寫一個 Parquet，
+  各股票佔連續的 row group，footer 的股票索引供 utils.parquet_io 只讀單一股票
+- 寫入設定檔（--writer-profile fast-write|small|fast-read）：壓縮、字典編碼、row group 大小等
+- 五檔去重（--dedup-depth）：略過與同股票前一筆完全相同的五檔快照，略過筆數記錄於日誌
+- 整數 tick 價格（--price-ticks）：價格存成 int32（價格 × 10000），footer 記錄倍率
 """
 import pandas as pd
 import os
 import re
+import shutil
 import glob
+import time
+import argparse
+from datetime import datetime
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
-from typing import Set, Dict
+from typing import Set, Dict, List, Optional
 
 # 導入共用工具
-from utils import load_limit_up_list, get_target_stocks, read_quote_file, setup_logger
-from utils.config import DATA_DIR, DECODED_DIR, LIMIT_UP_FILE, DEFAULT_MAX_WORKERS, MARKETS
-
-
-def process_quote_file(file_path: Path, target_stocks: Set[str], date_str: str, output_dir: Path, logger) -> int:
+from utils import (load_limit_up_list, get_target_stocks, read_quote_file, setup_logger,
+                   log_event, log_stage_summary, StageTimer)
+from utils.config import (DATA_DIR, DECODED_DIR, CONSOLIDATED_DIR, LIMIT_UP_FILE, DEFAULT_MAX_WORKERS, MARKETS,
+                          LIVE_CHECKPOINT_DIR, LIVE_POLL_INTERVAL, LIVE_FOLLOW_UNTIL)
+from utils.data_loader import parse_quote_line, DepthDeduplicator
+from utils.timeline import sort_canonical
+from utils.parquet_io import (write_decoded_frame, write_live_segment, compact_live_segments, read_live_state,
+                              live_segment_dir, write_consolidated_frames, consolidated_path, read_stock_index,
+                              WRITER_PROFILES, DEFAULT_WRITER_PROFILE)
+from utils.logger import ProgressBar
+from utils.profiling import ProfiledTask, add_profile_arguments, resolve_profile_dir, report_profiles
+from utils.tail_reader import QuoteFileTail, load_checkpoint, save_checkpoint
+
+
+def process_quote_file(file_path: Path, target_stocks: Set[str], date_str: str, output_dir: Path, logger,
+                       timings: Optional[List[dict]] = None,
+                       frames: Optional[Dict[str, pd.DataFrame]] = None,
+                       writer_profile: str = DEFAULT_WRITER_PROFILE, dedup_depth: bool = False,
+                       price_ticks: bool = False) -> int:
     """
     處理單個 Quote 檔案
 
@@ -33,14 +59,35 @@ def process_quote_file(file_path: Path, target_stocks: Set[str], date_str: str,
         date_str: 日期字串
         output_dir: 輸出目錄
         logger: 日誌記錄器
+        timings: 收集各階段計時結果的列表（可選）
+        frames: 每日合併模式：收集 {股票代碼: DataFrame}，不寫出個股檔案
+        writer_profile: Parquet 寫入設定檔名稱
+        dedup_depth: 略過與同股票前一筆相同的五檔快照
+        price_ticks: 價格欄位存成 int32 tick（見 utils/price_ticks.py）
 
     Returns:
         成功處理的股票數量
+
+    各階段耗時以結構化事件 stage_timing 輸出：
+    檔案層級（read / filter / parse）與股票層級（frame_build / sort / write）
     """
     logger.info(f"處理: {file_path.name}")
+    market = file_path.name.split('Quote')[0]
 
     # 讀取並解析資料
-    stock_data, stats = read_quote_file(file_path, target_stocks, date_str)
+    file_timer = StageTimer(date=date_str, market=market, file=file_path.name,
+                            bytes=file_path.stat().st_size)
+    stock_data, stats = read_quote_file(file_path, target_stocks, date_str, timer=file_timer,
+                                        dedup_depth=dedup_depth)
+    file_timer.context['lines'] = stats['lines']
+    if dedup_depth:
+        file_timer.context['depth_dropped'] = stats['depth_dropped']
+        log_event(logger, 'depth_dedup', date=date_str, market=market, file=file_path.name,
+                  kept=stats['depth'], dropped=stats['depth_dropped'],
+                  by_stock=stats['depth_dropped_by_stock'])
+    log_event(logger, 'stage_timing', **file_timer.as_dict())
+    if timings is not None:
+        timings.append(file_timer.as_dict())
 
     if not stock_data:
         logger.warning(f"  無法讀取資料")
@@ -48,29 +95,44 @@ def process_quote_file(file_path: Path, target_stocks: Set[str], date_str: str,
 
     # 保存資料
     saved_count = 0
-    output_dir.mkdir(parents=True, exist_ok=True)
+    if frames is None:
+        output_dir.mkdir(parents=True, exist_ok=True)
 
     for stock_code, records in stock_data.items():
         if not records:
             continue
 
+        stock_timer = StageTimer(date=date_str, market=market, stock=stock_code, rows=len(records))
+
         # 轉換為 DataFrame
-        df = pd.DataFrame(records)
+        with stock_timer.stage('frame_build'):
+            df = pd.DataFrame(records)
 
-        # 按時間排序
-        if 'Datetime' in df.columns:
-            df = df.sort_values('Datetime').reset_index(drop=True)
+        # 依正規順序（時間、序號）排序；已依時間嚴格遞增時只做 O(n) 檢查
+        with stock_timer.stage('sort'):
+            df = sort_canonical(df).reset_index(drop=True)
 
-        # 儲存
-        output_path = output_dir / f"{stock_code}.parquet"
-        df.to_parquet(output_path, index=False)
+        # 儲存（每日合併模式由 process_date 統一寫出）
+        if frames is not None:
+            frames[stock_code] = df
+        else:
+            output_path = output_dir / f"{stock_code}.parquet"
+            with stock_timer.stage('write'):
+                write_decoded_frame(df, output_path, profile=writer_profile, price_ticks=price_ticks)
         saved_count += 1
+        log_event(logger, 'stage_timing', **stock_timer.as_dict())
+        if timings is not None:
+            timings.append(stock_timer.as_dict())
 
-    logger.info(f"  Trade={stats['trade']}, Depth={stats['depth']}, 已保存={saved_count}支")
+    dropped = f", 重複五檔略過={stats['depth_dropped']}" if dedup_depth else ''
+    logger.info(f"  Trade={stats['trade']}, Depth={stats['depth']}{dropped}, 已保存={saved_count}支")
     return saved_count
 
 
-def process_date(date_str: str, limit_up_dict: Dict[str, Set[str]], data_dir: Path, output_base_dir: Path, logger) -> int:
+def process_date(date_str: str, limit_up_dict: Dict[str, Set[str]], data_dir: Path, output_base_dir: Path, logger,
+                 timings: Optional[List[dict]] = None, consolidate: Optional[str] = None,
+                 consolidated_dir: Path = CONSOLIDATED_DIR, writer_profile: str = DEFAULT_WRITER_PROFILE,
+                 dedup_depth: bool = False, price_ticks: bool = False) -> int:
     """
     處理單個日期的 OTC 和 TSE 檔案
 
@@ -80,6 +142,12 @@ def process_date(date_str: str, limit_up_dict: Dict[str, Set[str]], data_dir: Pa
         data_dir: 資料目錄
         output_base_dir: 輸出基礎目錄
         logger: 日誌記錄器
+        timings: 收集各階段計時結果的列表（可選）
+        consolidate: None 為每支股票一個檔案；'date' / 'market' 為每日合併檔（每日期 / 每日期 × 市場一個檔案）
+        consolidated_dir: 每日合併檔輸出目錄
+        writer_profile: Parquet 寫入設定檔名稱
+        dedup_depth: 略過與同股票前一筆相同的五檔快照
+        price_ticks: 價格欄位存成 int32 tick
 
     Returns:
         成功處理的股票數量
@@ -97,6 +165,11 @@ def process_date(date_str: str, limit_up_dict: Dict[str, Set[str]], data_dir: Pa
 
     logger.info(f"  目標股票: {len(target_stocks)}支")
 
+    if consolidate:
+        return consolidate_date(date_str, target_stocks, data_dir, consolidated_dir, logger, timings,
+                                per_market=(consolidate == 'market'), writer_profile=writer_profile,
+                                dedup_depth=dedup_depth, price_ticks=price_ticks)
+
     # 檢查是否已處理完成
     output_dir = output_base_dir / date_str
     if output_dir.exists():
@@ -113,7 +186,9 @@ def process_date(date_str: str, limit_up_dict: Dict[str, Set[str]], data_dir: Pa
         quote_file = data_dir / f"{market}Quote.{date_str}"
 
         if quote_file.exists():
-            saved = process_quote_file(quote_file, target_stocks, date_str, output_dir, logger)
+            saved = process_quote_file(quote_file, target_stocks, date_str, output_dir, logger, timings,
+                                       writer_profile=writer_profile, dedup_depth=dedup_depth,
+                                       price_ticks=price_ticks)
             total_saved += saved
         else:
             logger.warning(f"  未找到 {market}Quote.{date_str}")
@@ -122,10 +197,284 @@ def process_date(date_str: str, limit_up_dict: Dict[str, Set[str]], data_dir: Pa
     return total_saved
 
 
+def consolidate_date(date_str: str, target_stocks: Set[str], data_dir: Path, consolidated_dir: Path, logger,
+                     timings: Optional[List[dict]] = None, per_market: bool = False,
+                     writer_profile: str = DEFAULT_WRITER_PROFILE, dedup_depth: bool = False,
+                     price_ticks: bool = False) -> int:
+    """
+    每日合併模式：將一個日期的目標股票寫成一個（或每市場一個）Parquet
+
+    Args:
+        date_str: 日期字串 (YYYYMMDD)
+        target_stocks: 目標股票代碼集合
+        data_dir: 資料目錄
+        consolidated_dir: 輸出目錄
+        logger: 日誌記錄器
+        timings: 收集各階段計時結果的列表（可選）
+        per_market: True 時每個市場各一個檔案
+        writer_profile: Parquet 寫入設定檔名稱
+        dedup_depth: 略過與同股票前一筆相同的五檔快照
+        price_ticks: 價格欄位存成 int32 tick
+
+    Returns:
+        寫入的股票數量
+    """
+    consolidated_dir.mkdir(parents=True, exist_ok=True)
+    groups = [(market, [market]) for market in MARKETS] if per_market else [(None, MARKETS)]
+
+    # 檢查是否已處理完成（既有合併檔的索引涵蓋所有目標股票）
+    existing = set()
+    for market, _ in groups:
+        existing.update(read_stock_index(consolidated_path(consolidated_dir, date_str, market)))
+    if target_stocks.issubset(existing):
+        logger.info("  合併檔已涵蓋所有目標股票，跳過")
+        return 0
+
+    total_saved = 0
+    for market, markets in groups:
+        frames = {}
+        for quote_market in markets:
+            quote_file = data_dir / f"{quote_market}Quote.{date_str}"
+            if not quote_file.exists():
+                logger.warning(f"  未找到 {quote_market}Quote.{date_str}")
+                continue
+
+            market_frames = {}
+            process_quote_file(quote_file, target_stocks, date_str, None, logger, timings, frames=market_frames,
+                               dedup_depth=dedup_depth)
+            for stock_code, df in market_frames.items():
+                if stock_code in frames:
+                    df = pd.concat([frames[stock_code], df], ignore_index=True)
+                    df = sort_canonical(df).reset_index(drop=True)
+                frames[stock_code] = df
+
+        if not frames:
+            continue
+
+        output_path = consolidated_path(consolidated_dir, date_str, market)
+        write_timer = StageTimer(date=date_str, market=market or 'ALL', stocks=len(frames),
+                                 rows=sum(len(df) for df in frames.values()))
+        with write_timer.stage('write'):
+            index = write_consolidated_frames(frames, output_path, profile=writer_profile, price_ticks=price_ticks)
+        write_timer.context['row_groups'] = sum(end - start for start, end in index.values())
+        write_timer.context['output_bytes'] = output_path.stat().st_size
+        log_event(logger, 'stage_timing', **write_timer.as_dict())
+        if timings is not None:
+            timings.append(write_timer.as_dict())
+
+        logger.info(f"  已寫入合併檔 {output_path.name}：{len(index)}支，"
+                    f"{write_timer.context['row_groups']} 個 row group")
+        total_saved += len(index)
+
+    logger.info(f"  日期 {date_str} 完成，共保存 {total_saved} 支股票")
+    return total_saved
+
+
+def append_live_records(stock_code: str, records: List[dict], output_dir: Path,
+                        live_offsets: Dict[str, int], batch: int,
+                        writer_profile: str = DEFAULT_WRITER_PROFILE, price_ticks: bool = False) -> None:
+    """
+    將盤中新增的資料附加到股票的解碼檔案
+
+    第一個批次（batch 0）寫成主檔 {stock}.parquet，之後每個批次寫成分段檔
+    （見 utils.parquet_io.write_live_segment），不讀取、重寫既有資料；
+    追蹤結束時再以 compact_live_segments 合併回主檔
+
+    metadata 記錄各市場已寫入的位移（live_offsets），
+    若寫入後、checkpoint 更新前中斷，重啟時可據此略過已寫入的資料行
+
+    Args:
+        stock_code: 股票代碼
+        records: 新增的記錄
+        output_dir: 輸出目錄
+        live_offsets: {market: 已寫入的位移}
+        batch: 批次編號
+        writer_profile: Parquet 寫入設定檔名稱
+        price_ticks: 價格欄位存成 int32 tick
+    """
+    output_path = output_dir / f"{stock_code}.parquet"
+    df = pd.DataFrame(records)
+
+    if batch == 0:
+        # 重新開始：先清除舊的分段檔，避免被新的主檔視為有效
+        shutil.rmtree(live_segment_dir(output_path), ignore_errors=True)
+        write_decoded_frame(df, output_path, metadata={'live_offsets': live_offsets, 'live_batch': 0},
+                            profile=writer_profile, price_ticks=price_ticks)
+    else:
+        write_live_segment(df, output_path, batch, live_offsets, profile=writer_profile,
+                           price_ticks=price_ticks)
+
+
+def follow_date(date_str: str, limit_up_dict: Dict[str, Set[str]], data_dir: Path, output_base_dir: Path,
+                logger, poll_interval: float = LIVE_POLL_INTERVAL, until: str = LIVE_FOLLOW_UNTIL,
+                writer_profile: str = DEFAULT_WRITER_PROFILE, dedup_depth: bool = False,
+                price_ticks: bool = False) -> int:
+    """
+    盤中追蹤模式：追蹤當日持續增長的 OTC/TSE Quote 檔案
+
+    每次只讀取新增的完整資料行、解析目標股票後小批次寫成分段檔，
+    並以 checkpoint 記錄各市場的位移，重啟後從中斷處繼續；結束時（含中斷）將分段檔合併回解碼檔案
+
+    Args:
+        date_str: 日期字串 (YYYYMMDD)
+        limit_up_dict: 漲停清單字典
+        data_dir: 資料目錄
+        output_base_dir: 輸出基礎目錄
+        logger: 日誌記錄器
+        poll_interval: 沒有新資料時的等待秒數
+        until: 超過此時間（HHMM）且沒有新資料時結束
+        writer_profile: Parquet 寫入設定檔名稱
+        dedup_depth: 略過與同股票前一筆相同的五檔快照（重啟後第一筆一律保留）
+        price_ticks: 價格欄位存成 int32 tick
+
+    Returns:
+        寫入的記錄數
+    """
+    target_stocks = get_target_stocks(limit_up_dict, date_str)
+    if not target_stocks:
+        logger.info("  無目標股票，結束")
+        return 0
+
+    output_dir = output_base_dir / date_str
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    checkpoint_file = LIVE_CHECKPOINT_DIR / f"{date_str}.json"
+    offsets = load_checkpoint(checkpoint_file)
+    tails = {market: QuoteFileTail(data_dir / f"{market}Quote.{date_str}", offsets.get(market, 0))
+             for market in MARKETS}
+
+    # 各股票檔案中已寫入的位移（可能比 checkpoint 新）與最後的批次編號；
+    # 只有盤中追蹤模式寫出的檔案才續寫，其他既有檔案視為重新開始
+    stock_offsets = {}
+    last_batches = {}
+    for stock_code in target_stocks:
+        stock_offsets[stock_code], last_batches[stock_code] = read_live_state(
+            output_dir / f"{stock_code}.parquet")
+
+    logger.info(f"  目標股票: {len(target_stocks)}支，起始位移: {offsets or '無 checkpoint'}")
+
+    stats = {'trade': 0, 'depth': 0, 'error': 0}
+    total_written = 0
+    deduplicator = DepthDeduplicator() if dedup_depth else None
+
+    try:
+        while True:
+            got_new_lines = False
+
+            for market, tail in tails.items():
+                lines = tail.read_new_lines()
+                if not lines:
+                    continue
+                got_new_lines = True
+
+                pending = {}
+                for end_offset, line in lines:
+                    result = parse_quote_line(line, target_stocks, date_str)
+                    if result is None:
+                        continue
+
+                    stock_code, kind, parsed = result
+                    if end_offset <= stock_offsets[stock_code].get(market, 0):
+                        continue  # 上次中斷前已寫入
+
+                    if parsed:
+                        if deduplicator is not None and kind == 'depth' and deduplicator.is_duplicate(parsed):
+                            continue
+                        pending.setdefault(stock_code, []).append(parsed)
+                        stats[kind] += 1
+                    else:
+                        stats['error'] += 1
+
+                for stock_code, records in pending.items():
+                    stock_offsets[stock_code][market] = tail.offset
+                    last_batch = last_batches[stock_code]
+                    batch = 0 if last_batch is None else last_batch + 1
+                    append_live_records(stock_code, records, output_dir, stock_offsets[stock_code], batch,
+                                        writer_profile, price_ticks)
+                    last_batches[stock_code] = batch
+                    total_written += len(records)
+
+                offsets[market] = tail.offset
+                save_checkpoint(checkpoint_file, offsets)
+
+                if pending:
+                    logger.info(f"  [{market}] +{sum(len(r) for r in pending.values())} 筆 "
+                                f"({len(pending)}支)，位移={tail.offset}")
+
+            if not got_new_lines:
+                if datetime.now().strftime('%H%M') >= until:
+                    break
+                time.sleep(poll_interval)
+
+    except KeyboardInterrupt:
+        logger.info("  收到中斷，checkpoint 已保存")
+
+    # 分段檔合併回主檔：整日資料只在結束時排序、重寫一次
+    compacted = 0
+    for stock_code in target_stocks:
+        if compact_live_segments(output_dir / f"{stock_code}.parquet", writer_profile, price_ticks):
+            compacted += 1
+    if compacted:
+        logger.info(f"  盤中分段檔已合併回 {compacted} 支股票的解碼檔案")
+
+    dropped = f", 重複五檔略過={deduplicator.dropped}" if deduplicator is not None else ''
+    logger.info(f"  Trade={stats['trade']}, Depth={stats['depth']}, Error={stats['error']}{dropped}, "
+                f"寫入={total_written}筆")
+    if deduplicator is not None:
+        log_event(logger, 'depth_dedup', date=date_str, kept=stats['depth'], dropped=deduplicator.dropped,
+                  by_stock=deduplicator.by_stock)
+    return total_written
+
+
 def main():
     """主程式"""
+    parser = argparse.ArgumentParser(description='OTC/TSE Quote 批次解碼程式')
+    parser.add_argument('--follow', action='store_true',
+                        help='盤中追蹤模式：追蹤持續增長的當日 Quote 檔案')
+    parser.add_argument('--date', type=str, default=datetime.now().strftime('%Y%m%d'),
+                        help='追蹤模式的日期 (YYYYMMDD，預設: 今天)')
+    parser.add_argument('--interval', type=float, default=LIVE_POLL_INTERVAL,
+                        help=f'追蹤模式：無新資料時的等待秒數 (預設: {LIVE_POLL_INTERVAL})')
+    parser.add_argument('--until', type=str, default=LIVE_FOLLOW_UNTIL,
+                        help=f'追蹤模式：超過此時間 (HHMM) 且無新資料即結束 (預設: {LIVE_FOLLOW_UNTIL})')
+    parser.add_argument('--json-log', type=Path, default=None,
+                        help='逐階段計時等結構化日誌的輸出路徑（JSON Lines，附加寫入）')
+    parser.add_argument('--consolidate', choices=['date', 'market'], default=None,
+                        help='每日合併模式：每個日期 (date) 或日期 × 市場 (market) 只寫一個 Parquet，'
+                             f'附股票 row group 索引，輸出至 {CONSOLIDATED_DIR}（預設: 每支股票一個檔案）')
+    parser.add_argument('--writer-profile', choices=list(WRITER_PROFILES), default=DEFAULT_WRITER_PROFILE,
+                        help='Parquet 寫入設定檔：fast-write（寫入快）、small（檔案小）、fast-read（讀取快）'
+                             f'（預設: {DEFAULT_WRITER_PROFILE}，比較見 benchmarks/bench_parquet.py）')
+    parser.add_argument('--dedup-depth', action='store_true',
+                        help='略過與同股票前一筆完全相同的五檔快照（略過筆數記錄於日誌）')
+    parser.add_argument('--price-ticks', action='store_true',
+                        help='價格欄位存成 int32 整數 tick（價格 × 10000），讀取端預設自動還原為浮點價格')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profile_dir = resolve_profile_dir(args, 'batch_decode')
+
     # 設定日誌
-    logger = setup_logger('batch_decode')
+    logger = setup_logger('batch_decode', json_log_file=args.json_log)
+
+    if args.follow:
+        if args.consolidate:
+            logger.error("錯誤: 盤中追蹤模式不支援 --consolidate（請於收盤後再合併）")
+            return
+        if not LIMIT_UP_FILE.exists():
+            logger.error(f"錯誤: 找不到漲停清單檔案 {LIMIT_UP_FILE}")
+            return
+
+        logger.info("=" * 80)
+        logger.info(f"盤中追蹤模式: {args.date}")
+        logger.info("=" * 80)
+        limit_up_dict = load_limit_up_list(LIMIT_UP_FILE)
+        follow = ProfiledTask(follow_date, profile_dir, args.profile_memory) if profile_dir else follow_date
+        follow(args.date, limit_up_dict, DATA_DIR, DECODED_DIR, logger,
+               poll_interval=args.interval, until=args.until, writer_profile=args.writer_profile,
+               dedup_depth=args.dedup_depth, price_ticks=args.price_ticks)
+        if profile_dir:
+            report_profiles(profile_dir, logger, top=args.profile_top)
+        return
 
     logger.info("=" * 80)
     logger.info("OTC/TSE Quote 批次解碼程式（優化版）")
@@ -176,19 +525,33 @@ def main():
     # 多線程處理
     max_workers = DEFAULT_MAX_WORKERS
     logger.info(f"\n將使用 {max_workers} 個線程並行處理")
+    logger.info(f"Parquet 寫入設定檔: {args.writer_profile}{'（整數 tick 價格）' if args.price_ticks else ''}")
     logger.info("\n開始處理...")
 
     total_files_saved = 0
     completed = {'count': 0}
     lock = threading.Lock()
+    timings = []
+    progress = ProgressBar(len(dates_to_process), '解碼', workers=max_workers, logger=logger, display=False)
+    run_date = ProfiledTask(process_date, profile_dir, args.profile_memory) if profile_dir else process_date
 
     def process_with_progress(date_str):
         """帶進度顯示的處理函數"""
         try:
-            saved = process_date(date_str, limit_up_dict, DATA_DIR, DECODED_DIR, logger)
+            start = time.perf_counter()
+            date_timings = []
+            saved = run_date(date_str, limit_up_dict, DATA_DIR, DECODED_DIR, logger, date_timings,
+                             consolidate=args.consolidate, writer_profile=args.writer_profile,
+                             dedup_depth=args.dedup_depth, price_ticks=args.price_ticks)
+            file_timings = [t for t in date_timings if 'file' in t]
+            progress.update(1, bytes=sum(t['bytes'] for t in file_timings),
+                            lines=sum(t['lines'] for t in file_timings),
+                            worker=threading.current_thread().name,
+                            busy_seconds=time.perf_counter() - start)
             with lock:
+                timings.extend(date_timings)
                 completed['count'] += 1
-                logger.info(f"\n[進度: {completed['count']}/{len(dates_to_process)}]")
+                logger.info(f"\n[進度: {progress.status()}]")
             return saved
         except Exception as e:
             logger.error(f"\n處理 {date_str} 時發生錯誤: {e}")
@@ -204,12 +567,18 @@ def main():
                 total_files_saved += saved
             except Exception as e:
                 logger.error(f"執行錯誤: {e}")
+    progress.close()
 
     logger.info("\n" + "=" * 80)
     logger.info("批次處理完成！")
     logger.info(f"處理日期數: {len(dates_to_process)}")
     logger.info(f"保存檔案數: {total_files_saved}")
-    logger.info(f"輸出目錄: {DECODED_DIR}")
+    logger.info(f"輸出目錄: {CONSOLIDATED_DIR if args.consolidate else DECODED_DIR}")
+    if args.dedup_depth:
+        logger.info(f"重複五檔略過: {sum(t.get('depth_dropped', 0) for t in timings)} 筆")
+    log_stage_summary(logger, timings)
+    if profile_dir:
+        report_profiles(profile_dir, logger, top=args.profile_top)
     logger.info("=" * 80)
 
 
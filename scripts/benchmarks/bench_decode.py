@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+解碼流程基準測試
+逐階段量測 Quote 解碼流程：行過濾、Trade 解析、Depth 解析、時間戳轉換、DataFrame 建立、Parquet 寫入，
+以及 read_quote_file 與 batch_decode.process_quote_file 的整體耗時
+
+結果（行/秒、MB/秒、峰值 RSS）存為 JSON；指定 --compare 時與基準結果比較，
+任一階段退步超過門檻即以非零結束碼結束，可直接放進 CI 或每晚排程
+
+使用範例:
+    python scripts/benchmarks/bench_decode.py                       # 使用合成資料
+    python scripts/benchmarks/bench_decode.py --stocks 200 --ticks 5000 --output base.json
+    python scripts/benchmarks/bench_decode.py --compare base.json --threshold 0.15
+    python scripts/benchmarks/bench_decode.py --quote-file data/TSEQuote.20251031 --date 20251031
+"""
+import argparse
+import json
+import logging
+import sys
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+from common import best_of, peak_rss_mb, environment_info, save_results, compare_results, print_stage_table
+from utils import load_limit_up_list, get_target_stocks, read_quote_file
+from utils.config import LIMIT_UP_FILE
+from utils.parser import parse_trade_line, parse_depth_line, parse_timestamp
+from utils.parquet_io import write_decoded_frame
+from batch_decode import process_quote_file
+from generate_synthetic_quotes import generate_dataset
+
+
+def _stage(seconds: float, lines: int = 0, megabytes: float = 0.0) -> dict:
+    """組成單一階段的結果"""
+    return {
+        'seconds': seconds,
+        'lines_per_sec': lines / seconds if lines and seconds > 0 else None,
+        'mb_per_sec': megabytes / seconds if megabytes and seconds > 0 else None,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def filter_lines(quote_file: Path, target_stocks: set) -> tuple:
+    """行過濾階段：只保留目標股票的 Trade / Depth 資料行"""
+    trade_lines = []
+    depth_lines = []
+    total = 0
+    with open(quote_file, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            total += 1
+            if not line.startswith('Trade,') and not line.startswith('Depth,'):
+                continue
+            fields = line.split(',', 2)
+            if len(fields) < 2 or fields[1].strip() not in target_stocks:
+                continue
+            (trade_lines if line.startswith('Trade,') else depth_lines).append(line)
+    return trade_lines, depth_lines, total
+
+
+def run_decode_benchmark(quote_file: Path, date_str: str, target_stocks: set, repeat: int) -> dict:
+    """
+    執行解碼流程各階段的基準測試
+
+    Args:
+        quote_file: Quote 檔案
+        date_str: 日期 (YYYYMMDD)
+        target_stocks: 目標股票
+        repeat: 每階段重複次數（取最短）
+
+    Returns:
+        {'stages': {...}, 'input': {...}}
+    """
+    file_mb = quote_file.stat().st_size / 1024 / 1024
+    stages = {}
+
+    seconds, (trade_lines, depth_lines, total_lines) = best_of(
+        lambda: filter_lines(quote_file, target_stocks), repeat)
+    stages['line_filter'] = _stage(seconds, total_lines, file_mb)
+
+    seconds, trades = best_of(lambda: [parse_trade_line(line, date_str) for line in trade_lines], repeat)
+    stages['trade_parse'] = _stage(seconds, len(trade_lines))
+
+    seconds, depths = best_of(lambda: [parse_depth_line(line, date_str) for line in depth_lines], repeat)
+    stages['depth_parse'] = _stage(seconds, len(depth_lines))
+
+    timestamps = [line.split(',', 3)[2] for line in trade_lines + depth_lines]
+    seconds, _ = best_of(lambda: [parse_timestamp(ts, date_str) for ts in timestamps], repeat)
+    stages['timestamp_convert'] = _stage(seconds, len(timestamps))
+
+    by_stock = {}
+    for record in trades + depths:
+        if record:
+            by_stock.setdefault(record['StockCode'], []).append(record)
+
+    def build_frames():
+        return {stock: pd.DataFrame(records).sort_values('Datetime').reset_index(drop=True)
+                for stock, records in by_stock.items()}
+
+    record_count = sum(len(records) for records in by_stock.values())
+    seconds, frames = best_of(build_frames, repeat)
+    stages['frame_build'] = _stage(seconds, record_count)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_path = Path(work_dir)
+
+        def write_frames():
+            for stock, df in frames.items():
+                write_decoded_frame(df, work_path / f"{stock}.parquet")
+            return sum(p.stat().st_size for p in work_path.glob('*.parquet'))
+
+        seconds, written_bytes = best_of(write_frames, repeat)
+        stages['parquet_write'] = _stage(seconds, record_count, written_bytes / 1024 / 1024)
+
+        seconds, _ = best_of(lambda: read_quote_file(quote_file, target_stocks, date_str), repeat)
+        stages['read_quote_file'] = _stage(seconds, total_lines, file_mb)
+
+        logger = logging.getLogger('bench_decode.silent')
+        logger.addHandler(logging.NullHandler())
+        logger.propagate = False
+        seconds, _ = best_of(
+            lambda: process_quote_file(quote_file, target_stocks, date_str, work_path / 'e2e', logger), repeat)
+        stages['process_quote_file'] = _stage(seconds, total_lines, file_mb)
+
+    return {
+        'input': {
+            'quote_file': str(quote_file),
+            'date': date_str,
+            'file_mb': round(file_mb, 2),
+            'total_lines': total_lines,
+            'trade_lines': len(trade_lines),
+            'depth_lines': len(depth_lines),
+            'target_stocks': len(target_stocks)
+        },
+        'stages': stages
+    }
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='解碼流程基準測試')
+    parser.add_argument('--quote-file', type=Path, default=None, help='Quote 檔案（未指定時使用合成資料）')
+    parser.add_argument('--date', type=str, default='20251031', help='日期 (YYYYMMDD)')
+    parser.add_argument('--lup-file', type=Path, default=LIMIT_UP_FILE, help='漲停清單（搭配 --quote-file）')
+    parser.add_argument('--stocks', type=int, default=100, help='合成資料：每市場股票數 (預設: 100)')
+    parser.add_argument('--ticks', type=int, default=2000, help='合成資料：每檔成交筆數 (預設: 2000)')
+    parser.add_argument('--seed', type=int, default=42, help='合成資料：亂數種子 (預設: 42)')
+    parser.add_argument('--repeat', type=int, default=3, help='每階段重複次數，取最短 (預設: 3)')
+    parser.add_argument('--output', type=Path, default=None, help='結果 JSON 路徑')
+    parser.add_argument('--compare', type=Path, default=None, help='基準結果 JSON，退步超過門檻時失敗')
+    parser.add_argument('--threshold', type=float, default=0.15, help='容許退步比例 (預設: 0.15)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as synthetic_dir:
+        if args.quote_file is None:
+            synthetic_path = Path(synthetic_dir)
+            lup_file = generate_dataset(synthetic_path, [args.date], stocks=args.stocks, ticks=args.ticks,
+                                        seed=args.seed, verbose=False)
+            quote_file = synthetic_path / f"TSEQuote.{args.date}"
+        else:
+            quote_file = args.quote_file
+            lup_file = args.lup_file
+
+        target_stocks = get_target_stocks(load_limit_up_list(lup_file), args.date)
+        results = run_decode_benchmark(quote_file, args.date, target_stocks, args.repeat)
+
+    results['benchmark'] = 'decode'
+    results['environment'] = environment_info()
+    if args.quote_file is None:
+        results['input'].update({'synthetic': True, 'stocks': args.stocks, 'ticks': args.ticks, 'seed': args.seed})
+
+    print("=" * 80)
+    print(f"解碼流程基準測試: {results['input']['file_mb']} MB, {results['input']['total_lines']:,} 行")
+    print("=" * 80)
+    print_stage_table(results['stages'])
+
+    output_path = save_results(results, 'decode', args.output)
+    print(f"\n結果已儲存: {output_path}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n效能退步（門檻 {args.threshold * 100:.0f}%）:")
+            for item in regressions:
+                print(f"  {item}")
+            sys.exit(1)
+        print(f"\n與基準相比無退步（門檻 {args.threshold * 100:.0f}%）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+HTTP 負載測試
+對 web_viewer.py、server/python/parquet_server.py、server/python/static_server.py 發送貼近實際的請求組合：
+每個虛擬使用者重複「日期列表 → 股票列表 → 個股資料」的瀏覽流程，
+個股以 --hot-ratio 的機率落在少數熱門股，其餘落在冷門長尾
+
+量測項目：
+- 冷快取 vs 熱快取：每檔股票第一次請求與第二次請求的延遲分佈
+- 逐步提高併發數時各路由的 p50/p95/p99 延遲、吞吐量與錯誤率
+
+三個伺服器的 API 路由相同，可直接以 --url 指向已啟動的伺服器，
+或以 --launch 由本工具啟動全新行程（確保冷快取量測不受先前請求影響）
+
+注意：負載產生器使用執行緒，極高併發時客戶端本身可能成為瓶頸，必要時可在多台機器同時執行
+
+使用範例:
+    python scripts/benchmarks/bench_http.py --launch parquet
+    python scripts/benchmarks/bench_http.py --launch static --concurrency 1,8,32 --duration 20
+    python scripts/benchmarks/bench_http.py --url http://localhost:5000 --hot-ratio 0.9
+"""
+import argparse
+import json
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from common import SCRIPTS_DIR, environment_info, save_results, compare_results
+
+PROJECT_ROOT = SCRIPTS_DIR.parent
+
+# 各伺服器的啟動指令（{port} 由 --port 取代）
+LAUNCH_COMMANDS = {
+    'web_viewer': [sys.executable, '-m', 'flask', '--app', 'web_viewer', 'run', '--port', '{port}'],
+    'parquet': [sys.executable, 'server/python/parquet_server.py', '--port', '{port}'],
+    'static': [sys.executable, 'server/python/static_server.py', '--port', '{port}'],
+}
+
+ROUTES = ['dates', 'stocks', 'data']
+
+
+class LoadStats:
+    """累計各路由的延遲、位元組數與錯誤數（執行緒安全）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {route: [] for route in ROUTES}
+        self.errors = {route: 0 for route in ROUTES}
+        self.bytes = 0
+
+    def record(self, route: str, seconds: float, size: int, ok: bool) -> None:
+        with self.lock:
+            if ok:
+                self.latencies[route].append(seconds)
+                self.bytes += size
+            else:
+                self.errors[route] += 1
+
+    def summary(self, elapsed: float) -> Dict[str, dict]:
+        """各路由與全部請求的百分位數、吞吐量與錯誤率"""
+        result = {}
+        all_latencies = []
+        total_errors = 0
+        for route in ROUTES:
+            latencies = self.latencies[route]
+            all_latencies.extend(latencies)
+            total_errors += self.errors[route]
+            result[route] = _percentiles(latencies, self.errors[route], elapsed)
+        result['all'] = _percentiles(all_latencies, total_errors, elapsed)
+        result['all']['mb_per_sec'] = self.bytes / 1024 / 1024 / elapsed if elapsed > 0 else 0
+        return result
+
+
+def _percentiles(latencies: List[float], errors: int, elapsed: float) -> dict:
+    """計算單一路由的統計（秒）"""
+    total = len(latencies) + errors
+    if latencies:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    else:
+        p50 = p95 = p99 = None
+    return {
+        'requests': total,
+        'p50': p50,
+        'p95': p95,
+        'p99': p99,
+        'throughput': total / elapsed if elapsed > 0 else 0,
+        'error_rate': errors / total if total else 0
+    }
+
+
+def fetch(base_url: str, path: str, timeout: float) -> Tuple[float, int, bool, Optional[bytes]]:
+    """
+    發送 GET 請求
+
+    Returns:
+        (秒數, 回應位元組數, 是否成功, 回應內容)
+    """
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(base_url + path, timeout=timeout) as response:
+            body = response.read()
+        return time.perf_counter() - start, len(body), True, body
+    except (urllib.error.URLError, OSError):
+        return time.perf_counter() - start, 0, False, None
+
+
+def discover(base_url: str, max_dates: int, timeout: float) -> Dict[str, List[str]]:
+    """透過 /api/dates 與 /api/stocks/{date} 取得可請求的股票"""
+    _, _, ok, body = fetch(base_url, '/api/dates', timeout)
+    if not ok:
+        raise RuntimeError(f"無法取得日期列表: {base_url}/api/dates")
+
+    universe = {}
+    for date in json.loads(body)[:max_dates]:
+        _, _, ok, body = fetch(base_url, f'/api/stocks/{date}', timeout)
+        if ok:
+            stocks = json.loads(body)
+            if stocks:
+                universe[date] = stocks
+    return universe
+
+
+class RequestMix:
+    """熱門股 / 冷門長尾的請求組合"""
+
+    def __init__(self, universe: Dict[str, List[str]], hot_stocks: int, hot_ratio: float, seed: int):
+        self.pairs = [(date, stock) for date, stocks in universe.items() for stock in stocks]
+        rng = random.Random(seed)
+        rng.shuffle(self.pairs)
+        self.hot = self.pairs[:hot_stocks]
+        self.cold = self.pairs[hot_stocks:] or self.hot
+        self.hot_ratio = hot_ratio
+
+    def pick(self, rng: random.Random) -> Tuple[str, str]:
+        if rng.random() < self.hot_ratio:
+            return rng.choice(self.hot)
+        return rng.choice(self.cold)
+
+
+def browse_session(base_url: str, date: str, stock: str, stats: LoadStats, timeout: float) -> None:
+    """單次瀏覽流程：日期列表 → 股票列表 → 個股資料"""
+    for route, path in (('dates', '/api/dates'),
+                        ('stocks', f'/api/stocks/{date}'),
+                        ('data', f'/api/data/{date}/{stock}')):
+        seconds, size, ok, _ = fetch(base_url, path, timeout)
+        stats.record(route, seconds, size, ok)
+
+
+def run_cache_phase(base_url: str, pairs: List[Tuple[str, str]], timeout: float) -> Dict[str, dict]:
+    """
+    冷快取 vs 熱快取：依序請求每檔股票兩次
+
+    第一次請求反映檔案與伺服器快取都尚未命中的成本，第二次反映熱快取
+    """
+    summaries = {}
+    for phase in ('cold', 'warm'):
+        stats = LoadStats()
+        start = time.perf_counter()
+        for date, stock in pairs:
+            seconds, size, ok, _ = fetch(base_url, f'/api/data/{date}/{stock}', timeout)
+            stats.record('data', seconds, size, ok)
+        summaries[phase] = stats.summary(time.perf_counter() - start)['data']
+    return summaries
+
+
+def run_load_level(base_url: str, mix: RequestMix, concurrency: int, duration: float,
+                   timeout: float, seed: int) -> Dict[str, dict]:
+    """以固定併發數持續發送瀏覽流程 duration 秒"""
+    stats = LoadStats()
+    deadline = time.perf_counter() + duration
+
+    def virtual_user(user_id: int):
+        rng = random.Random(seed * 1000 + user_id)
+        while time.perf_counter() < deadline:
+            date, stock = mix.pick(rng)
+            browse_session(base_url, date, stock, stats, timeout)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for user_id in range(concurrency):
+            executor.submit(virtual_user, user_id)
+    return stats.summary(time.perf_counter() - start)
+
+
+def launch_server(name: str, port: int, startup_timeout: float = 30.0) -> subprocess.Popen:
+    """啟動全新的伺服器行程，等到埠號可連線為止"""
+    command = [part.replace('{port}', str(port)) for part in LAUNCH_COMMANDS[name]]
+    process = subprocess.Popen(command, cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.time() + startup_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"伺服器啟動失敗: {' '.join(command)}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.2)
+
+    process.terminate()
+    raise RuntimeError(f"伺服器未在 {startup_timeout:.0f} 秒內啟動: {' '.join(command)}")
+
+
+def _ms(value: Optional[float]) -> str:
+    return f"{value * 1000:.1f}" if value is not None else '-'
+
+
+def print_level(concurrency: int, summary: Dict[str, dict]) -> None:
+    """輸出單一併發等級的結果"""
+    for route in ROUTES + ['all']:
+        values = summary[route]
+        print(f"{concurrency:>6}  {route:<8}{values['requests']:>9}{_ms(values['p50']):>10}"
+              f"{_ms(values['p95']):>10}{_ms(values['p99']):>10}{values['throughput']:>10.1f}"
+              f"{values['error_rate'] * 100:>8.2f}%")
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='HTTP 負載測試')
+    parser.add_argument('--url', type=str, default=None, help='已啟動伺服器的網址（例如 http://localhost:5000）')
+    parser.add_argument('--launch', choices=sorted(LAUNCH_COMMANDS), default=None,
+                        help='由本工具啟動全新的伺服器行程')
+    parser.add_argument('--port', type=int, default=5055, help='搭配 --launch 使用的埠號 (預設: 5055)')
+    parser.add_argument('--concurrency', type=str, default='1,4,16,64',
+                        help='逐步提高的併發數（逗號分隔，預設: 1,4,16,64）')
+    parser.add_argument('--duration', type=float, default=10.0, help='每個併發等級的秒數 (預設: 10)')
+    parser.add_argument('--hot-stocks', type=int, default=5, help='熱門股數量 (預設: 5)')
+    parser.add_argument('--hot-ratio', type=float, default=0.8, help='請求落在熱門股的比例 (預設: 0.8)')
+    parser.add_argument('--cache-sample', type=int, default=20, help='冷/熱快取量測的股票數 (預設: 20)')
+    parser.add_argument('--max-dates', type=int, default=5, help='最多使用的日期數 (預設: 5)')
+    parser.add_argument('--timeout', type=float, default=30.0, help='單一請求逾時秒數 (預設: 30)')
+    parser.add_argument('--seed', type=int, default=42, help='亂數種子 (預設: 42)')
+    parser.add_argument('--output', type=Path, default=None, help='結果 JSON 路徑')
+    parser.add_argument('--compare', type=Path, default=None, help='基準結果 JSON，p95 退步超過門檻時失敗')
+    parser.add_argument('--threshold', type=float, default=0.15, help='容許退步比例 (預設: 0.15)')
+    args = parser.parse_args()
+
+    if not args.url and not args.launch:
+        parser.error('需指定 --url 或 --launch')
+
+    process = launch_server(args.launch, args.port) if args.launch else None
+    base_url = args.url or f'http://127.0.0.1:{args.port}'
+
+    try:
+        universe = discover(base_url, args.max_dates, args.timeout)
+        if not universe:
+            print("錯誤: 伺服器沒有可用的股票資料")
+            sys.exit(1)
+
+        mix = RequestMix(universe, args.hot_stocks, args.hot_ratio, args.seed)
+        # 冷快取樣本避開熱門股，確保第一次請求確實是冷的
+        cache_pairs = (mix.cold if mix.cold is not mix.hot else mix.pairs)[:args.cache_sample]
+
+        print("=" * 80)
+        print(f"HTTP 負載測試: {base_url}")
+        print(f"日期 {len(universe)} 個，股票日 {len(mix.pairs)} 個，熱門股 {len(mix.hot)} 檔 "
+              f"(比例 {args.hot_ratio:.0%})")
+        print("=" * 80)
+
+        cache = run_cache_phase(base_url, cache_pairs, args.timeout)
+        print(f"\n冷/熱快取（/api/data，{len(cache_pairs)} 檔）:")
+        print(f"{'':<8}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+        for phase, values in cache.items():
+            print(f"{phase:<8}{_ms(values['p50']):>10}{_ms(values['p95']):>10}{_ms(values['p99']):>10}")
+
+        print(f"\n{'併發':>6}  {'路由':<8}{'請求數':>9}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}"
+              f"{'req/s':>10}{'錯誤率':>9}")
+        print('-' * 80)
+        levels = {}
+        for concurrency in [int(c) for c in args.concurrency.split(',')]:
+            levels[concurrency] = run_load_level(base_url, mix, concurrency, args.duration,
+                                                 args.timeout, args.seed)
+            print_level(concurrency, levels[concurrency])
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    stages = {f'cache/{phase}': values for phase, values in cache.items()}
+    for concurrency, summary in levels.items():
+        for route, values in summary.items():
+            stages[f'c{concurrency}/{route}'] = values
+
+    results = {
+        'benchmark': 'http',
+        'environment': environment_info(),
+        'input': {
+            'url': base_url,
+            'server': args.launch,
+            'dates': len(universe),
+            'stock_days': len(mix.pairs),
+            'hot_stocks': len(mix.hot),
+            'hot_ratio': args.hot_ratio,
+            'duration': args.duration
+        },
+        'stages': stages
+    }
+    output_path = save_results(results, f'http-{args.launch or "remote"}', args.output)
+    print(f"\n結果已儲存: {output_path}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold, metric='p95')
+        if regressions:
+            print(f"\n效能退步（門檻 {args.threshold * 100:.0f}%）:")
+            for item in regressions:
+                print(f"  {item}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Parquet 寫入設定檔基準測試
+在相同的逐筆資料上比較 utils.parquet_io.WRITER_PROFILES 各設定檔：
+- 檔案大小（總和與相對 fast-read 的比例）
+- 寫入吞吐量（write_decoded_frame，列/秒、輸出 MB/秒）
+- 讀取吞吐量：完整讀取（pd.read_parquet）與伺服器常見的成交欄位讀取（read_quote_rows）
+
+結果存為 JSON；指定 --compare 時與基準結果比較，任一項退步超過門檻即以非零結束碼結束
+
+使用範例:
+    python scripts/benchmarks/bench_parquet.py                                  # 合成資料
+    python scripts/benchmarks/bench_parquet.py --stocks 100 --ticks 5000
+    python scripts/benchmarks/bench_parquet.py --decoded-dir data/decoded_quotes/20251031
+    python scripts/benchmarks/bench_parquet.py --profiles small,fast-read --output base.json
+"""
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+import pandas as pd
+
+from common import best_of, environment_info, save_results, compare_results
+from utils import load_limit_up_list, get_target_stocks, read_quote_file
+from utils.parquet_io import (WRITER_PROFILES, DEFAULT_WRITER_PROFILE, TRADE_COLUMNS, write_decoded_frame,
+                              read_quote_rows)
+from utils.timeline import sort_canonical
+from generate_synthetic_quotes import generate_dataset
+
+MB = 1024 * 1024
+
+
+def load_synthetic_frames(work_dir: Path, date_str: str, stocks: int, ticks: int, seed: int) -> Dict[str, pd.DataFrame]:
+    """產生合成 Quote 檔並解碼為 {股票代碼: DataFrame}（與 batch_decode 相同的欄位與排序）"""
+    lup_file = generate_dataset(work_dir, [date_str], stocks=stocks, ticks=ticks, seed=seed, verbose=False)
+    target_stocks = get_target_stocks(load_limit_up_list(lup_file), date_str)
+    frames = {}
+    for quote_file in sorted(work_dir.glob(f'*Quote.{date_str}')):
+        stock_data, _ = read_quote_file(quote_file, target_stocks, date_str)
+        for stock, records in stock_data.items():
+            if records:
+                frames[stock] = sort_canonical(pd.DataFrame(records)).reset_index(drop=True)
+    return frames
+
+
+def load_decoded_frames(decoded_dir: Path) -> Dict[str, pd.DataFrame]:
+    """讀取既有的解碼檔案（單一日期目錄）"""
+    return {path.stem: pd.read_parquet(path) for path in sorted(decoded_dir.glob('*.parquet'))}
+
+
+def run_profile(profile: str, frames: Dict[str, pd.DataFrame], work_dir: Path, repeat: int) -> dict:
+    """
+    量測單一設定檔
+
+    Returns:
+        {'write': {...}, 'read_full': {...}, 'read_trades': {...}, 'bytes': 總大小}
+    """
+    profile_dir = work_dir / profile
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    paths = [profile_dir / f'{stock}.parquet' for stock in frames]
+    rows = sum(len(df) for df in frames.values())
+
+    def write_all():
+        for path, df in zip(paths, frames.values()):
+            write_decoded_frame(df, path, profile=profile)
+        return sum(path.stat().st_size for path in paths)
+
+    def read_full():
+        return sum(len(pd.read_parquet(path)) for path in paths)
+
+    def read_trades():
+        return sum(len(read_quote_rows(path, 'Trade', TRADE_COLUMNS)) for path in paths)
+
+    write_seconds, total_bytes = best_of(write_all, repeat)
+    full_seconds, full_rows = best_of(read_full, repeat)
+    trade_seconds, trade_rows = best_of(read_trades, repeat)
+
+    def stage(seconds: float, stage_rows: int) -> dict:
+        return {
+            'seconds': seconds,
+            'rows_per_sec': stage_rows / seconds if seconds > 0 else None,
+            'mb_per_sec': total_bytes / MB / seconds if seconds > 0 else None,
+        }
+
+    return {
+        'bytes': total_bytes,
+        'write': stage(write_seconds, rows),
+        'read_full': stage(full_seconds, full_rows),
+        'read_trades': stage(trade_seconds, trade_rows),
+    }
+
+
+def print_profile_table(profiles: Dict[str, dict]) -> None:
+    """以表格輸出各設定檔結果"""
+    base_bytes = profiles.get(DEFAULT_WRITER_PROFILE, next(iter(profiles.values())))['bytes']
+    print(f"{'設定檔':<14}{'大小MB':>10}{'相對':>8}{'寫入 列/秒':>14}{'完整讀取 列/秒':>18}{'成交讀取 列/秒':>18}")
+    print('-' * 82)
+    for name, result in profiles.items():
+        print(f"{name:<14}{result['bytes'] / MB:>10.2f}{result['bytes'] / base_bytes:>8.2f}"
+              f"{result['write']['rows_per_sec']:>14,.0f}"
+              f"{result['read_full']['rows_per_sec']:>18,.0f}"
+              f"{result['read_trades']['rows_per_sec']:>18,.0f}")
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='Parquet 寫入設定檔基準測試')
+    parser.add_argument('--decoded-dir', type=Path, default=None,
+                        help='既有的解碼資料目錄（單一日期，未指定時使用合成資料）')
+    parser.add_argument('--profiles', type=str, default=','.join(WRITER_PROFILES),
+                        help=f"要比較的設定檔，逗號分隔 (預設: {','.join(WRITER_PROFILES)})")
+    parser.add_argument('--date', type=str, default='20251031', help='合成資料：日期 (YYYYMMDD)')
+    parser.add_argument('--stocks', type=int, default=50, help='合成資料：每市場股票數 (預設: 50)')
+    parser.add_argument('--ticks', type=int, default=3000, help='合成資料：每檔成交筆數 (預設: 3000)')
+    parser.add_argument('--seed', type=int, default=42, help='合成資料：亂數種子 (預設: 42)')
+    parser.add_argument('--repeat', type=int, default=3, help='每項重複次數，取最短 (預設: 3)')
+    parser.add_argument('--output', type=Path, default=None, help='結果 JSON 路徑')
+    parser.add_argument('--compare', type=Path, default=None, help='基準結果 JSON，退步超過門檻時失敗')
+    parser.add_argument('--threshold', type=float, default=0.15, help='容許退步比例 (預設: 0.15)')
+    args = parser.parse_args()
+
+    profile_names: List[str] = [name.strip() for name in args.profiles.split(',') if name.strip()]
+    unknown = [name for name in profile_names if name not in WRITER_PROFILES]
+    if unknown:
+        parser.error(f"未知的設定檔: {', '.join(unknown)}（可用: {', '.join(WRITER_PROFILES)}）")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_path = Path(work_dir)
+        if args.decoded_dir is None:
+            frames = load_synthetic_frames(work_path / 'synthetic', args.date, args.stocks, args.ticks, args.seed)
+        else:
+            frames = load_decoded_frames(args.decoded_dir)
+
+        if not frames:
+            print("沒有可用的資料")
+            sys.exit(1)
+
+        profiles = {name: run_profile(name, frames, work_path / 'out', args.repeat) for name in profile_names}
+
+    rows = sum(len(df) for df in frames.values())
+    results = {
+        'benchmark': 'parquet',
+        'environment': environment_info(),
+        'input': {
+            'source': str(args.decoded_dir) if args.decoded_dir else 'synthetic',
+            'stocks': len(frames),
+            'rows': rows,
+        },
+        'profiles': profiles,
+        # 攤平成 compare_results 使用的 stages 格式
+        'stages': {f'{name}/{item}': result[item] for name, result in profiles.items()
+                   for item in ('write', 'read_full', 'read_trades')},
+    }
+    if args.decoded_dir is None:
+        results['input'].update({'synthetic': True, 'ticks': args.ticks, 'seed': args.seed})
+
+    print("=" * 82)
+    print(f"Parquet 寫入設定檔基準測試: {len(frames)} 支股票, {rows:,} 筆")
+    print("=" * 82)
+    print_profile_table(profiles)
+
+    output_path = save_results(results, 'parquet', args.output)
+    print(f"\n結果已儲存: {output_path}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n效能退步（門檻 {args.threshold * 100:.0f}%）:")
+            for item in regressions:
+                print(f"  {item}")
+            sys.exit(1)
+        print(f"\n與基準相比無退步（門檻 {args.threshold * 100:.0f}%）")
+
+
+if __name__ == "__main__":
+    main()
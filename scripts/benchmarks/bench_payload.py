@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Payload 建構基準測試
+在相同輸入上比較四套 payload 實作，逐區段（chart、depth_history、trades、stats）量測：
+- web_viewer.prepare_*
+- preprocess.prepare_*
+- data_convert.prepare_*
+- parquet_server.convert_parquet_to_json（單一函數，只量測完整轉換）
+
+每個實作在小、中位數、最壞三種股票日上量測耗時、記憶體配置峰值（tracemalloc）與輸出大小，
+並以資料量與耗時估算成長階數，超過門檻時標示可能的非線性（例如 O(n²)）行為
+
+使用範例:
+    python scripts/benchmarks/bench_payload.py                          # 合成資料
+    python scripts/benchmarks/bench_payload.py --sizes 500,5000,20000
+    python scripts/benchmarks/bench_payload.py --decoded-dir data/decoded_quotes/20251031
+"""
+import argparse
+import json
+import math
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from common import SCRIPTS_DIR, best_of, environment_info, save_results, compare_results
+from utils import read_quote_file
+from utils.json_io import encode_json
+from utils.parquet_io import read_decoded_frame
+from generate_synthetic_quotes import SyntheticStock, generate_quote_file, DEFAULT_TRIAL_PERIODS, parse_periods
+
+PROJECT_ROOT = SCRIPTS_DIR.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(PROJECT_ROOT / 'server' / 'python'))
+
+import preprocess
+import data_convert
+import parquet_server
+
+try:
+    import web_viewer
+except ImportError:  # 未安裝 Flask
+    web_viewer = None
+
+# 成長階數超過此值時標示為可能的非線性行為
+SCALING_WARN_EXPONENT = 1.5
+
+
+def build_implementations() -> Dict[str, Dict[str, Callable]]:
+    """
+    建立各實作的區段函數
+
+    每個函數接受 (df, trade_df, depth_df, parquet_path)，返回該區段的輸出
+    """
+    implementations = {}
+
+    if web_viewer is not None:
+        implementations['web_viewer'] = {
+            'chart': lambda df, t, d, p: web_viewer.prepare_chart_data(df),
+            'depth_history': lambda df, t, d, p: web_viewer.prepare_depth_history(df),
+            'trades': lambda df, t, d, p: web_viewer.prepare_trade_details(df),
+            'stats': lambda df, t, d, p: web_viewer.calculate_statistics(df),
+        }
+
+    implementations['preprocess'] = {
+        'chart': lambda df, t, d, p: preprocess.prepare_chart_data(df),
+        'depth_history': lambda df, t, d, p: preprocess.prepare_depth_history(df),
+        'trades': lambda df, t, d, p: preprocess.prepare_trade_details(df),
+        'stats': lambda df, t, d, p: preprocess.calculate_statistics(df),
+    }
+
+    implementations['data_convert'] = {
+        'chart': lambda df, t, d, p: data_convert.prepare_chart_data(t),
+        'depth_history': lambda df, t, d, p: data_convert.prepare_depth_history(d),
+        'trades': lambda df, t, d, p: data_convert.prepare_trade_details(t, d),
+        'stats': lambda df, t, d, p: data_convert.calculate_statistics(t),
+    }
+
+    implementations['parquet_server'] = {
+        'full': lambda df, t, d, p: parquet_server.convert_parquet_to_json(p),
+    }
+
+    return implementations
+
+
+def make_synthetic_stock_day(ticks: int, work_dir: Path, seed: int) -> Path:
+    """產生單一股票日的解碼 Parquet 檔案"""
+    rng = np.random.default_rng(seed)
+    stock = SyntheticStock('2330', 100.0, ticks, False, parse_periods(DEFAULT_TRIAL_PERIODS), 1.5, 0.1, rng)
+    quote_file = work_dir / f"TSEQuote.{ticks}"
+    generate_quote_file(quote_file, [stock])
+
+    stock_data, _ = read_quote_file(quote_file, {'2330'}, '20251031')
+    df = pd.DataFrame(stock_data['2330']).sort_values('Datetime').reset_index(drop=True)
+    parquet_path = work_dir / f"{ticks}.parquet"
+    df.to_parquet(parquet_path, index=False)
+    return parquet_path
+
+
+def pick_real_stock_days(decoded_dir: Path) -> List[Tuple[str, Path]]:
+    """由解碼目錄中挑出最小、中位數與最大的股票日"""
+    files = sorted(decoded_dir.glob('*.parquet'), key=lambda p: p.stat().st_size)
+    if not files:
+        return []
+    return [('small', files[0]), ('median', files[len(files) // 2]), ('worst', files[-1])]
+
+
+def measure(func: Callable, args: tuple, repeat: int) -> dict:
+    """量測單一區段：耗時、配置峰值、輸出大小"""
+    seconds, output = best_of(lambda: func(*args), repeat)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    func(*args)
+    _, alloc_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    output_bytes = len(encode_json(output))
+    return {
+        'seconds': seconds,
+        'alloc_peak_mb': alloc_peak / 1024 / 1024,
+        'output_kb': output_bytes / 1024
+    }
+
+
+def scaling_exponent(rows: List[int], seconds: List[float]) -> float:
+    """以最小與最大輸入估算成長階數（1 ≈ 線性，2 ≈ 平方）"""
+    if len(rows) < 2 or rows[0] == rows[-1] or seconds[0] <= 0:
+        return float('nan')
+    return math.log(seconds[-1] / seconds[0]) / math.log(rows[-1] / rows[0])
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='Payload 建構基準測試')
+    parser.add_argument('--decoded-dir', type=Path, default=None,
+                        help='某日期的解碼目錄（未指定時使用合成資料）')
+    parser.add_argument('--sizes', type=str, default='300,3000,15000',
+                        help='合成資料：小/中位數/最壞的成交筆數 (預設: 300,3000,15000)')
+    parser.add_argument('--implementations', type=str, default=None,
+                        help='只量測指定實作（逗號分隔）')
+    parser.add_argument('--seed', type=int, default=42, help='合成資料：亂數種子 (預設: 42)')
+    parser.add_argument('--repeat', type=int, default=1, help='重複次數，取最短 (預設: 1)')
+    parser.add_argument('--output', type=Path, default=None, help='結果 JSON 路徑')
+    parser.add_argument('--compare', type=Path, default=None, help='基準結果 JSON，退步超過門檻時失敗')
+    parser.add_argument('--threshold', type=float, default=0.15, help='容許退步比例 (預設: 0.15)')
+    args = parser.parse_args()
+
+    implementations = build_implementations()
+    if args.implementations:
+        selected = set(args.implementations.split(','))
+        implementations = {name: funcs for name, funcs in implementations.items() if name in selected}
+    if web_viewer is None:
+        print("提示: 未安裝 Flask，略過 web_viewer")
+
+    stages = {}
+    rows_by_key = {}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        if args.decoded_dir:
+            stock_days = pick_real_stock_days(args.decoded_dir)
+        else:
+            labels = ['small', 'median', 'worst']
+            sizes = [int(s) for s in args.sizes.split(',')]
+            stock_days = [(labels[i] if i < len(labels) else f'size{i}',
+                           make_synthetic_stock_day(ticks, Path(work_dir), args.seed))
+                          for i, ticks in enumerate(sizes)]
+
+        print("=" * 96)
+        print("Payload 建構基準測試")
+        print("=" * 96)
+        print(f"{'實作':<16}{'區段':<15}{'輸入':<8}{'列數':>8}{'秒數':>10}{'µs/列':>10}"
+              f"{'配置峰值MB':>12}{'輸出KB':>10}")
+        print('-' * 96)
+
+        for label, parquet_path in stock_days:
+            df = read_decoded_frame(parquet_path)
+            trade_df = df[df['Type'] == 'Trade'].copy()
+            depth_df = df[df['Type'] == 'Depth'].copy()
+            call_args = (df, trade_df, depth_df, str(parquet_path))
+
+            for impl_name, sections in implementations.items():
+                for section, func in sections.items():
+                    result = measure(func, call_args, args.repeat)
+                    result['rows'] = len(df)
+                    result['input'] = label
+                    key = f"{impl_name}/{section}/{label}"
+                    stages[key] = result
+                    rows_by_key.setdefault((impl_name, section), []).append((len(df), result['seconds']))
+
+                    print(f"{impl_name:<16}{section:<15}{label:<8}{len(df):>8}{result['seconds']:>10.4f}"
+                          f"{result['seconds'] / max(len(df), 1) * 1e6:>10.2f}"
+                          f"{result['alloc_peak_mb']:>12.2f}{result['output_kb']:>10.1f}")
+
+    # 成長階數
+    print("\n成長階數（1 ≈ 線性，2 ≈ 平方）:")
+    scaling = {}
+    for (impl_name, section), points in rows_by_key.items():
+        exponent = scaling_exponent([p[0] for p in points], [p[1] for p in points])
+        scaling[f"{impl_name}/{section}"] = exponent
+        warn = '  ⚠ 可能為非線性' if exponent > SCALING_WARN_EXPONENT else ''
+        print(f"  {impl_name + '/' + section:<32}{exponent:>6.2f}{warn}")
+
+    results = {
+        'benchmark': 'payload',
+        'environment': environment_info(),
+        'stages': stages,
+        'scaling': scaling
+    }
+    output_path = save_results(results, 'payload', args.output)
+    print(f"\n結果已儲存: {output_path}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n效能退步（門檻 {args.threshold * 100:.0f}%）:")
+            for item in regressions:
+                print(f"  {item}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
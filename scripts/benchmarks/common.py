@@ -0,0 +1,137 @@
+"""
+基準測試共用工具
+計時、記憶體高水位、結果存檔與回歸比較
+"""
+import json
+import platform
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Any
+
+# 讓基準測試可直接以 python scripts/benchmarks/xxx.py 執行
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+from utils.config import BENCHMARK_DIR
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    目前行程的常駐記憶體高水位 (MB)
+
+    Linux/macOS 使用 getrusage；Windows 需安裝 psutil（取 peak_wset），都沒有時返回 None
+    """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 單位為 KB，macOS 為 bytes
+        return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+    if psutil is not None:
+        memory_info = psutil.Process().memory_info()
+        return getattr(memory_info, 'peak_wset', memory_info.rss) / 1024 / 1024
+    return None
+
+
+def best_of(func: Callable[[], Any], repeat: int = 3) -> tuple:
+    """
+    重複執行取最短時間
+
+    Returns:
+        (最短秒數, 最後一次的返回值)
+    """
+    best = float('inf')
+    result = None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def environment_info() -> Dict[str, str]:
+    """執行環境資訊（存入結果檔，方便比對不同機器的數據）"""
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'pandas': pd.__version__,
+        'pyarrow': pa.__version__,
+        'numpy': np.__version__
+    }
+
+
+def save_results(results: Dict[str, Any], name: str, output_path: Optional[Path] = None) -> Path:
+    """
+    儲存結果為 JSON
+
+    Args:
+        results: 結果字典
+        name: 基準測試名稱（預設檔名前綴）
+        output_path: 輸出路徑，未指定時存到 data/benchmarks/{name}-{時間}.json
+
+    Returns:
+        實際輸出路徑
+    """
+    if output_path is None:
+        output_path = BENCHMARK_DIR / f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    return output_path
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float,
+                    metric: str = 'seconds') -> List[str]:
+    """
+    與基準結果比較，列出退步超過門檻的項目
+
+    Args:
+        current: 本次結果（含 'stages'）
+        baseline: 基準結果
+        threshold: 容許的相對退步比例（0.15 = 慢 15%）
+        metric: 比較的欄位（越小越好）
+
+    Returns:
+        退步項目的說明列表，沒有退步時為空列表
+    """
+    regressions = []
+    for stage, values in current.get('stages', {}).items():
+        base_values = baseline.get('stages', {}).get(stage)
+        if not base_values or not base_values.get(metric) or values.get(metric) is None:
+            continue
+
+        ratio = values[metric] / base_values[metric]
+        if ratio > 1 + threshold:
+            regressions.append(f"{stage}: {metric} {base_values[metric]:.4f} → {values[metric]:.4f} "
+                               f"(+{(ratio - 1) * 100:.1f}%)")
+    return regressions
+
+
+def print_stage_table(stages: Dict[str, Dict[str, Any]]) -> None:
+    """以表格輸出各階段結果"""
+    print(f"{'階段':<20}{'秒數':>10}{'行/秒':>14}{'MB/秒':>10}{'峰值RSS(MB)':>14}")
+    print('-' * 68)
+    for stage, values in stages.items():
+        lines_per_sec = values.get('lines_per_sec')
+        mb_per_sec = values.get('mb_per_sec')
+        peak = values.get('peak_rss_mb')
+        print(f"{stage:<20}{values['seconds']:>10.4f}"
+              f"{(f'{lines_per_sec:,.0f}' if lines_per_sec else '-'):>14}"
+              f"{(f'{mb_per_sec:.1f}' if mb_per_sec else '-'):>10}"
+              f"{(f'{peak:.1f}' if peak else '-'):>14}")
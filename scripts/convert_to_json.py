@@ -1,15 +1,20 @@
 """
 將解碼的 Parquet 檔案轉換為前端所需的 JSON 格式
 修正版：支援 pandas Timestamp 對象和 Unix timestamp（毫秒）兩種格式
+--time-us：時間改為當日零時起算的微秒整數（整欄一次轉換），日期只在 date 欄位出現一次
 """
 import pandas as pd
 import numpy as np
 import os
 import json
+import argparse
 from pathlib import Path
 from datetime import datetime
 import glob
 
+from utils.parquet_io import read_decoded_frame
+from utils.timeline import datetime_to_us_of_day
+
 
 def determine_inner_outer(current_price, prev_bid1, prev_ask1):
     """
@@ -54,6 +59,21 @@ def timestamp_to_datetime_str(timestamp_value):
         return "1970-01-01 00:00:00.000000"
 
 
+def payload_times(datetimes, time_format='string'):
+    """
+    將整欄 Datetime 轉為 payload 的時間值
+
+    time_format='string' 時逐筆以 timestamp_to_datetime_str 格式化；
+    'us' 時為當日零時起算的微秒整數，以單次向量化轉型產生
+    （Unix timestamp 毫秒的舊格式先依本地時區轉為時間）
+    """
+    if time_format != 'us':
+        return [timestamp_to_datetime_str(ts) for ts in datetimes]
+    if pd.api.types.is_numeric_dtype(datetimes):
+        datetimes = pd.Series([datetime.fromtimestamp(float(ts) / 1000.0) for ts in datetimes])
+    return datetime_to_us_of_day(datetimes).tolist()
+
+
 def extract_date_from_timestamp(timestamp_value):
     """
     從 timestamp 提取日期字串（YYYYMMDD）
@@ -74,13 +94,15 @@ def extract_date_from_timestamp(timestamp_value):
         return "19700101"
 
 
-def process_stock_file(parquet_path, output_path):
+def process_stock_file(parquet_path, output_path, time_format='string'):
     """
     處理單個股票的 Parquet 檔案，轉換為 JSON 格式
+
+    time_format='us' 時所有時間為當日零時起算的微秒整數
     """
     try:
-        # 讀取 Parquet 檔案
-        df = pd.read_parquet(parquet_path)
+        # 讀取 Parquet 檔案（整數 tick 價格的檔案還原為浮點價格）
+        df = read_decoded_frame(parquet_path)
 
         if len(df) == 0:
             print(f"  警告: {os.path.basename(parquet_path)} 沒有資料")
@@ -99,6 +121,7 @@ def process_stock_file(parquet_path, output_path):
         if len(trade_df) > 0:
             # 按時間排序（倒序，最新的在前）
             trade_df = trade_df.sort_values('Datetime', ascending=False).reset_index(drop=True)
+            trade_times = payload_times(trade_df['Datetime'], time_format)
 
             for idx, row in trade_df.iterrows():
                 # 取得該交易時間點之前的最近一筆 Depth
@@ -121,7 +144,7 @@ def process_stock_file(parquet_path, output_path):
                 inner_outer = determine_inner_outer(row['Price'], prev_bid1, prev_ask1)
 
                 trades.append({
-                    'time': timestamp_to_datetime_str(row['Datetime']),
+                    'time': trade_times[idx],
                     'price': float(row['Price']) if pd.notna(row['Price']) else 0.0,
                     'volume': int(row['Volume']) if pd.notna(row['Volume']) else 0,
                     'inner_outer': inner_outer,
@@ -132,8 +155,9 @@ def process_stock_file(parquet_path, output_path):
         depth_history = []
         if len(depth_df) > 0:
             depth_df = depth_df.sort_values('Datetime').reset_index(drop=True)
+            depth_times = payload_times(depth_df['Datetime'], time_format)
 
-            for _, row in depth_df.iterrows():
+            for (_, row), timestamp in zip(depth_df.iterrows(), depth_times):
                 bids = []
                 asks = []
 
@@ -158,7 +182,7 @@ def process_stock_file(parquet_path, output_path):
                         })
 
                 depth_history.append({
-                    'timestamp': timestamp_to_datetime_str(row['Datetime']),
+                    'timestamp': timestamp,
                     'bids': bids,
                     'asks': asks
                 })
@@ -179,7 +203,7 @@ def process_stock_file(parquet_path, output_path):
             # 按時間正序排列用於圖表
             trade_df_asc = trade_df.sort_values('Datetime').reset_index(drop=True)
 
-            timestamps = [timestamp_to_datetime_str(ts) for ts in trade_df_asc['Datetime']]
+            timestamps = payload_times(trade_df_asc['Datetime'], time_format)
             prices = [float(p) if pd.notna(p) else 0.0 for p in trade_df_asc['Price']]
             volumes = [int(v) if pd.notna(v) else 0 for v in trade_df_asc['Volume']]
 
@@ -258,6 +282,8 @@ def process_stock_file(parquet_path, output_path):
             'stock_code': stock_code,
             'date': date_str
         }
+        if time_format == 'us':
+            result['time_format'] = 'us'
 
         # 儲存為 JSON
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
@@ -275,6 +301,12 @@ def process_stock_file(parquet_path, output_path):
 
 def main():
     """主程式"""
+    parser = argparse.ArgumentParser(description='Parquet 轉 JSON 轉換程式')
+    parser.add_argument('--time-us', action='store_true',
+                        help='時間輸出為當日零時起算的微秒整數（日期只在 date 欄位出現一次）')
+    args = parser.parse_args()
+    time_format = 'us' if args.time_us else 'string'
+
     print("=" * 80)
     print("Parquet 轉 JSON 轉換程式（修正版）")
     print("=" * 80)
@@ -339,7 +371,7 @@ def main():
                     continue
 
             # 轉換
-            if process_stock_file(parquet_path, output_path):
+            if process_stock_file(parquet_path, output_path, time_format):
                 converted += 1
                 if converted % 10 == 0:
                     print(f"  已轉換: {converted}/{len(parquet_files)}")
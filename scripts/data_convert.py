@@ -8,38 +8,66 @@ Parquet 轉 JSON 資料轉換程式（優化版）
 - 多進程並行處理
 - 自動跳過已轉換檔案
 - 完整的資料處理（VWAP、內外盤判斷、統計資料）
+- 逐階段計時（--json-log）：read / 各區段建構 / serialize / write 輸出為 JSON Lines
+- 成交與五檔分別讀取，只讀需要的 row group 與欄位
+- 效能剖析（--profile）：每個 worker 行程以 cProfile 剖析，合併為 pstats 與 collapsed stack
+- 記憶體監控：記錄每個股票日的記憶體峰值並輸出摘要表；--memory-limit 超限的任務跳過並記錄
+- 整數 tick 價格（--price-ticks）：價格、VWAP 與統計輸出為整數 tick，另附 price_scale（見 utils/price_ticks.py）
+- 微秒整數時間（--time-us）：時間輸出為當日零時起算的微秒整數，日期只在 date 欄位出現一次
 """
 import pandas as pd
 import os
 import json
 from pathlib import Path
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import time
-from typing import Dict, List, Optional, Any
-
-from utils import setup_logger
+import argparse
+from typing import Dict, List, Optional, Any, Union
+
+from utils import setup_logger, log_event, log_stage_summary, StageTimer
+from utils.logger import ProgressBar
+from utils.profiling import ProfiledTask, add_profile_arguments, resolve_profile_dir, report_profiles
+from utils.memory import MemoryWatch, add_memory_arguments, log_memory_summary
+from utils.depth_codec import encode_depth_history
+from utils.parquet_io import TRADE_COLUMNS, DEPTH_COLUMNS, read_quote_rows
+from utils.price_ticks import payload_price_scale, rescale_price_ticks, rounded_div, tick_value
+from utils.timeline import build_event_timeline, datetime_to_us_of_day, format_times, time_ordered
 from utils.config import DECODED_DIR, OUTPUT_DIR, DEFAULT_MAX_WORKERS
 
 
-def calculate_vwap(prices: List[float], volumes: List[int]) -> List[float]:
+def payload_times(datetimes: pd.Series, time_format: str = 'string') -> List[Any]:
+    """
+    Datetime 欄位轉為 payload 的時間值
+
+    'string' 沿用 str(Timestamp) 的格式；'us' 為當日零時起算的微秒整數（整欄一次轉換）
+    """
+    if time_format == 'us':
+        return format_times(datetimes, 'us')
+    return [str(ts) for ts in datetimes]
+
+
+def calculate_vwap(prices: List[float], volumes: List[int], price_ticks: bool = False) -> List[float]:
     """
     計算 VWAP（成交量加權平均價）
 
     Args:
         prices: 價格列表
         volumes: 成交量列表
+        price_ticks: 價格為整數 tick，以整數累計成交金額，VWAP 四捨五入到整數 tick
 
     Returns:
         VWAP 列表
     """
     vwap = []
-    cumulative_amount = 0.0
+    cumulative_amount = 0 if price_ticks else 0.0
     cumulative_volume = 0
 
     for price, volume in zip(prices, volumes):
         cumulative_amount += price * volume
         cumulative_volume += volume
-        if cumulative_volume > 0:
+        if price_ticks:
+            vwap.append(rounded_div(cumulative_amount, cumulative_volume))
+        elif cumulative_volume > 0:
             vwap.append(cumulative_amount / cumulative_volume)
         else:
             vwap.append(0.0)
@@ -69,15 +97,17 @@ def determine_inner_outer(trade_price: float, prev_bid1: Optional[float], prev_a
     return '–'
 
 
-def prepare_chart_data(trade_df: pd.DataFrame) -> Optional[Dict[str, Any]]:
-    """準備圖表資料"""
+def prepare_chart_data(trade_df: pd.DataFrame, price_ticks: bool = False,
+                       time_format: str = 'string') -> Optional[Dict[str, Any]]:
+    """準備圖表資料（price_ticks=True 時價格與 VWAP 為整數 tick）"""
     if trade_df.empty:
         return None
 
-    trade_df = trade_df.sort_values('Datetime').reset_index(drop=True)
+    trade_df = time_ordered(trade_df).reset_index(drop=True)
+    to_price = int if price_ticks else float
 
-    timestamps = [str(ts) for ts in trade_df['Datetime']]
-    prices = [float(p) if pd.notna(p) else 0.0 for p in trade_df['Price']]
+    timestamps = payload_times(trade_df['Datetime'], time_format)
+    prices = [to_price(p) if pd.notna(p) else to_price(0) for p in trade_df['Price']]
     volumes = [int(v) if pd.notna(v) else 0 for v in trade_df['Volume']]
 
     # 計算累計成交量
@@ -88,7 +118,7 @@ def prepare_chart_data(trade_df: pd.DataFrame) -> Optional[Dict[str, Any]]:
         total_volumes.append(cumsum)
 
     # 計算 VWAP
-    vwap = calculate_vwap(prices, volumes)
+    vwap = calculate_vwap(prices, volumes, price_ticks)
 
     return {
         'timestamps': timestamps,
@@ -99,13 +129,16 @@ def prepare_chart_data(trade_df: pd.DataFrame) -> Optional[Dict[str, Any]]:
     }
 
 
-def prepare_depth_data(depth_df: pd.DataFrame) -> Optional[Dict[str, Any]]:
+def prepare_depth_data(depth_df: pd.DataFrame, price_ticks: bool = False,
+                       time_format: str = 'string') -> Optional[Dict[str, Any]]:
     """準備當前五檔資料（取最新一筆）"""
     if depth_df.empty:
         return None
+    to_price = int if price_ticks else float
 
-    depth_df = depth_df.sort_values('Datetime', ascending=False)
+    depth_df = time_ordered(depth_df, ascending=False)
     latest = depth_df.iloc[0]
+    timestamp = payload_times(depth_df['Datetime'].iloc[:1], time_format)[0] if 'Datetime' in latest else ''
 
     bids = []
     asks = []
@@ -116,7 +149,7 @@ def prepare_depth_data(depth_df: pd.DataFrame) -> Optional[Dict[str, Any]]:
         bid_volume = latest.get(f'Bid{i}_Volume')
         if pd.notna(bid_price) and pd.notna(bid_volume):
             bids.append({
-                'price': float(bid_price),
+                'price': to_price(bid_price),
                 'volume': int(bid_volume)
             })
 
@@ -125,28 +158,35 @@ def prepare_depth_data(depth_df: pd.DataFrame) -> Optional[Dict[str, Any]]:
         ask_volume = latest.get(f'Ask{i}_Volume')
         if pd.notna(ask_price) and pd.notna(ask_volume):
             asks.append({
-                'price': float(ask_price),
+                'price': to_price(ask_price),
                 'volume': int(ask_volume)
             })
 
     return {
         'bids': bids,
         'asks': asks,
-        'timestamp': str(latest['Datetime']) if 'Datetime' in latest else ''
+        'timestamp': timestamp
     }
 
 
-def prepare_depth_history(depth_df: pd.DataFrame) -> List[Dict[str, Any]]:
-    """準備五檔歷史資料"""
+def prepare_depth_history(depth_df: pd.DataFrame,
+                          encoding: str = 'full', price_ticks: bool = False,
+                          time_format: str = 'string') -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+    """準備五檔歷史資料（encoding='delta' 時輸出差分編碼）"""
     if depth_df.empty:
         return []
 
-    depth_df = depth_df.sort_values('Datetime').reset_index(drop=True)
+    depth_df = time_ordered(depth_df).reset_index(drop=True)
+    to_price = int if price_ticks else float
+    timestamps = payload_times(depth_df['Datetime'], time_format)
+
+    if encoding == 'delta':
+        return encode_depth_history(depth_df, timestamps, price_ticks=price_ticks)
 
     history = []
-    for _, row in depth_df.iterrows():
+    for (_, row), timestamp in zip(depth_df.iterrows(), timestamps):
         entry = {
-            'timestamp': str(row['Datetime']),
+            'timestamp': timestamp,
             'bids': [],
             'asks': []
         }
@@ -157,7 +197,7 @@ def prepare_depth_history(depth_df: pd.DataFrame) -> List[Dict[str, Any]]:
             bid_volume = row.get(f'Bid{i}_Volume')
             if pd.notna(bid_price) and pd.notna(bid_volume):
                 entry['bids'].append({
-                    'price': float(bid_price),
+                    'price': to_price(bid_price),
                     'volume': int(bid_volume)
                 })
 
@@ -166,7 +206,7 @@ def prepare_depth_history(depth_df: pd.DataFrame) -> List[Dict[str, Any]]:
             ask_volume = row.get(f'Ask{i}_Volume')
             if pd.notna(ask_price) and pd.notna(ask_volume):
                 entry['asks'].append({
-                    'price': float(ask_price),
+                    'price': to_price(ask_price),
                     'volume': int(ask_volume)
                 })
 
@@ -175,35 +215,41 @@ def prepare_depth_history(depth_df: pd.DataFrame) -> List[Dict[str, Any]]:
     return history
 
 
-def prepare_trade_details(trade_df: pd.DataFrame, depth_df: pd.DataFrame) -> List[Dict[str, Any]]:
-    """準備成交明細（含內外盤判斷）"""
+def prepare_trade_details(trade_df: pd.DataFrame, depth_df: pd.DataFrame,
+                          price_ticks: bool = False, time_format: str = 'string') -> List[Dict[str, Any]]:
+    """準備成交明細（含內外盤判斷；price_ticks=True 時價格為整數 tick，比較為整數比較）"""
     if trade_df.empty:
         return []
+    to_price = int if price_ticks else float
 
-    trade_df = trade_df.sort_values('Datetime', ascending=False).reset_index(drop=True)
+    trade_df = time_ordered(trade_df, ascending=False).reset_index(drop=True)
+    trade_times = payload_times(trade_df['Datetime'], time_format)
 
     if not depth_df.empty:
-        depth_df = depth_df.sort_values('Datetime')
+        depth_df = time_ordered(depth_df)
     else:
         depth_df = pd.DataFrame()
 
     details = []
-    for _, row in trade_df.iterrows():
+    for (_, row), payload_time in zip(trade_df.iterrows(), trade_times):
         trade_time = row['Datetime']
-        trade_price = float(row['Price']) if pd.notna(row['Price']) else 0.0
+        trade_price = to_price(row['Price']) if pd.notna(row['Price']) else to_price(0)
 
         # 判斷內外盤
         inner_outer = '–'
         if not depth_df.empty and trade_price > 0:
-            prior_depths = depth_df[depth_df['Datetime'] <= trade_time]
+            # 時間早於成交的最近一筆五檔（同一時間的五檔排在成交之後，見 utils/timeline.py）
+            prior_depths = depth_df[depth_df['Datetime'] < trade_time]
             if not prior_depths.empty:
                 closest_depth = prior_depths.iloc[-1]
                 bid1_price = closest_depth.get('Bid1_Price')
                 ask1_price = closest_depth.get('Ask1_Price')
+                if price_ticks:
+                    bid1_price, ask1_price = tick_value(bid1_price), tick_value(ask1_price)
                 inner_outer = determine_inner_outer(trade_price, bid1_price, ask1_price)
 
         details.append({
-            'time': str(trade_time) if pd.notna(trade_time) else '',
+            'time': payload_time if pd.notna(trade_time) else '',
             'price': trade_price,
             'volume': int(row['Volume']) if pd.notna(row['Volume']) else 0,
             'inner_outer': inner_outer,
@@ -213,12 +259,23 @@ def prepare_trade_details(trade_df: pd.DataFrame, depth_df: pd.DataFrame) -> Lis
     return details
 
 
-def calculate_statistics(trade_df: pd.DataFrame) -> Optional[Dict[str, Any]]:
-    """計算統計資料"""
+def prepare_event_timeline(trade_df: pd.DataFrame, depth_df: pd.DataFrame) -> Optional[Dict[str, Any]]:
+    """準備統一時間軸（成交與五檔合併後的事件流，索引對應 chart 與 depth_history）"""
+    if trade_df.empty and depth_df.empty:
+        return None
+
+    trade_times = datetime_to_us_of_day(time_ordered(trade_df)['Datetime'])
+    depth_times = datetime_to_us_of_day(time_ordered(depth_df)['Datetime'])
+    return build_event_timeline(trade_times, depth_times)
+
+
+def calculate_statistics(trade_df: pd.DataFrame, price_ticks: bool = False) -> Optional[Dict[str, Any]]:
+    """計算統計資料（price_ticks=True 時價格為整數 tick，平均成交價以整數累計後四捨五入）"""
     if trade_df.empty:
         return None
+    to_price = int if price_ticks else float
 
-    trade_df = trade_df.sort_values('Datetime').reset_index(drop=True)
+    trade_df = time_ordered(trade_df).reset_index(drop=True)
 
     valid_prices = trade_df['Price'].dropna()
     valid_volumes = trade_df['Volume'].dropna()
@@ -226,19 +283,23 @@ def calculate_statistics(trade_df: pd.DataFrame) -> Optional[Dict[str, Any]]:
     if valid_prices.empty:
         return None
 
-    open_price = float(valid_prices.iloc[0])
-    current_price = float(valid_prices.iloc[-1])
-    high_price = float(valid_prices.max())
-    low_price = float(valid_prices.min())
+    open_price = to_price(valid_prices.iloc[0])
+    current_price = to_price(valid_prices.iloc[-1])
+    high_price = to_price(valid_prices.max())
+    low_price = to_price(valid_prices.min())
 
     # 計算平均成交價（成交量加權）
     valid_df = trade_df[trade_df['Price'].notna() & trade_df['Volume'].notna()]
-    if not valid_df.empty:
+    if not valid_df.empty and price_ticks:
+        total_amount = int((valid_df['Price'].astype('int64') * valid_df['Volume']).sum())
+        total_volume = valid_df['Volume'].sum()
+        avg_price = rounded_div(total_amount, int(total_volume))
+    elif not valid_df.empty:
         total_amount = (valid_df['Price'] * valid_df['Volume']).sum()
         total_volume = valid_df['Volume'].sum()
         avg_price = float(total_amount / total_volume) if total_volume > 0 else 0.0
     else:
-        avg_price = 0.0
+        avg_price = to_price(0)
 
     change = current_price - open_price
     change_pct = (change / open_price * 100) if open_price > 0 else 0.0
@@ -256,17 +317,19 @@ def calculate_statistics(trade_df: pd.DataFrame) -> Optional[Dict[str, Any]]:
     }
 
 
-def process_stock_file(args: tuple) -> str:
+def process_stock_file(args: tuple) -> tuple:
     """
     處理單個股票的 Parquet 檔案並轉換為 JSON
 
     Args:
-        args: (parquet_file_path, output_base_dir)
+        args: (parquet_file_path, output_base_dir, depth_encoding, memory_limit_mb, memory_trace, price_ticks,
+               time_format)
 
     Returns:
-        處理結果訊息
+        (處理結果訊息, 逐階段計時與記憶體峰值；跳過或失敗時為 None)
     """
-    parquet_file, output_base_dir = args
+    parquet_file, output_base_dir, depth_encoding, memory_limit_mb, memory_trace, price_ticks, time_format = args
+    memory = MemoryWatch(memory_limit_mb, memory_trace)
 
     try:
         # 解析路徑
@@ -281,50 +344,97 @@ def process_stock_file(args: tuple) -> str:
         if output_file.exists():
             # 比較修改時間
             if output_file.stat().st_mtime > parquet_path.stat().st_mtime:
-                return f"跳過 {date_str}/{stock_code} (已存在)"
-
-        # 讀取 Parquet
-        df = pd.read_parquet(parquet_path)
-
-        if df.empty:
-            return f"警告 {date_str}/{stock_code} (無資料)"
-
-        # 分離 Trade 和 Depth 資料
-        trade_df = df[df['Type'] == 'Trade'].copy()
-        depth_df = df[df['Type'] == 'Depth'].copy()
-
-        # 準備所有資料
-        chart_data = prepare_chart_data(trade_df)
-        depth_data = prepare_depth_data(depth_df)
-        depth_history = prepare_depth_history(depth_df)
-        trade_details = prepare_trade_details(trade_df, depth_df)
-        statistics = calculate_statistics(trade_df)
-
-        # 組合成 API 格式
-        api_response = {
-            'chart': chart_data,
-            'depth': depth_data,
-            'depth_history': depth_history,
-            'trades': trade_details,
-            'stats': statistics,
-            'stock_code': stock_code,
-            'date': date_str
-        }
-
-        # 建立輸出目錄並寫入 JSON
-        output_dir.mkdir(parents=True, exist_ok=True)
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(api_response, f, ensure_ascii=False, separators=(',', ':'))
-
-        return f"完成 {date_str}/{stock_code}"
-
+                return f"跳過 {date_str}/{stock_code} (已存在)", None
+
+        timer = StageTimer(date=date_str, stock=stock_code)
+
+        with memory:
+            # 分別讀取 Trade 與 Depth（只讀需要的 row group 與欄位）
+            with timer.stage('read'):
+                trade_df = read_quote_rows(parquet_path, 'Trade', TRADE_COLUMNS, price_ticks=price_ticks)
+                depth_df = read_quote_rows(parquet_path, 'Depth', DEPTH_COLUMNS, price_ticks=price_ticks)
+                if price_ticks:
+                    # 換算為能精確表示所有價格的最粗倍率，payload 數字較短
+                    price_scale = payload_price_scale(trade_df, depth_df)
+                    trade_df = rescale_price_ticks(trade_df, price_scale)
+                    depth_df = rescale_price_ticks(depth_df, price_scale)
+
+            if trade_df.empty and depth_df.empty:
+                return f"警告 {date_str}/{stock_code} (無資料)", None
+
+            # 準備所有資料
+            with timer.stage('chart'):
+                chart_data = prepare_chart_data(trade_df, price_ticks, time_format)
+            with timer.stage('depth'):
+                depth_data = prepare_depth_data(depth_df, price_ticks, time_format)
+            with timer.stage('depth_history'):
+                depth_history = prepare_depth_history(depth_df, encoding=depth_encoding, price_ticks=price_ticks,
+                                                      time_format=time_format)
+            with timer.stage('trades'):
+                trade_details = prepare_trade_details(trade_df, depth_df, price_ticks, time_format)
+            with timer.stage('stats'):
+                statistics = calculate_statistics(trade_df, price_ticks)
+            with timer.stage('timeline'):
+                timeline = prepare_event_timeline(trade_df, depth_df)
+
+            # 組合成 API 格式
+            api_response = {
+                'chart': chart_data,
+                'depth': depth_data,
+                'depth_history': depth_history,
+                'trades': trade_details,
+                'stats': statistics,
+                'timeline': timeline,
+                'stock_code': stock_code,
+                'date': date_str
+            }
+            if price_ticks:
+                api_response['price_scale'] = price_scale
+            if time_format == 'us':
+                api_response['time_format'] = 'us'
+
+            with timer.stage('serialize'):
+                payload = json.dumps(api_response, ensure_ascii=False, separators=(',', ':'))
+
+        # 超過記憶體上限時離開 with memory 即拋出例外，不會寫出；
+        # 寫出在監控區塊之外（取樣執行緒的非同步例外不會中斷寫入），
+        # 並先寫暫存檔再以 os.replace 取代，中斷時不會留下被下次執行當成已完成的不完整 JSON
+        with timer.stage('write'):
+            output_dir.mkdir(parents=True, exist_ok=True)
+            tmp_file = output_dir / f"{stock_code}.json.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_file, output_file)
+
+        timer.context.update(rows=len(trade_df) + len(depth_df), trade_rows=len(trade_df), depth_rows=len(depth_df),
+                             input_bytes=parquet_path.stat().st_size, output_bytes=output_file.stat().st_size,
+                             worker=os.getpid(), **memory.as_dict())
+        return f"完成 {date_str}/{stock_code}", timer.as_dict()
+
+    except MemoryError:
+        return f"記憶體超限 {date_str}/{stock_code} ({memory.describe()})", None
     except Exception as e:
-        return f"錯誤 {parquet_file}: {e}"
+        return f"錯誤 {parquet_file}: {e}", None
 
 
 def main():
     """主程式"""
-    logger = setup_logger('data_convert')
+    parser = argparse.ArgumentParser(description='Parquet → JSON 資料轉換程式')
+    parser.add_argument('--depth-delta', action='store_true',
+                        help='depth_history 使用差分編碼（定期完整快照 + 變動檔位）')
+    parser.add_argument('--price-ticks', action='store_true',
+                        help='價格、VWAP 與統計輸出為整數 tick，另附 price_scale（價格 = tick / price_scale）')
+    parser.add_argument('--time-us', action='store_true',
+                        help='時間輸出為當日零時起算的微秒整數（日期只在 date 欄位出現一次）')
+    parser.add_argument('--json-log', type=Path, default=None,
+                        help='逐階段計時等結構化日誌的輸出路徑（JSON Lines，附加寫入）')
+    add_profile_arguments(parser)
+    add_memory_arguments(parser)
+    cli_args = parser.parse_args()
+    depth_encoding = 'delta' if cli_args.depth_delta else 'full'
+    time_format = 'us' if cli_args.time_us else 'string'
+
+    logger = setup_logger('data_convert', json_log_file=cli_args.json_log)
 
     logger.info("=" * 80)
     logger.info("Parquet → JSON 資料轉換程式（優化版）")
@@ -347,7 +457,8 @@ def main():
         return
 
     # 準備參數
-    args_list = [(f, OUTPUT_DIR) for f in parquet_files]
+    args_list = [(f, OUTPUT_DIR, depth_encoding, cli_args.memory_limit, cli_args.memory_trace,
+                  cli_args.price_ticks, time_format) for f in parquet_files]
 
     # 使用多進程處理
     max_workers = DEFAULT_MAX_WORKERS
@@ -355,13 +466,32 @@ def main():
 
     start_time = time.time()
 
-    with ProcessPoolExecutor(max_workers=max_workers) as executor:
-        results = list(executor.map(process_stock_file, args_list))
+    profile_dir = resolve_profile_dir(cli_args, 'data_convert')
+    task = ProfiledTask(process_stock_file, profile_dir, cli_args.profile_memory) if profile_dir else process_stock_file
+
+    outcomes = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor, \
+            ProgressBar(len(args_list), '轉換', workers=max_workers, logger=logger) as progress:
+        futures = [executor.submit(task, a) for a in args_list]
+        for future in as_completed(futures):
+            message, timing = future.result()
+            outcomes.append((message, timing))
+            if timing:
+                progress.update(1, bytes=timing['input_bytes'], lines=timing['rows'],
+                                worker=timing['worker'], busy_seconds=timing['total'])
+            else:
+                progress.update(1)
+
+    results = [message for message, _ in outcomes]
+    timings = [timing for _, timing in outcomes if timing]
+    for timing in timings:
+        log_event(logger, 'stage_timing', **timing)
 
     # 統計結果
     completed = sum(1 for r in results if '完成' in r)
     skipped = sum(1 for r in results if '跳過' in r)
     errors = sum(1 for r in results if '錯誤' in r)
+    over_limit = [r for r in results if '記憶體超限' in r]
 
     elapsed = time.time() - start_time
 
@@ -371,8 +501,14 @@ def main():
     logger.info(f"完成: {completed} 個")
     logger.info(f"跳過: {skipped} 個")
     logger.info(f"錯誤: {errors} 個")
+    if over_limit:
+        logger.info(f"記憶體超限: {len(over_limit)} 個")
     logger.info(f"耗時: {elapsed:.2f} 秒")
     logger.info(f"輸出目錄: {OUTPUT_DIR}")
+    log_stage_summary(logger, timings)
+    log_memory_summary(logger, timings, top=cli_args.memory_top)
+    if profile_dir:
+        report_profiles(profile_dir, logger, top=cli_args.profile_top)
     logger.info("=" * 80)
 
     # 顯示錯誤（如果有）
@@ -382,6 +518,12 @@ def main():
         for err in error_results[:10]:  # 只顯示前 10 個
             logger.warning(f"  {err}")
 
+    if over_limit:
+        logger.warning("\n記憶體超限而跳過的股票日:")
+        for message in over_limit:
+            logger.warning(f"  {message}")
+            log_event(logger, 'memory_limit_exceeded', message=message)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+合成 Quote 檔案產生器
+產生與正式資料相同格式的 TSEQuote.YYYYMMDD / OTCQuote.YYYYMMDD 與對應的漲停清單，
+讓 read_quote_file、batch_decode 與轉換程式可以在沒有授權資料的環境下重現基準測試
+
+特色：
+- 資料行格式與 parse_trade_line / parse_depth_line 完全一致（含選用的序號欄位）
+- 可設定股票數、每檔 tick 數或目標檔案大小
+- 漲停股票：價格推升至漲停價後鎖住，賣盤清空
+- 試撮時段（Flag=1）：開盤前與收盤前的試算揭示
+- 同時輸出 lup_ma20_filtered.parquet
+
+使用範例:
+    python generate_synthetic_quotes.py --dates 20251030 20251031 --stocks 200 --ticks 3000
+    python generate_synthetic_quotes.py --dates 20251031 --stocks 50 --size-mb 200 --limit-up-ratio 0.2
+"""
+import argparse
+import heapq
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from utils.config import DATA_DIR, PRICE_DECIMAL_DIVISOR, MARKETS
+
+# 每行平均位元組數（用於由目標檔案大小推算 tick 數）
+AVG_TRADE_LINE_BYTES = 55
+AVG_DEPTH_LINE_BYTES = 150
+
+DEFAULT_TRIAL_PERIODS = '0830-0900,1325-1330'
+MARKET_OPEN = (9, 0)
+MARKET_CLOSE = (13, 30)
+
+
+def tick_size(price: float) -> float:
+    """台股升降單位"""
+    if price < 10:
+        return 0.01
+    if price < 50:
+        return 0.05
+    if price < 100:
+        return 0.1
+    if price < 500:
+        return 0.5
+    if price < 1000:
+        return 1.0
+    return 5.0
+
+
+def round_to_tick(price: float, down: bool = False) -> float:
+    """價格對齊升降單位"""
+    tick = tick_size(price)
+    steps = np.floor(price / tick) if down else np.round(price / tick)
+    return round(float(steps * tick), 2)
+
+
+def to_us(hhmm: str) -> int:
+    """'HHMM' 轉為當日微秒數"""
+    return (int(hhmm[:2]) * 60 + int(hhmm[2:])) * 60 * 1_000_000
+
+
+def format_timestamp(time_us: int) -> str:
+    """當日微秒數轉為 HHMMSSffffff（不補前導零，與原始檔案一致，由解析端 zfill）"""
+    seconds, micro = divmod(time_us, 1_000_000)
+    minutes, second = divmod(seconds, 60)
+    hour, minute = divmod(minutes, 60)
+    return str(int(f'{hour:02d}{minute:02d}{second:02d}{micro:06d}'))
+
+
+def parse_periods(value: str) -> List[Tuple[int, int]]:
+    """解析 '0830-0900,1325-1330' 為 [(起, 迄), ...]（微秒）"""
+    periods = []
+    for part in value.split(','):
+        if part.strip():
+            start, end = part.strip().split('-')
+            periods.append((to_us(start), to_us(end)))
+    return periods
+
+
+class SyntheticStock:
+    """單一股票的合成行情（依時間順序產生資料行）"""
+
+    def __init__(self, stock_code: str, prev_close: float, ticks: int, limit_up: bool,
+                 trial_periods: List[Tuple[int, int]], depth_ratio: float, dup_depth_ratio: float,
+                 rng: np.random.Generator):
+        self.stock_code = stock_code
+        self.prev_close = prev_close
+        self.limit_price = round_to_tick(prev_close * 1.1, down=True)
+        self.limit_up = limit_up
+        self.rng = rng
+        self.dup_depth_ratio = dup_depth_ratio
+
+        open_us = to_us(f'{MARKET_OPEN[0]:02d}{MARKET_OPEN[1]:02d}')
+        close_us = to_us(f'{MARKET_CLOSE[0]:02d}{MARKET_CLOSE[1]:02d}')
+
+        # 連續交易時段（收盤前若有試撮時段，連續交易在試撮開始時結束，收盤時再撮合一筆）
+        continuous_end = min([start for start, _ in trial_periods if start > open_us] + [close_us])
+        n_depth = int(ticks * depth_ratio)
+        times = np.sort(rng.integers(open_us, continuous_end, size=ticks + n_depth))
+        is_trade = np.zeros(len(times), dtype=bool)
+        is_trade[rng.choice(len(times), size=ticks, replace=False)] = True
+
+        events = [(int(t), 'trade' if trade else 'depth') for t, trade in zip(times, is_trade)]
+        for start, end in trial_periods:
+            # 試算揭示約每 5 秒一次
+            events.extend((t, 'trial') for t in range(start, end, 5_000_000))
+        if continuous_end < close_us:
+            events.append((close_us, 'trade'))
+
+        self.events = sorted(events)
+
+        self.price = prev_close
+        self.total_volume = 0
+        self.book = None
+
+    def _target_price(self, progress: float) -> float:
+        """漲停股票隨時間推向漲停價"""
+        if self.limit_up:
+            return self.prev_close + (self.limit_price - self.prev_close) * min(1.0, progress * 3)
+        return self.prev_close
+
+    def _next_price(self, progress: float) -> float:
+        """以 tick 為單位的隨機漫步，並往目標價靠攏"""
+        tick = tick_size(self.price)
+        drift = np.sign(self._target_price(progress) - self.price)
+        step = int(self.rng.integers(-2, 3)) + (drift if self.rng.random() < 0.3 else 0)
+        price = round_to_tick(self.price + step * tick)
+        low_limit = round_to_tick(self.prev_close * 0.9)
+        return min(max(price, low_limit), self.limit_price)
+
+    def _build_book(self) -> Tuple[list, list]:
+        """依目前價格建立五檔"""
+        tick = tick_size(self.price)
+        locked = self.limit_up and self.price >= self.limit_price
+        bids = [(round_to_tick(self.price - i * tick), int(self.rng.integers(1, 200)) * (50 if locked and i == 0 else 1))
+                for i in range(5)]
+        asks = [] if locked else [(round_to_tick(self.price + (i + 1) * tick), int(self.rng.integers(1, 200)))
+                                  for i in range(5) if self.price + (i + 1) * tick <= self.limit_price]
+        return bids, asks
+
+    def _mutate_book(self) -> None:
+        """多數五檔更新只變動一兩檔的數量"""
+        bids, asks = self.book
+        levels = bids + asks
+        for _ in range(int(self.rng.integers(1, 3))):
+            j = int(self.rng.integers(0, len(levels)))
+            levels[j] = (levels[j][0], max(1, levels[j][1] + int(self.rng.integers(-20, 21))))
+        self.book = (levels[:len(bids)], levels[len(bids):])
+
+    def lines(self) -> Iterator[Tuple[int, str]]:
+        """依時間順序產生 (時間微秒, 資料行不含序號)"""
+        n = len(self.events)
+        for k, (time_us, kind) in enumerate(self.events):
+            ts = format_timestamp(time_us)
+            progress = k / max(n - 1, 1)
+
+            if kind == 'trial':
+                price = round_to_tick(self.prev_close * (1 + float(self.rng.normal(0, 0.005))))
+                volume = int(self.rng.integers(1, 100))
+                yield time_us, (f"Trade,{self.stock_code},{ts},1,{int(round(price * PRICE_DECIMAL_DIVISOR))},"
+                                f"{volume},{self.total_volume}")
+                continue
+
+            if kind == 'trade':
+                self.price = self._next_price(progress)
+                volume = int(self.rng.integers(1, 50))
+                self.total_volume += volume
+                self.book = self._build_book()
+                yield time_us, (f"Trade,{self.stock_code},{ts},0,{int(round(self.price * PRICE_DECIMAL_DIVISOR))},"
+                                f"{volume},{self.total_volume}")
+                continue
+
+            # Depth：部分資料行與前一筆完全相同（原始資料常見的重複五檔）
+            if self.book is None:
+                self.book = self._build_book()
+            elif self.rng.random() >= self.dup_depth_ratio:
+                self._mutate_book()
+
+            bids, asks = self.book
+            bid_part = ','.join(f"{int(round(p * PRICE_DECIMAL_DIVISOR))}*{v}" for p, v in bids)
+            ask_part = ','.join(f"{int(round(p * PRICE_DECIMAL_DIVISOR))}*{v}" for p, v in asks)
+            fields = [f"Depth,{self.stock_code},{ts}", f"BID:{len(bids)}"]
+            if bid_part:
+                fields.append(bid_part)
+            fields.append(f"ASK:{len(asks)}")
+            if ask_part:
+                fields.append(ask_part)
+            yield time_us, ','.join(fields)
+
+
+def generate_quote_file(output_path: Path, stocks: List[SyntheticStock], with_seq: bool = True) -> int:
+    """
+    合併所有股票的資料行（依時間順序）寫入 Quote 檔案
+
+    Returns:
+        寫入的位元組數
+    """
+    merged = heapq.merge(*(stock.lines() for stock in stocks), key=lambda item: item[0])
+    written = 0
+    buffer = []
+
+    with open(output_path, 'w', encoding='utf-8', newline='\n') as f:
+        for seq, (_, line) in enumerate(merged, start=1):
+            buffer.append(f"{line},{seq}\n" if with_seq else f"{line}\n")
+            if len(buffer) >= 10000:
+                chunk = ''.join(buffer)
+                f.write(chunk)
+                written += len(chunk)
+                buffer = []
+        chunk = ''.join(buffer)
+        f.write(chunk)
+        written += len(chunk)
+
+    return written
+
+
+def generate_dataset(output_dir: Path, dates: List[str], stocks: int = 100, ticks: int = 2000,
+                     size_mb: Optional[float] = None, depth_ratio: float = 1.5, dup_depth_ratio: float = 0.1,
+                     limit_up_ratio: float = 0.1, target_ratio: float = 0.2,
+                     trial_periods: str = DEFAULT_TRIAL_PERIODS, with_seq: bool = True,
+                     seed: int = 42, verbose: bool = True) -> Path:
+    """
+    產生完整的合成資料集（各日期各市場的 Quote 檔案 + 漲停清單）
+
+    Args:
+        output_dir: 輸出目錄
+        dates: 日期列表 (YYYYMMDD)
+        stocks: 每個市場的股票數
+        ticks: 每檔股票的成交筆數
+        size_mb: 每個 Quote 檔案的目標大小 (MB)，指定時覆蓋 ticks
+        depth_ratio: 每筆成交對應的五檔更新數
+        dup_depth_ratio: 與前一筆相同的五檔比例
+        limit_up_ratio: 漲停股票比例
+        target_ratio: 列入漲停清單的股票比例（含漲停股票）
+        trial_periods: 試撮時段，空字串表示不產生
+        with_seq: 是否輸出序號欄位
+        seed: 亂數種子
+        verbose: 是否輸出進度
+
+    Returns:
+        漲停清單檔案路徑
+    """
+    rng = np.random.default_rng(seed)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    periods = parse_periods(trial_periods) if trial_periods else []
+
+    if size_mb:
+        bytes_per_tick = AVG_TRADE_LINE_BYTES + AVG_DEPTH_LINE_BYTES * depth_ratio
+        ticks = max(1, int(size_mb * 1024 * 1024 / (stocks * bytes_per_tick)))
+
+    if verbose:
+        print(f"日期: {dates}，每市場 {stocks} 支，每檔 {ticks} 筆成交")
+
+    # 每個市場固定一組股票代碼與昨收價
+    universe = {}
+    code_base = {'TSE': 1101, 'OTC': 3101}
+    for market in MARKETS:
+        codes = [str(code_base.get(market, 5101) + i) for i in range(stocks)]
+        prices = rng.lognormal(mean=np.log(60), sigma=0.8, size=stocks)
+        universe[market] = [(code, round_to_tick(float(p))) for code, p in zip(codes, prices)]
+
+    lup_rows = []
+    for date_str in dates:
+        for market in MARKETS:
+            n_limit_up = int(stocks * limit_up_ratio)
+            n_targets = max(n_limit_up, int(stocks * target_ratio))
+            order = rng.permutation(stocks)
+            limit_up_idx = set(order[:n_limit_up].tolist())
+            target_idx = order[:n_targets].tolist()
+
+            synthetic_stocks = [
+                SyntheticStock(code, prev_close, ticks, i in limit_up_idx, periods,
+                               depth_ratio, dup_depth_ratio, rng)
+                for i, (code, prev_close) in enumerate(universe[market])
+            ]
+
+            output_path = output_dir / f"{market}Quote.{date_str}"
+            written = generate_quote_file(output_path, synthetic_stocks, with_seq=with_seq)
+            if verbose:
+                print(f"  {output_path.name}: {written / 1024 / 1024:.1f} MB，漲停 {n_limit_up} 支")
+
+            for i in target_idx:
+                lup_rows.append({'date': pd.Timestamp(date_str), 'stock_id': universe[market][i][0]})
+
+    lup_path = output_dir / 'lup_ma20_filtered.parquet'
+    pd.DataFrame(lup_rows).to_parquet(lup_path, index=False)
+    if verbose:
+        print(f"  漲停清單: {lup_path} ({len(lup_rows)} 筆)")
+    return lup_path
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='合成 Quote 檔案產生器')
+    parser.add_argument('--dates', nargs='+', default=['20251030', '20251031'], help='日期 (YYYYMMDD)')
+    parser.add_argument('--stocks', type=int, default=100, help='每個市場的股票數 (預設: 100)')
+    parser.add_argument('--ticks', type=int, default=2000, help='每檔股票的成交筆數 (預設: 2000)')
+    parser.add_argument('--size-mb', type=float, default=None,
+                        help='每個 Quote 檔案的目標大小 (MB)，指定時覆蓋 --ticks')
+    parser.add_argument('--depth-ratio', type=float, default=1.5, help='每筆成交對應的五檔更新數 (預設: 1.5)')
+    parser.add_argument('--dup-depth-ratio', type=float, default=0.1, help='與前一筆相同的五檔比例 (預設: 0.1)')
+    parser.add_argument('--limit-up-ratio', type=float, default=0.1, help='漲停股票比例 (預設: 0.1)')
+    parser.add_argument('--target-ratio', type=float, default=0.2,
+                        help='列入漲停清單的股票比例（含漲停股票）(預設: 0.2)')
+    parser.add_argument('--trial-periods', type=str, default=DEFAULT_TRIAL_PERIODS,
+                        help=f'試撮時段 (預設: {DEFAULT_TRIAL_PERIODS})')
+    parser.add_argument('--no-trial', action='store_true', help='不產生試撮資料 (Flag=1)')
+    parser.add_argument('--no-seq', action='store_true', help='不輸出序號欄位')
+    parser.add_argument('--seed', type=int, default=42, help='亂數種子 (預設: 42)')
+    parser.add_argument('--output-dir', type=Path, default=DATA_DIR / 'synthetic', help='輸出目錄')
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("合成 Quote 檔案產生器")
+    print("=" * 80)
+
+    generate_dataset(
+        args.output_dir, args.dates, stocks=args.stocks, ticks=args.ticks, size_mb=args.size_mb,
+        depth_ratio=args.depth_ratio, dup_depth_ratio=args.dup_depth_ratio,
+        limit_up_ratio=args.limit_up_ratio, target_ratio=args.target_ratio,
+        trial_periods='' if args.no_trial else args.trial_periods,
+        with_seq=not args.no_seq, seed=args.seed
+    )
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    main()
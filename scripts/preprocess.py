@@ -1,14 +1,29 @@
 """
 預處理腳本：將所有 Parquet 檔案轉換成靜態 JSON 檔案
 用於 Nginx 直接服務，達到極致效能
+
+指定 --json-log 時，每個股票日的逐階段耗時（read / 各區段建構 / serialize / write）
+會輸出為 JSON Lines，最後列出各階段總耗時；
+指定 --profile 時每個 worker 行程以 cProfile 剖析，結束後合併為 pstats 與 collapsed stack；
+每個股票日的記憶體峰值於結束時列成摘要表，--memory-limit 超限的任務跳過並記錄
 """
+import numpy as np
 import pandas as pd
 import os
-import json
 import glob
 from pathlib import Path
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import time
+import argparse
+
+from utils import setup_logger, log_event, log_stage_summary, StageTimer
+from utils.logger import ProgressBar
+from utils.profiling import ProfiledTask, add_profile_arguments, resolve_profile_dir, report_profiles
+from utils.memory import MemoryWatch, add_memory_arguments, log_memory_summary
+from utils.depth_codec import encode_depth_history
+from utils.json_io import encode_json
+from utils.parquet_io import TRADE_COLUMNS, DEPTH_COLUMNS, read_quote_rows
+from utils.timeline import build_event_timeline, datetime_to_us_of_day, time_ordered
 
 # 從 web_viewer.py 複製必要的函數
 def prepare_chart_data(df):
@@ -23,7 +38,7 @@ def prepare_chart_data(df):
     if 'Datetime' not in trade_df.columns:
         return None
 
-    trade_df = trade_df.sort_values('Datetime')
+    trade_df = time_ordered(trade_df)
 
     if not pd.api.types.is_datetime64_any_dtype(trade_df['Datetime']):
         trade_df['Datetime'] = pd.to_datetime(trade_df['Datetime'])
@@ -47,19 +62,16 @@ def prepare_chart_data(df):
     cumulative_pv = (prices * volumes).cumsum()
     cumulative_volume = volumes.cumsum()
 
-    # 避免除以零
-    vwap_values = []
-    for i in range(len(cumulative_volume)):
-        if cumulative_volume[i] > 0:
-            vwap_values.append(cumulative_pv[i] / cumulative_volume[i])
-        else:
-            vwap_values.append(prices[i])
+    # 避免除以零（累積量為 0 時以當筆價格代替）
+    has_volume = cumulative_volume > 0
+    vwap_values = np.where(has_volume, cumulative_pv / np.where(has_volume, cumulative_volume, 1), prices)
 
+    # 數值欄位保留 NumPy 陣列，由 utils.json_io 直接序列化
     chart_data = {
         'timestamps': trade_df_market['Datetime'].astype(str).tolist(),
-        'prices': trade_df_market['Price'].fillna(0).tolist(),
-        'volumes': trade_df_market['FilteredVolume'].fillna(0).tolist(),
-        'total_volumes': trade_df_market['TotalVolume'].fillna(0).tolist(),
+        'prices': trade_df_market['Price'].fillna(0).to_numpy(),
+        'volumes': trade_df_market['FilteredVolume'].fillna(0).to_numpy(),
+        'total_volumes': trade_df_market['TotalVolume'].fillna(0).to_numpy(),
         'vwap': vwap_values
     }
 
@@ -74,7 +86,7 @@ def prepare_depth_data(df):
     if depth_df.empty:
         return None
 
-    depth_df = depth_df.sort_values('Datetime', ascending=False)
+    depth_df = time_ordered(depth_df, ascending=False)
     latest = depth_df.iloc[0]
 
     bids = []
@@ -110,8 +122,8 @@ def prepare_depth_data(df):
         'timestamp': str(latest['Datetime']) if 'Datetime' in latest else ''
     }
 
-def prepare_depth_history(df):
-    """準備五檔歷史資料"""
+def prepare_depth_history(df, encoding='full'):
+    """準備五檔歷史資料（encoding='delta' 時輸出差分編碼）"""
     if df is None or df.empty:
         return []
 
@@ -126,7 +138,10 @@ def prepare_depth_history(df):
         depth_df['Datetime'] = pd.to_datetime(depth_df['Datetime'])
 
     depth_df = depth_df[depth_df['Datetime'].dt.hour >= 9].copy()
-    depth_df = depth_df.sort_values('Datetime')
+    depth_df = time_ordered(depth_df)
+
+    if encoding == 'delta':
+        return encode_depth_history(depth_df, [str(ts) for ts in depth_df['Datetime']])
 
     history = []
     for _, row in depth_df.iterrows():
@@ -160,6 +175,20 @@ def prepare_depth_history(df):
 
     return history
 
+def prepare_event_timeline(df):
+    """準備統一時間軸（成交與五檔合併後的事件流，索引對應 chart 與 depth_history）"""
+    if df is None or df.empty or 'Datetime' not in df.columns:
+        return None
+
+    times = {}
+    for data_type in ('Trade', 'Depth'):
+        type_df = df[df['Type'] == data_type]
+        datetimes = pd.to_datetime(type_df['Datetime'])
+        datetimes = datetimes[datetimes.dt.hour >= 9].sort_values()
+        times[data_type] = datetime_to_us_of_day(datetimes)
+
+    return build_event_timeline(times['Trade'], times['Depth'])
+
 def prepare_trade_details(df):
     """準備成交明細"""
     if df is None or df.empty:
@@ -182,11 +211,11 @@ def prepare_trade_details(df):
         if not pd.api.types.is_datetime64_any_dtype(depth_df['Datetime']):
             depth_df['Datetime'] = pd.to_datetime(depth_df['Datetime'])
         depth_df = depth_df[depth_df['Datetime'].dt.hour >= 9].copy()
-        depth_df = depth_df.sort_values('Datetime')
+        depth_df = time_ordered(depth_df)
     else:
         depth_df = pd.DataFrame()
 
-    trade_df = trade_df.sort_values('Datetime', ascending=False)
+    trade_df = time_ordered(trade_df, ascending=False)
 
     details = []
     for _, row in trade_df.iterrows():
@@ -195,7 +224,8 @@ def prepare_trade_details(df):
 
         inner_outer = '–'
         if not depth_df.empty and trade_price > 0:
-            prior_depths = depth_df[depth_df['Datetime'] <= trade_time]
+            # 時間早於成交的最近一筆五檔（同一時間的五檔排在成交之後，見 utils/timeline.py）
+            prior_depths = depth_df[depth_df['Datetime'] < trade_time]
             if not prior_depths.empty:
                 closest_depth = prior_depths.iloc[-1]
 
@@ -279,8 +309,14 @@ def calculate_statistics(df):
     return stats
 
 def process_single_parquet(args):
-    """處理單一 Parquet 檔案並轉成 JSON"""
-    parquet_file, output_base_dir = args
+    """
+    處理單一 Parquet 檔案並轉成 JSON
+
+    Returns:
+        (處理結果訊息, 逐階段計時與記憶體峰值；跳過或失敗時為 None)
+    """
+    parquet_file, output_base_dir, depth_encoding, memory_limit_mb, memory_trace = args
+    memory = MemoryWatch(memory_limit_mb, memory_trace)
 
     try:
         # 解析路徑：data/processed_data/20251112/2330.parquet
@@ -293,43 +329,81 @@ def process_single_parquet(args):
         output_file = os.path.join(output_dir, f"{stock_code}.json")
 
         if os.path.exists(output_file):
-            return f"跳過 {date_str}/{stock_code} (已存在)"
-
-        # 讀取 Parquet
-        df = pd.read_parquet(parquet_file)
-
-        # 準備所有資料
-        chart_data = prepare_chart_data(df)
-        depth_data = prepare_depth_data(df)
-        depth_history = prepare_depth_history(df)
-        trade_details = prepare_trade_details(df)
-        statistics = calculate_statistics(df)
-
-        # 組合成 API 格式
-        api_response = {
-            'chart': chart_data,
-            'depth': depth_data,
-            'depth_history': depth_history,
-            'trades': trade_details,
-            'stats': statistics,
-            'stock_code': stock_code,
-            'date': date_str
-        }
-
-        # 建立輸出目錄
-        os.makedirs(output_dir, exist_ok=True)
-
-        # 寫入 JSON（壓縮格式）
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(api_response, f, ensure_ascii=False, separators=(',', ':'))
-
-        return f"完成 {date_str}/{stock_code}"
+            return f"跳過 {date_str}/{stock_code} (已存在)", None
+
+        timer = StageTimer(date=date_str, stock=stock_code)
+
+        with memory:
+            # 分別讀取 Trade 與 Depth（只讀需要的 row group 與欄位）；
+            # 走勢圖與統計只需要成交，成交明細與時間軸才需要兩者合併
+            with timer.stage('read'):
+                trade_df = read_quote_rows(parquet_file, 'Trade', TRADE_COLUMNS)
+                depth_df = read_quote_rows(parquet_file, 'Depth', DEPTH_COLUMNS)
+                df = pd.concat([trade_df, depth_df], ignore_index=True)
+
+            # 準備所有資料
+            with timer.stage('chart'):
+                chart_data = prepare_chart_data(trade_df)
+            with timer.stage('depth'):
+                depth_data = prepare_depth_data(depth_df)
+            with timer.stage('depth_history'):
+                depth_history = prepare_depth_history(depth_df, encoding=depth_encoding)
+            with timer.stage('trades'):
+                trade_details = prepare_trade_details(df)
+            with timer.stage('stats'):
+                statistics = calculate_statistics(trade_df)
+            with timer.stage('timeline'):
+                timeline = prepare_event_timeline(df)
+
+            # 組合成 API 格式
+            api_response = {
+                'chart': chart_data,
+                'depth': depth_data,
+                'depth_history': depth_history,
+                'trades': trade_details,
+                'stats': statistics,
+                'timeline': timeline,
+                'stock_code': stock_code,
+                'date': date_str
+            }
+
+            # 序列化（壓縮格式，NumPy 陣列直接寫成 JSON）
+            with timer.stage('serialize'):
+                payload = encode_json(api_response)
+
+        # 超過記憶體上限時離開 with memory 即拋出例外，不會寫出；
+        # 寫出在監控區塊之外（取樣執行緒的非同步例外不會中斷寫入），
+        # 並先寫暫存檔再以 os.replace 取代，中斷時不會留下被下次執行當成已存在的不完整 JSON
+        with timer.stage('write'):
+            os.makedirs(output_dir, exist_ok=True)
+            tmp_file = f"{output_file}.tmp"
+            with open(tmp_file, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_file, output_file)
+
+        timer.context.update(rows=len(df), trade_rows=len(trade_df), depth_rows=len(depth_df),
+                             input_bytes=os.path.getsize(parquet_file),
+                             output_bytes=os.path.getsize(output_file), worker=os.getpid(), **memory.as_dict())
+        return f"完成 {date_str}/{stock_code}", timer.as_dict()
+
+    except MemoryError:
+        return f"記憶體超限 {date_str}/{stock_code} ({memory.describe()})", None
 
     except Exception as e:
-        return f"錯誤 {parquet_file}: {e}"
+        return f"錯誤 {parquet_file}: {e}", None
 
 def main():
     """主程式"""
+    parser = argparse.ArgumentParser(description='Parquet → JSON 預處理程式')
+    parser.add_argument('--depth-delta', action='store_true',
+                        help='depth_history 使用差分編碼（定期完整快照 + 變動檔位）')
+    parser.add_argument('--json-log', type=Path, default=None,
+                        help='逐階段計時等結構化日誌的輸出路徑（JSON Lines，附加寫入）')
+    add_profile_arguments(parser)
+    add_memory_arguments(parser)
+    cli_args = parser.parse_args()
+    depth_encoding = 'delta' if cli_args.depth_delta else 'full'
+
     print("=" * 80)
     print("Parquet → JSON 預處理程式")
     print("將所有 Parquet 轉換成靜態 JSON，供 Nginx 或簡易伺服器使用")
@@ -353,7 +427,8 @@ def main():
         return
 
     # 準備參數
-    args_list = [(f, output_base_dir) for f in parquet_files]
+    args_list = [(f, output_base_dir, depth_encoding, cli_args.memory_limit, cli_args.memory_trace)
+                 for f in parquet_files]
 
     # 使用多進程處理
     max_workers = min(os.cpu_count() or 4, 8)
@@ -361,13 +436,31 @@ def main():
 
     start_time = time.time()
 
-    with ProcessPoolExecutor(max_workers=max_workers) as executor:
-        results = list(executor.map(process_single_parquet, args_list))
+    logger = setup_logger('preprocess', json_log_file=cli_args.json_log)
+    profile_dir = resolve_profile_dir(cli_args, 'preprocess')
+    task = ProfiledTask(process_single_parquet, profile_dir, cli_args.profile_memory) if profile_dir else process_single_parquet
+
+    outcomes = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor, \
+            ProgressBar(len(args_list), '轉換', workers=max_workers, logger=logger) as progress:
+        futures = [executor.submit(task, a) for a in args_list]
+        for future in as_completed(futures):
+            message, timing = future.result()
+            outcomes.append((message, timing))
+            if timing:
+                progress.update(1, bytes=timing['input_bytes'], lines=timing['rows'],
+                                worker=timing['worker'], busy_seconds=timing['total'])
+            else:
+                progress.update(1)
+
+    results = [message for message, _ in outcomes]
+    timings = [timing for _, timing in outcomes if timing]
 
     # 統計結果
     completed = sum(1 for r in results if '完成' in r)
     skipped = sum(1 for r in results if '跳過' in r)
     errors = sum(1 for r in results if '錯誤' in r)
+    over_limit = [r for r in results if '記憶體超限' in r]
 
     elapsed = time.time() - start_time
 
@@ -377,8 +470,17 @@ def main():
     print(f"完成: {completed} 個")
     print(f"跳過: {skipped} 個")
     print(f"錯誤: {errors} 個")
+    if over_limit:
+        print(f"記憶體超限: {len(over_limit)} 個")
     print(f"耗時: {elapsed:.2f} 秒")
     print(f"輸出目錄: {output_base_dir}")
+
+    for timing in timings:
+        log_event(logger, 'stage_timing', **timing)
+    log_stage_summary(logger, timings)
+    log_memory_summary(logger, timings, top=cli_args.memory_top)
+    if profile_dir:
+        report_profiles(profile_dir, logger, top=cli_args.profile_top)
     print("=" * 80)
 
     # 顯示錯誤（如果有）
@@ -388,5 +490,11 @@ def main():
         for err in error_results[:10]:  # 只顯示前 10 個
             print(f"  {err}")
 
+    if over_limit:
+        print("\n記憶體超限而跳過的股票日:")
+        for message in over_limit:
+            print(f"  {message}")
+            log_event(logger, 'memory_limit_exceeded', message=message)
+
 if __name__ == "__main__":
     main()
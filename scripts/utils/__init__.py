@@ -4,8 +4,10 @@ Stock Quote Data Processing Utilities
 """
 
 from .parser import parse_trade_line, parse_depth_line, parse_timestamp
-from .data_loader import load_limit_up_list, get_target_stocks
-from .logger import setup_logger, log_progress
+from .data_loader import load_limit_up_list, get_target_stocks, read_quote_file
+from .logger import setup_logger, log_progress, log_event, log_stage_summary, StageTimer
+from .depth_codec import encode_depth_history, decode_depth_history
+from .tick_store import TickStore
 
 __all__ = [
     'parse_trade_line',
@@ -13,8 +15,15 @@ __all__ = [
     'parse_timestamp',
     'load_limit_up_list',
     'get_target_stocks',
+    'read_quote_file',
     'setup_logger',
-    'log_progress'
+    'log_progress',
+    'log_event',
+    'log_stage_summary',
+    'StageTimer',
+    'encode_depth_history',
+    'decode_depth_history',
+    'TickStore'
 ]
 
 __version__ = '1.0.0'
@@ -13,8 +13,13 @@ PROJECT_ROOT = SCRIPT_DIR.parent
 # 資料路徑
 DATA_DIR = PROJECT_ROOT / 'data'
 DECODED_DIR = DATA_DIR / 'decoded_quotes'
+CONSOLIDATED_DIR = DATA_DIR / 'decoded_daily'  # 每日合併檔（batch_decode --consolidate）
 PROCESSED_DIR = DATA_DIR / 'processed_data'
 LIMIT_UP_FILE = DATA_DIR / 'lup_ma20_filtered.parquet'
+LIVE_CHECKPOINT_DIR = DATA_DIR / 'live_checkpoints'
+BENCHMARK_DIR = DATA_DIR / 'benchmarks'
+HOT_TIER_DIR = DATA_DIR / 'hot_tier'  # 伺服器的 Arrow IPC 熱層（見 utils/hot_tier.py）
+PROFILE_DIR = DATA_DIR / 'profiles'
 
 # 輸出路徑
 OUTPUT_DIR = PROJECT_ROOT / 'frontend' / 'static' / 'api'
@@ -23,6 +28,11 @@ QUERY_RESULTS_DIR = DATA_DIR / 'single_query_results'
 # 處理參數
 DEFAULT_MAX_WORKERS = min(4, os.cpu_count() or 4)
 PRICE_DECIMAL_DIVISOR = 10000  # 價格需要除以 10000
+LIVE_POLL_INTERVAL = 2.0  # 盤中追蹤模式：沒有新資料時的等待秒數
+LIVE_FOLLOW_UNTIL = '1335'  # 盤中追蹤模式：超過此時間（HHMM）且無新資料即結束
+LIVE_SEGMENT_FANOUT = 8  # 盤中追蹤模式：每 N 個涵蓋相同批次數的分段檔合併為一個
+DEPTH_KEYFRAME_INTERVAL = 100  # 五檔差分編碼：每 N 筆輸出一次完整快照
+HOT_TIER_MAX_MB = 0  # Arrow IPC 熱層大小上限 (MB)，0 表示停用（可由 QUOTE_HOT_TIER_MB 或 --hot-tier-mb 設定）
 
 # 時間相關
 TIMESTAMP_LENGTH = 12  # 時間戳補零長度
@@ -47,6 +57,7 @@ def get_config() -> Dict[str, Any]:
     return {
         'data_dir': str(DATA_DIR),
         'decoded_dir': str(DECODED_DIR),
+        'consolidated_dir': str(CONSOLIDATED_DIR),
         'processed_dir': str(PROCESSED_DIR),
         'limit_up_file': str(LIMIT_UP_FILE),
         'output_dir': str(OUTPUT_DIR),
@@ -2,11 +2,23 @@
 資料載入模組
 處理漲停清單載入和目標股票篩選
 """
+import time
 import pandas as pd
 from datetime import datetime, timedelta
-from typing import Dict, Set
+from typing import Dict, Set, Optional, Tuple
 from pathlib import Path
 
+from .parser import parse_trade_line, parse_depth_line
+from .parquet_io import read_decoded_frame
+
+# 逐塊讀取的大小提示（readlines 的 hint，單位為字元）
+READ_CHUNK_HINT = 4 * 1024 * 1024
+
+# 判斷五檔是否重複的欄位（委買/委賣檔數與五檔價量）
+DEPTH_STATE_FIELDS = ['BidCount', 'AskCount'] + [
+    f'{side}{level}_{field}' for level in range(1, 6) for side in ('Bid', 'Ask') for field in ('Price', 'Volume')
+]
+
 
 def load_limit_up_list(parquet_file: Path) -> Dict[str, Set[str]]:
     """
@@ -73,7 +85,7 @@ def get_target_stocks(limit_up_dict: Dict[str, Set[str]], current_date: str) ->
 
 def load_parquet_to_dataframe(parquet_path: Path) -> pd.DataFrame:
     """
-    載入 Parquet 檔案為 DataFrame
+    載入 Parquet 檔案為 DataFrame（整數 tick 價格還原為浮點價格）
 
     Args:
         parquet_path: Parquet 檔案路徑
@@ -81,10 +93,88 @@ def load_parquet_to_dataframe(parquet_path: Path) -> pd.DataFrame:
     Returns:
         DataFrame
     """
-    return pd.read_parquet(parquet_path)
+    return read_decoded_frame(parquet_path)
+
+
+def match_quote_line(line: str, target_stocks: Set[str]) -> Optional[Tuple[str, str]]:
+    """
+    判斷資料行是否為目標股票的 Trade / Depth（不解析內容）
+
+    Args:
+        line: 原始資料行
+        target_stocks: 目標股票代碼集合
+
+    Returns:
+        (股票代碼, 'trade' 或 'depth')，非目標資料行返回 None
+    """
+    # 只處理 Trade 和 Depth 資料行
+    if line.startswith('Trade,'):
+        kind = 'trade'
+    elif line.startswith('Depth,'):
+        kind = 'depth'
+    else:
+        return None
+
+    fields = line.split(',', 2)
+    if len(fields) < 2:
+        return None
+
+    stock_code = fields[1].strip()
+    if stock_code not in target_stocks:
+        return None
+
+    return stock_code, kind
+
+
+class DepthDeduplicator:
+    """
+    略過與同一股票前一筆五檔完全相同的五檔快照（中間夾雜成交時仍視為同一狀態）
+
+    dropped 為累計略過筆數，by_stock 為各股票略過筆數
+    """
+
+    def __init__(self):
+        self.last_state = {}
+        self.dropped = 0
+        self.by_stock = {}
+
+    def is_duplicate(self, record: dict) -> bool:
+        """record 與同股票前一筆五檔相同時返回 True（並計數），否則記錄為最新狀態"""
+        stock_code = record['StockCode']
+        state = tuple(record[field] for field in DEPTH_STATE_FIELDS)
+        if self.last_state.get(stock_code) == state:
+            self.dropped += 1
+            self.by_stock[stock_code] = self.by_stock.get(stock_code, 0) + 1
+            return True
+        self.last_state[stock_code] = state
+        return False
+
+
+def parse_quote_line(line: str, target_stocks: Set[str], date_str: str) -> Optional[Tuple[str, str, Optional[dict]]]:
+    """
+    解析單行 Quote 資料（只處理目標股票的 Trade 和 Depth）
 
+    Args:
+        line: 原始資料行
+        target_stocks: 目標股票代碼集合
+        date_str: 日期字串 (YYYYMMDD)
 
-def read_quote_file(file_path: Path, target_stocks: Set[str], date_str: str) -> Dict[str, list]:
+    Returns:
+        (股票代碼, 'trade' 或 'depth', 解析結果)；解析失敗時解析結果為 None，
+        非目標資料行返回 None
+    """
+    match = match_quote_line(line, target_stocks)
+    if match is None:
+        return None
+
+    stock_code, kind = match
+    if kind == 'trade':
+        return stock_code, kind, parse_trade_line(line, date_str)
+    return stock_code, kind, parse_depth_line(line, date_str)
+
+
+def read_quote_file(file_path: Path, target_stocks: Set[str], date_str: str, timer=None,
+                    dedup_depth: bool = False) -> Dict[str, list]:
     """
     讀取 Quote 檔案並解析指定股票的資料
 
@@ -92,50 +182,62 @@ def read_quote_file(file_path: Path, target_stocks: Set[str], date_str: str) ->
         file_path: Quote 檔案路徑
         target_stocks: 目標股票代碼集合
         date_str: 日期字串 (YYYYMMDD)
+        timer: StageTimer（可選），累計 read / filter / parse 三個階段的耗時
+        dedup_depth: 略過與同股票前一筆相同的五檔快照（略過筆數記於 stats['depth_dropped']）
 
     Returns:
         股票代碼到記錄列表的字典 {stock_code: [record, ...]}
     """
-    from .parser import parse_trade_line, parse_depth_line
-
     # 初始化資料容器
     stock_data = {stock: [] for stock in target_stocks}
-    stats = {'trade': 0, 'depth': 0, 'error': 0}
+    stats = {'trade': 0, 'depth': 0, 'error': 0, 'lines': 0, 'depth_dropped': 0}
+    deduplicator = DepthDeduplicator() if dedup_depth else None
+    parsers = {'trade': parse_trade_line, 'depth': parse_depth_line}
+    clock = time.perf_counter
 
     try:
         with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            for line in f:
-                # 只處理 Trade 和 Depth 資料行
-                if not line.startswith('Trade,') and not line.startswith('Depth,'):
-                    continue
-
-                fields = line.split(',')
-                if len(fields) < 2:
-                    continue
-
-                stock_code = fields[1].strip()
-                if stock_code not in target_stocks:
-                    continue
-
-                # 解析資料
-                if line.startswith('Trade,'):
-                    parsed = parse_trade_line(line, date_str)
-                    if parsed:
-                        stock_data[stock_code].append(parsed)
-                        stats['trade'] += 1
+            while True:
+                read_start = clock()
+                lines = f.readlines(READ_CHUNK_HINT)
+                if timer is not None:
+                    timer.add('read', clock() - read_start)
+                if not lines:
+                    break
+                stats['lines'] += len(lines)
+
+                chunk_start = clock()
+                parse_seconds = 0.0
+                for line in lines:
+                    match = match_quote_line(line, target_stocks)
+                    if match is None:
+                        continue
+
+                    stock_code, kind = match
+                    if timer is not None:
+                        parse_start = clock()
+                        parsed = parsers[kind](line, date_str)
+                        parse_seconds += clock() - parse_start
                     else:
-                        stats['error'] += 1
+                        parsed = parsers[kind](line, date_str)
 
-                elif line.startswith('Depth,'):
-                    parsed = parse_depth_line(line, date_str)
                     if parsed:
+                        if deduplicator is not None and kind == 'depth' and deduplicator.is_duplicate(parsed):
+                            continue
                         stock_data[stock_code].append(parsed)
-                        stats['depth'] += 1
+                        stats[kind] += 1
                     else:
                         stats['error'] += 1
 
+                if timer is not None:
+                    timer.add('filter', clock() - chunk_start - parse_seconds)
+                    timer.add('parse', parse_seconds)
+
     except Exception as e:
         print(f"  讀取錯誤: {e}")
         return {}
 
+    if deduplicator is not None:
+        stats['depth_dropped'] = deduplicator.dropped
+        stats['depth_dropped_by_stock'] = deduplicator.by_stock
     return stock_data, stats
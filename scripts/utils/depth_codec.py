@@ -0,0 +1,143 @@
+"""
+五檔差分編碼模組
+連續的 Depth 快照通常只有一兩檔變動，改為「定期完整快照 + 變動檔位」的格式輸出
+
+編碼格式（depth_history 的 delta 版本）:
+{
+    'encoding': 'delta',
+    'keyframe_interval': N,
+    'timestamps': [...],                    # 每筆快照的時間
+    'keyframes': [[slot, ...], ...],        # 第 0, N, 2N... 筆的完整快照
+    'deltas': [[[side, level, price, volume], ...], ...]  # 每筆快照相對前一筆的變動
+}
+
+- slot: 買1~買5、賣1~賣5 共 10 格，每格為 [價格, 數量] 或 null（該檔無報價）
+- side: 0=買盤, 1=賣盤；level: 0~4 對應第 1~5 檔
+- 變動後該檔無報價時，price 與 volume 皆為 null
+- price_ticks=True 時價格為整數 tick（見 utils/price_ticks.py）
+"""
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Any
+
+from .config import DEPTH_KEYFRAME_INTERVAL
+
+DEPTH_LEVELS = 5
+PRICE_COLUMNS = [f'Bid{i}_Price' for i in range(1, DEPTH_LEVELS + 1)] + \
+                [f'Ask{i}_Price' for i in range(1, DEPTH_LEVELS + 1)]
+VOLUME_COLUMNS = [f'Bid{i}_Volume' for i in range(1, DEPTH_LEVELS + 1)] + \
+                 [f'Ask{i}_Volume' for i in range(1, DEPTH_LEVELS + 1)]
+
+
+def _book_arrays(depth_df: pd.DataFrame) -> tuple:
+    """
+    取出 10 格價量矩陣
+
+    Returns:
+        (prices, volumes, present)，形狀皆為 (筆數, 10)
+    """
+    n = len(depth_df)
+    prices = np.full((n, 2 * DEPTH_LEVELS), np.nan)
+    volumes = np.full((n, 2 * DEPTH_LEVELS), np.nan)
+
+    for j, (price_col, volume_col) in enumerate(zip(PRICE_COLUMNS, VOLUME_COLUMNS)):
+        if price_col in depth_df.columns:
+            prices[:, j] = pd.to_numeric(depth_df[price_col], errors='coerce').to_numpy(dtype=float)
+        if volume_col in depth_df.columns:
+            volumes[:, j] = pd.to_numeric(depth_df[volume_col], errors='coerce').to_numpy(dtype=float)
+
+    present = ~np.isnan(prices) & ~np.isnan(volumes)
+    return prices, volumes, present
+
+
+def _slot_value(price: float, volume: float, present: bool, to_price=float) -> Optional[List]:
+    """單一檔位轉為 [價格, 數量] 或 None"""
+    if not present:
+        return None
+    return [to_price(price), int(volume)]
+
+
+def encode_depth_history(depth_df: pd.DataFrame, timestamps: List[str],
+                         keyframe_interval: int = DEPTH_KEYFRAME_INTERVAL,
+                         price_ticks: bool = False) -> Dict[str, Any]:
+    """
+    將五檔歷史編碼為差分格式
+
+    Args:
+        depth_df: 已過濾、已依時間排序的 Depth 資料
+        timestamps: 每筆快照的時間字串（與 depth_df 同順序，格式由呼叫端決定）
+        keyframe_interval: 完整快照間隔（筆數）
+        price_ticks: depth_df 的價格為整數 tick，輸出整數價格
+
+    Returns:
+        差分編碼後的字典
+    """
+    keyframe_interval = max(1, int(keyframe_interval))
+    to_price = int if price_ticks else float
+    prices, volumes, present = _book_arrays(depth_df)
+    n = len(depth_df)
+
+    # 與前一筆比較：有無報價改變、或價量任一改變
+    changed = np.zeros_like(present)
+    if n > 1:
+        changed[1:] = (present[1:] != present[:-1]) | (
+            present[1:] & ((prices[1:] != prices[:-1]) | (volumes[1:] != volumes[:-1]))
+        )
+
+    keyframes = []
+    deltas = []
+    for i in range(n):
+        if i % keyframe_interval == 0:
+            keyframes.append([_slot_value(prices[i, j], volumes[i, j], present[i, j], to_price)
+                              for j in range(2 * DEPTH_LEVELS)])
+            deltas.append([])
+            continue
+
+        row_changes = []
+        for j in np.flatnonzero(changed[i]):
+            side, level = divmod(int(j), DEPTH_LEVELS)
+            if present[i, j]:
+                row_changes.append([side, level, to_price(prices[i, j]), int(volumes[i, j])])
+            else:
+                row_changes.append([side, level, None, None])
+        deltas.append(row_changes)
+
+    return {
+        'encoding': 'delta',
+        'keyframe_interval': keyframe_interval,
+        'timestamps': list(timestamps),
+        'keyframes': keyframes,
+        'deltas': deltas
+    }
+
+
+def decode_depth_history(encoded: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    參考解碼器：將差分格式還原為原本的 depth_history 列表
+
+    Args:
+        encoded: encode_depth_history 的輸出
+
+    Returns:
+        [{'timestamp': ..., 'bids': [...], 'asks': [...]}, ...]
+    """
+    interval = encoded['keyframe_interval']
+    keyframes = encoded['keyframes']
+    history = []
+    slots: List[Optional[List]] = [None] * (2 * DEPTH_LEVELS)
+
+    for i, (timestamp, changes) in enumerate(zip(encoded['timestamps'], encoded['deltas'])):
+        if i % interval == 0:
+            slots = [list(s) if s is not None else None for s in keyframes[i // interval]]
+        else:
+            for side, level, price, volume in changes:
+                slot_index = side * DEPTH_LEVELS + level
+                slots[slot_index] = None if price is None else [price, volume]
+
+        history.append({
+            'timestamp': timestamp,
+            'bids': [{'price': s[0], 'volume': s[1]} for s in slots[:DEPTH_LEVELS] if s is not None],
+            'asks': [{'price': s[0], 'volume': s[1]} for s in slots[DEPTH_LEVELS:] if s is not None]
+        })
+
+    return history
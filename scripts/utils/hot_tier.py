@@ -0,0 +1,264 @@
+"""
+Arrow IPC 熱層模組
+將最近讀取（或最新日期）的解碼 Parquet 轉存為無壓縮的 Arrow IPC（Feather v2）檔案，
+伺服器以記憶體映射讀取：不需解壓縮與解碼，資料頁由作業系統的 page cache 在多個行程間共用
+
+- 檔案依 Type 分段存成多個 record batch，讀取成交或五檔時只取對應的 batch
+- 以來源 Parquet 的修改時間與大小判斷是否過期（盤中持續寫入的檔案會自動重建）
+- 未命中或過期時由 Parquet 重建；總大小超過上限時依最後使用時間（檔案 mtime）淘汰，
+  多個伺服器行程共用同一個熱層目錄時淘汰順序一致
+
+使用方式：
+    hot_tier = ArrowHotTier(max_bytes=2 * 1024 ** 3)
+    trade_df = hot_tier.read_quote_rows(parquet_path, 'Trade', TRADE_COLUMNS)
+"""
+import json
+import os
+import threading
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from .config import HOT_TIER_DIR, HOT_TIER_MAX_MB
+from .parquet_io import live_segment_dir, read_quote_rows
+from .price_ticks import apply_price_mode, price_scale_of
+from .timeline import time_ordered
+
+# 熱層檔案的自訂 metadata（來源檔案狀態與各 batch 的 Type）
+HOT_TIER_METADATA_KEY = b'quote_hot_tier'
+
+HOT_TIER_SUFFIX = '.arrow'
+
+MB = 1024 * 1024
+
+
+def hot_tier_max_mb() -> float:
+    """熱層大小上限 (MB)：環境變數 QUOTE_HOT_TIER_MB 優先，0 表示停用"""
+    try:
+        return float(os.environ.get('QUOTE_HOT_TIER_MB', HOT_TIER_MAX_MB))
+    except ValueError:
+        return HOT_TIER_MAX_MB
+
+
+class ArrowHotTier:
+    """
+    Parquet 的 Arrow IPC 熱層（大小上限 + LRU 淘汰）
+
+    Args:
+        root: 熱層目錄（預設 HOT_TIER_DIR）
+        max_bytes: 熱層總大小上限
+
+    hits / misses / evictions 為本行程的累計次數；len() 為熱層中的檔案數
+    """
+
+    def __init__(self, root: Union[str, Path] = HOT_TIER_DIR, max_bytes: int = int(HOT_TIER_MAX_MB * MB)):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"ArrowHotTier(root={str(self.root)!r}, max_mb={self.max_bytes / MB:.0f})"
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._files())
+
+    def _files(self):
+        if not self.root.exists():
+            return iter(())
+        return self.root.glob(f'*/*/*{HOT_TIER_SUFFIX}')
+
+    def path_for(self, parquet_path: Union[str, Path]) -> Path:
+        """熱層檔案路徑：{root}/{來源目錄名}/{date}/{stock}.arrow"""
+        parquet_path = Path(parquet_path)
+        return self.root / parquet_path.parent.parent.name / parquet_path.parent.name / (
+            parquet_path.stem + HOT_TIER_SUFFIX)
+
+    def read_quote_rows(self, parquet_path: Union[str, Path], data_type: str,
+                        columns: Optional[Sequence[str]] = None, price_ticks: bool = False) -> pd.DataFrame:
+        """
+        同 parquet_io.read_quote_rows，但由熱層讀取（熱層檔案沿用來源的正規順序，只做 O(n) 檢查）
+
+        熱層無法使用時（例如磁碟已滿、Windows 上檔案仍被映射）退回直接讀取 Parquet；
+        盤中追蹤中（有分段檔，見 parquet_io.live_segments）的檔案同樣直接讀取，不進熱層
+        """
+        if live_segment_dir(parquet_path).is_dir():
+            return read_quote_rows(parquet_path, data_type, columns, price_ticks=price_ticks)
+        try:
+            table = self.read_table(parquet_path, data_type, columns)
+        except OSError:
+            return read_quote_rows(parquet_path, data_type, columns, price_ticks=price_ticks)
+        df = apply_price_mode(table.to_pandas(), price_scale_of(table.schema.metadata), price_ticks)
+        return time_ordered(df)
+
+    def read_table(self, parquet_path: Union[str, Path], data_type: Optional[str] = None,
+                   columns: Optional[Sequence[str]] = None) -> pa.Table:
+        """
+        以記憶體映射讀取熱層檔案（未命中或過期時由 Parquet 重建）
+
+        Args:
+            parquet_path: 來源 Parquet 路徑
+            data_type: 'Trade' / 'Depth'，None 表示全部
+            columns: 欄位投影（檔案中不存在的欄位略過）
+
+        Returns:
+            pyarrow Table（資料緩衝區直接指向映射的檔案）
+        """
+        source = Path(parquet_path)
+        stat = source.stat()
+        hot_path = self.path_for(source)
+
+        opened = self._open(hot_path, stat)
+        if opened is None:
+            with self._lock:
+                self.misses += 1
+            self._rebuild(source, stat, hot_path)
+            opened = self._open(hot_path, stat)
+            if opened is None:
+                raise OSError(f"無法建立熱層檔案: {hot_path}")
+        else:
+            with self._lock:
+                self.hits += 1
+            self._touch(hot_path)
+
+        reader, batch_types = opened
+        indices = [i for i, batch_type in enumerate(batch_types)
+                   if data_type is None or batch_type in (data_type, None)]
+        table = pa.Table.from_batches([reader.get_batch(i) for i in indices], schema=reader.schema)
+
+        if data_type is not None and None in [batch_types[i] for i in indices]:
+            table = table.filter(pc.equal(table['Type'], data_type))
+        if columns is not None:
+            table = table.select([c for c in columns if c in table.schema.names])
+        return table
+
+    @staticmethod
+    def _open(hot_path: Path, stat: os.stat_result) -> Optional[Tuple[ipc.RecordBatchFileReader, List[Optional[str]]]]:
+        """開啟熱層檔案，不存在或與來源不一致時返回 None"""
+        try:
+            reader = ipc.open_file(pa.memory_map(str(hot_path), 'r'))
+        except (OSError, pa.ArrowInvalid):
+            return None
+
+        info = json.loads((reader.schema.metadata or {}).get(HOT_TIER_METADATA_KEY, b'{}'))
+        if info.get('mtime_ns') != stat.st_mtime_ns or info.get('size') != stat.st_size:
+            return None
+        return reader, info.get('batch_types', [None] * reader.num_record_batches)
+
+    @staticmethod
+    def _touch(hot_path: Path) -> None:
+        """更新最後使用時間（LRU 淘汰依據）"""
+        try:
+            os.utime(hot_path)
+        except OSError:
+            pass
+
+    def _rebuild(self, source: Path, stat: os.stat_result, hot_path: Path) -> None:
+        """由 Parquet 重建熱層檔案（依 Type 分段寫成 record batch），完成後檢查大小上限"""
+        table = pq.read_table(source)
+
+        batches = []
+        batch_types = []
+        if 'Type' in table.schema.names and table.num_rows > 0:
+            # 舊檔案（混合 row group）先依 Type 穩定排序
+            types = table['Type'].to_numpy(zero_copy_only=False)
+            if (types[1:] < types[:-1]).any():
+                order = np.argsort(types, kind='stable')
+                table = table.take(order)
+                types = types[order]
+            boundaries = [0] + (np.flatnonzero(types[1:] != types[:-1]) + 1).tolist() + [len(types)]
+            for start, end in zip(boundaries[:-1], boundaries[1:]):
+                for batch in table.slice(start, end - start).combine_chunks().to_batches():
+                    batches.append(batch)
+                    batch_types.append(str(types[start]))
+        else:
+            batches = table.combine_chunks().to_batches()
+            batch_types = [None] * len(batches)
+
+        info = {'source': str(source), 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+                'batch_types': batch_types}
+        schema_metadata = dict(table.schema.metadata or {})
+        schema_metadata[HOT_TIER_METADATA_KEY] = json.dumps(info).encode('utf-8')
+        schema = table.schema.with_metadata(schema_metadata)
+
+        hot_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = hot_path.with_name(f'{hot_path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        try:
+            with ipc.new_file(str(tmp_path), schema) as writer:
+                for batch in batches:
+                    writer.write_batch(batch)
+            os.replace(tmp_path, hot_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+        self.evict(keep=hot_path)
+
+    def evict(self, keep: Optional[Path] = None) -> int:
+        """
+        總大小超過上限時，依最後使用時間由舊到新刪除檔案
+
+        Args:
+            keep: 不淘汰的檔案（剛建立者）
+
+        Returns:
+            刪除的檔案數
+        """
+        entries = []
+        total = 0
+        for path in self._files():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if keep is not None and path == keep:
+                continue
+            try:
+                path.unlink()
+            except OSError:  # Windows 上仍被映射的檔案無法刪除，留待下次
+                continue
+            total -= size
+            removed += 1
+
+        if removed:
+            with self._lock:
+                self.evictions += removed
+        return removed
+
+    def warm(self, decoded_dir: Union[str, Path], dates: int = 1) -> int:
+        """
+        預先建立最新 N 個日期的熱層檔案（超過大小上限時只保留最後建立者）
+
+        Returns:
+            建立的檔案數
+        """
+        decoded_dir = Path(decoded_dir)
+        if not decoded_dir.exists() or dates <= 0:
+            return 0
+        date_dirs = sorted((d for d in decoded_dir.iterdir() if d.is_dir() and d.name.isdigit()),
+                           key=lambda d: d.name, reverse=True)[:dates]
+
+        built = 0
+        for date_dir in date_dirs:
+            for parquet_path in sorted(date_dir.glob('*.parquet')):
+                stat = parquet_path.stat()
+                hot_path = self.path_for(parquet_path)
+                if self._open(hot_path, stat) is None:
+                    self._rebuild(parquet_path, stat, hot_path)
+                    built += 1
+        return built
@@ -0,0 +1,84 @@
+"""
+JSON 序列化模組
+payload 中的 NumPy 陣列（例如走勢圖欄位）直接寫成 JSON bytes，不先以 tolist() 轉成 Python list：
+
+- 已安裝 orjson 時使用其 NumPy 支援（OPT_SERIALIZE_NUMPY），數值直接由陣列緩衝區格式化
+- 未安裝時退回標準 json，陣列在序列化時才轉為 list（與原本先 tolist() 再 json.dumps 的成本相同）
+
+輸出一律為緊湊格式，與 json.dumps(obj, ensure_ascii=..., sort_keys=..., separators=(',', ':')) 相同；
+兩種後端的已知差異（payload 建構時應避免）：
+- NaN / Infinity：orjson 輸出 null，標準 json 輸出非標準的 NaN / Infinity
+- 絕對值小於 1e-4 或大於等於 1e16 的浮點數，指數寫法不同（數值相同）
+- float32 陣列以 float32 的最短表示輸出；datetime64 陣列輸出為字串（時間請先以 timeline.format_times 轉換）
+
+使用方式：
+    body = encode_json(payload)                                     # bytes（UTF-8）
+    body = encode_json(payload, sort_keys=True, ensure_ascii=True)  # 與 Flask jsonify 相同的鍵順序與跳脫
+"""
+import json
+import re
+
+import numpy as np
+import pyarrow as pa
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+
+# ensure_ascii 時標準 json 另外跳脫的字元（DEL 與非 ASCII；其餘控制字元 orjson 已跳脫）
+_NON_ASCII = re.compile(r'[^\x00-\x7e]')
+_NON_ASCII_BYTES = re.compile(rb'[\x7f-\xff]')
+
+
+def json_default(obj):
+    """
+    NumPy / Arrow 物件的序列化（orjson 無法直接處理的陣列，例如字串或非連續陣列，也會交由此函數）
+    """
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (pa.Array, pa.ChunkedArray)):
+        if orjson is not None and obj.null_count == 0 and (
+                pa.types.is_integer(obj.type) or pa.types.is_floating(obj.type)):
+            return obj.to_numpy()
+        return obj.to_pylist()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def _escape_non_ascii(match) -> str:
+    """與標準 json 的 ensure_ascii 相同：\\uXXXX，BMP 以外的字元以 surrogate pair 表示"""
+    code = ord(match.group())
+    if code < 0x10000:
+        return f'\\u{code:04x}'
+    code -= 0x10000
+    return f'\\u{0xd800 | (code >> 10):04x}\\u{0xdc00 | (code & 0x3ff):04x}'
+
+
+def encode_json(obj, sort_keys: bool = False, ensure_ascii: bool = False) -> bytes:
+    """
+    序列化為緊湊格式的 JSON bytes（UTF-8）
+
+    Args:
+        obj: payload（可含 NumPy 陣列 / 純量與 Arrow 陣列）
+        sort_keys: 依鍵排序
+        ensure_ascii: 非 ASCII 字元以 \\uXXXX 跳脫
+    """
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            data = orjson.dumps(obj, default=json_default, option=option)
+        except TypeError:  # orjson 不支援的值（例如超過 64 位元的整數），改用標準 json
+            pass
+        else:
+            if ensure_ascii and _NON_ASCII_BYTES.search(data):
+                data = _NON_ASCII.sub(_escape_non_ascii, data.decode('utf-8')).encode('ascii')
+            return data
+
+    return json.dumps(obj, default=json_default, sort_keys=sort_keys, ensure_ascii=ensure_ascii,
+                      separators=(',', ':')).encode('utf-8')
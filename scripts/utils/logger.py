@@ -1,16 +1,46 @@
 """
 日誌系統模組
 統一的日誌輸出格式
+
+除了給人看的文字日誌外，也可另外輸出 JSON Lines 結構化日誌（每筆一行），
+搭配 StageTimer 記錄各日期/市場/股票的逐階段耗時，事後可直接彙總分析
 """
+import json
 import logging
 import sys
-from typing import Optional
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
 from pathlib import Path
 
+
+class JsonLineFormatter(logging.Formatter):
+    """JSON Lines 格式：每筆日誌一行，結構化欄位（record.fields）展開到最上層"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage()
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _TextOnlyFilter(logging.Filter):
+    """文字 handler 略過結構化事件，避免逐股票的計時洗版"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not getattr(record, 'structured', False)
+
+
 def setup_logger(
     name: str = 'stock_processor',
     level: int = logging.INFO,
-    log_file: Optional[Path] = None
+    log_file: Optional[Path] = None,
+    json_log_file: Optional[Path] = None
 ) -> logging.Logger:
     """
     設定日誌系統
@@ -19,6 +49,7 @@ def setup_logger(
         name: Logger 名稱
         level: 日誌級別
         log_file: 日誌檔案路徑（可選）
+        json_log_file: JSON Lines 結構化日誌路徑（可選，以附加模式寫入）
 
     Returns:
         配置好的 Logger
@@ -26,8 +57,11 @@ def setup_logger(
     logger = logging.getLogger(name)
     logger.setLevel(level)
 
+    if json_log_file:
+        add_json_log(logger, json_log_file)
+
     # 避免重複添加 handler
-    if logger.handlers:
+    if any(not isinstance(h.formatter, JsonLineFormatter) for h in logger.handlers):
         return logger
 
     # 格式化
@@ -40,6 +74,7 @@ def setup_logger(
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(level)
     console_handler.setFormatter(formatter)
+    console_handler.addFilter(_TextOnlyFilter())
     logger.addHandler(console_handler)
 
     # 檔案 handler（如果指定）
@@ -48,11 +83,130 @@ def setup_logger(
         file_handler = logging.FileHandler(log_file, encoding='utf-8')
         file_handler.setLevel(level)
         file_handler.setFormatter(formatter)
+        file_handler.addFilter(_TextOnlyFilter())
         logger.addHandler(file_handler)
 
     return logger
 
-def log_progress(current: int, total: int, prefix: str = '進度') -> None:
+def add_json_log(logger: logging.Logger, json_log_file: Path) -> None:
+    """
+    為 Logger 加上 JSON Lines 檔案 handler（同一檔案不重複添加）
+
+    Args:
+        logger: Logger
+        json_log_file: JSON Lines 檔案路徑
+    """
+    json_log_file = Path(json_log_file)
+    target = str(json_log_file.resolve())
+    for handler in logger.handlers:
+        if isinstance(handler, logging.FileHandler) and handler.baseFilename == target:
+            return
+
+    json_log_file.parent.mkdir(parents=True, exist_ok=True)
+    handler = logging.FileHandler(json_log_file, encoding='utf-8')
+    handler.setFormatter(JsonLineFormatter())
+    logger.addHandler(handler)
+
+def log_event(logger: logging.Logger, event: str, **fields) -> None:
+    """
+    輸出結構化事件（只寫入 JSON Lines handler，不出現在文字日誌）
+
+    Args:
+        logger: Logger
+        event: 事件名稱
+        **fields: 事件欄位
+    """
+    logger.info(event, extra={'fields': fields, 'structured': True})
+
+class StageTimer:
+    """
+    逐階段計時器
+
+    同名階段的耗時會累加；context 欄位（日期、市場、股票等）隨結果一起輸出
+
+    使用範例:
+        timer = StageTimer(date='20251031', stock='2330')
+        with timer.stage('read'):
+            df = pd.read_parquet(path)
+        log_event(logger, 'stage_timing', **timer.as_dict())
+    """
+
+    def __init__(self, **context):
+        self.context = context
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """量測 with 區塊的耗時"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float) -> None:
+        """累加階段耗時"""
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def as_dict(self) -> dict:
+        """context 欄位 + 各階段秒數 + 合計"""
+        return {
+            **self.context,
+            'stages': {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            'total': round(sum(self.stages.values()), 6)
+        }
+
+def summarize_stage_timings(timings: Iterable[dict]) -> Dict[str, float]:
+    """
+    彙總多筆 StageTimer.as_dict() 結果的各階段總耗時
+
+    Args:
+        timings: 計時結果
+
+    Returns:
+        {階段: 總秒數}，依耗時由大到小排序
+    """
+    totals: Dict[str, float] = {}
+    for timing in timings:
+        for name, seconds in timing.get('stages', {}).items():
+            totals[name] = totals.get(name, 0.0) + seconds
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+def log_stage_summary(logger: logging.Logger, timings: Iterable[dict]) -> Dict[str, float]:
+    """
+    以文字日誌輸出各階段總耗時與占比，並寫入結構化事件 stage_summary
+
+    Returns:
+        {階段: 總秒數}
+    """
+    totals = summarize_stage_timings(timings)
+    grand_total = sum(totals.values())
+    if not totals:
+        return totals
+
+    logger.info("階段耗時:")
+    for name, seconds in totals.items():
+        logger.info(f"  {name:<16}{seconds:>10.2f} 秒 ({seconds / grand_total * 100:5.1f}%)")
+    log_event(logger, 'stage_summary', stages={name: round(s, 6) for name, s in totals.items()},
+              total=round(grand_total, 6))
+    return totals
+
+def format_duration(seconds: Optional[float]) -> str:
+    """秒數格式化為 HH:MM:SS（None 或無限大時為 --:--:--）"""
+    if seconds is None or seconds != seconds or seconds == float('inf'):
+        return '--:--:--'
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+def format_rate(value: float, unit: str) -> str:
+    """速率格式化（K / M 縮寫）"""
+    if value >= 1_000_000:
+        return f"{value / 1_000_000:.1f}M {unit}/秒"
+    if value >= 1_000:
+        return f"{value / 1_000:.1f}K {unit}/秒"
+    return f"{value:.1f} {unit}/秒"
+
+def log_progress(current: int, total: int, prefix: str = '進度', start_time: Optional[float] = None) -> None:
     """
     輸出進度資訊
 
@@ -60,37 +214,183 @@ def log_progress(current: int, total: int, prefix: str = '進度') -> None:
         current: 當前進度
         total: 總數
         prefix: 前綴文字
+        start_time: 開始時間（time.time()），指定時附加速率與剩餘時間
     """
     percentage = (current / total * 100) if total > 0 else 0
-    print(f'\r{prefix}: [{current}/{total}] {percentage:.1f}%', end='', flush=True)
+    text = f'\r{prefix}: [{current}/{total}] {percentage:.1f}%'
+    if start_time is not None and current > 0:
+        elapsed = time.time() - start_time
+        rate = current / elapsed if elapsed > 0 else 0
+        eta = (total - current) / rate if rate > 0 else None
+        text += f' {format_rate(rate, "項")} ETA {format_duration(eta)}'
+    print(text, end='', flush=True)
     if current == total:
         print()  # 完成時換行
 
 class ProgressBar:
-    """簡單的進度條類別"""
+    """
+    進度條（含吞吐量、平滑 ETA 與 worker 使用率）
+
+    - 項目/秒、MB/秒、行/秒（update 時提供 bytes / lines）
+    - ETA 以指數平滑後的速率估算，避免批次完成造成跳動
+    - 各 worker（行程 PID 或執行緒名稱）回報忙碌秒數，計算使用率；
+      使用率偏低代表 worker 在等 I/O 或等待分派
+    - 指定 logger 時，每 log_interval 秒輸出結構化事件 progress（背景執行緒，
+      即使完全沒有進度也會輸出，卡住的執行可立即察覺）
+
+    使用範例:
+        with ProgressBar(len(files), '轉換', workers=8, logger=logger) as bar:
+            for future in as_completed(futures):
+                bar.update(1, bytes=..., worker=pid, busy_seconds=...)
+    """
 
-    def __init__(self, total: int, prefix: str = '處理中', width: int = 50):
+    def __init__(self, total: int, prefix: str = '處理中', width: int = 50,
+                 workers: Optional[int] = None, logger: Optional[logging.Logger] = None,
+                 log_interval: float = 30.0, smoothing: float = 0.3, display: bool = True):
         self.total = total
         self.current = 0
         self.prefix = prefix
         self.width = width
+        self.workers = workers
+        self.logger = logger
+        self.log_interval = log_interval
+        self.smoothing = smoothing
+        self.display = display
+
+        self.bytes = 0
+        self.lines = 0
+        self.worker_busy: Dict[str, float] = {}
+        self.start_time = time.time()
+        self.last_update = self.start_time
+        self._lock = threading.Lock()
+        self._sample_time = self.start_time
+        self._sample_count = 0
+        self._smoothed_rate: Optional[float] = None
+        self._last_render = 0.0
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+        if logger is not None and log_interval > 0:
+            self._heartbeat = threading.Thread(target=self._heartbeat_loop, daemon=True)
+            self._heartbeat.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def update(self, amount: int = 1, bytes: int = 0, lines: int = 0,
+               worker: Optional[object] = None, busy_seconds: Optional[float] = None) -> None:
+        """
+        更新進度
+
+        Args:
+            amount: 完成項目數
+            bytes: 本次處理的位元組數
+            lines: 本次處理的資料行數
+            worker: worker 識別（PID 或執行緒名稱）
+            busy_seconds: 該 worker 處理本批項目的忙碌秒數
+        """
+        with self._lock:
+            now = time.time()
+            self.current += amount
+            self.bytes += bytes
+            self.lines += lines
+            self.last_update = now
+            if worker is not None and busy_seconds is not None:
+                key = str(worker)
+                self.worker_busy[key] = self.worker_busy.get(key, 0.0) + busy_seconds
+
+            # 每秒取樣一次速率，再做指數平滑
+            self._sample_count += amount
+            sample_elapsed = now - self._sample_time
+            if sample_elapsed >= 1.0:
+                rate = self._sample_count / sample_elapsed
+                if self._smoothed_rate is None:
+                    self._smoothed_rate = rate
+                else:
+                    self._smoothed_rate = self.smoothing * rate + (1 - self.smoothing) * self._smoothed_rate
+                self._sample_time = now
+                self._sample_count = 0
 
-    def update(self, amount: int = 1) -> None:
-        """更新進度"""
-        self.current += amount
-        self._display()
+        if self.display:
+            self._display()
+
+    def snapshot(self) -> dict:
+        """目前進度與吞吐量（同時作為結構化日誌的欄位）"""
+        with self._lock:
+            now = time.time()
+            elapsed = max(now - self.start_time, 1e-9)
+            average_rate = self.current / elapsed
+            rate = self._smoothed_rate if self._smoothed_rate is not None else average_rate
+            remaining = max(self.total - self.current, 0)
+            eta = remaining / rate if rate > 0 else None
+
+            utilisation = {worker: round(min(busy / elapsed, 1.0), 3)
+                           for worker, busy in self.worker_busy.items()}
+            worker_count = self.workers or len(utilisation)
+            overall = (sum(self.worker_busy.values()) / (elapsed * worker_count)) if worker_count else None
+
+            return {
+                'prefix': self.prefix,
+                'current': self.current,
+                'total': self.total,
+                'percent': round(self.current / self.total * 100, 2) if self.total else 0.0,
+                'elapsed': round(elapsed, 3),
+                'items_per_sec': round(average_rate, 3),
+                'smoothed_items_per_sec': round(rate, 3),
+                'mb_per_sec': round(self.bytes / 1024 / 1024 / elapsed, 3),
+                'lines_per_sec': round(self.lines / elapsed, 1),
+                'eta': round(eta, 1) if eta is not None else None,
+                'seconds_since_update': round(now - self.last_update, 1),
+                'utilisation': round(overall, 3) if overall is not None else None,
+                'worker_utilisation': utilisation
+            }
+
+    def status(self) -> str:
+        """單行文字狀態（給文字日誌使用）"""
+        snap = self.snapshot()
+        parts = [f"{snap['current']}/{snap['total']} ({snap['percent']:.1f}%)",
+                 format_rate(snap['smoothed_items_per_sec'], '項')]
+        if self.bytes:
+            parts.append(f"{snap['mb_per_sec']:.1f} MB/秒")
+        if self.lines:
+            parts.append(format_rate(snap['lines_per_sec'], '行'))
+        parts.append(f"ETA {format_duration(snap['eta'])}")
+        if snap['utilisation'] is not None:
+            parts.append(f"使用率 {snap['utilisation'] * 100:.0f}%")
+        return ' '.join(parts)
+
+    def close(self) -> None:
+        """停止背景日誌並輸出最後一筆進度"""
+        if self._heartbeat is not None:
+            self._stop.set()
+            self._heartbeat.join()
+            self._heartbeat = None
+            log_event(self.logger, 'progress', **self.snapshot())
+
+    def _heartbeat_loop(self) -> None:
+        """每 log_interval 秒輸出一次結構化進度"""
+        while not self._stop.wait(self.log_interval):
+            log_event(self.logger, 'progress', **self.snapshot())
 
     def _display(self) -> None:
-        """顯示進度條"""
+        """顯示進度條（最多每 0.1 秒重繪一次，最後一筆一定顯示）"""
         if self.total == 0:
             return
 
-        percentage = self.current / self.total
+        now = time.time()
+        finished = self.current >= self.total
+        if not finished and now - self._last_render < 0.1:
+            return
+        self._last_render = now
+
+        percentage = min(self.current / self.total, 1.0)
         filled = int(self.width * percentage)
         bar = '█' * filled + '░' * (self.width - filled)
 
-        print(f'\r{self.prefix}: |{bar}| {self.current}/{self.total} ({percentage*100:.1f}%)',
-              end='', flush=True)
+        print(f'\r{self.prefix}: |{bar}| {self.status()}', end='', flush=True)
 
-        if self.current >= self.total:
+        if finished:
             print()  # 完成時換行
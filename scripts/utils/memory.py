@@ -0,0 +1,191 @@
+"""
+記憶體監控模組
+量測每個轉換任務（一個股票日）的記憶體峰值，並可設定單一任務的記憶體上限：
+超過上限的任務會被中止、跳過並記錄，而不是讓作業系統 OOM 砍掉整個行程池
+
+使用方式：
+    memory = MemoryWatch(limit_mb=4096, trace=False)
+    try:
+        with memory:
+            ...                 # 任務內容
+            memory.check()      # 寫出結果前確認未超限
+        timer.context.update(memory.as_dict())
+    except MemoryError:
+        return f"記憶體超限 ... ({memory.describe()})", None
+"""
+import argparse
+import ctypes
+import logging
+import os
+import threading
+import tracemalloc
+from typing import Iterable, List, Optional
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from .logger import log_event
+
+# RSS 取樣間隔（秒）
+SAMPLE_INTERVAL = 0.01
+
+MB = 1024 * 1024
+
+
+class MemoryLimitExceeded(MemoryError):
+    """任務的記憶體用量超過設定上限"""
+
+
+def add_memory_arguments(parser: argparse.ArgumentParser) -> None:
+    """加入 --memory-limit / --memory-trace / --memory-top 參數"""
+    parser.add_argument('--memory-limit', type=float, default=None, metavar='MB',
+                        help='單一任務（股票日）可增加的記憶體上限，超過時中止並跳過該任務（預設: 不限制）')
+    parser.add_argument('--memory-trace', action='store_true',
+                        help='同時以 tracemalloc 記錄 Python/NumPy 配置的峰值（較慢）')
+    parser.add_argument('--memory-top', type=int, default=10,
+                        help='記憶體摘要表列出的任務數 (預設: 10)')
+
+
+def current_rss() -> Optional[int]:
+    """目前行程的常駐記憶體 (bytes)，無法取得時返回 None"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    return None
+
+
+def _set_async_exception(thread_id: int, exception: Optional[type]) -> None:
+    """在指定執行緒下一次執行 Python 位元組碼時拋出例外（exception 為 None 時清除尚未拋出的例外）"""
+    ctypes.pythonapi.PyThreadState_SetAsyncExc(
+        ctypes.c_ulong(thread_id), ctypes.py_object(exception) if exception is not None else None)
+
+
+class MemoryWatch:
+    """
+    以背景執行緒取樣 RSS 記錄任務期間的峰值，可選 tracemalloc 高水位
+
+    設定 limit_mb 時，取樣到 RSS 比起始時增加超過 limit 即在任務執行緒拋出 MemoryLimitExceeded
+    （長時間的 C 呼叫會在返回 Python 後才中止）；離開 with 區塊時若已超限也會拋出
+
+    不使用 RLIMIT_AS：它限制的是保留的位址空間，pyarrow 的配置器與執行緒池會預先保留大量位址空間，
+    上限稍緊就會讓建立執行緒失敗而卡住，與實際用量也對不上
+    """
+
+    def __init__(self, limit_mb: Optional[float] = None, trace: bool = False,
+                 interval: float = SAMPLE_INTERVAL):
+        self.limit_bytes = int(limit_mb * MB) if limit_mb else None
+        self.trace = trace
+        self.interval = interval
+        self.start_rss = 0
+        self.peak_rss = 0
+        self.traced_peak = None
+        self.exceeded = False
+        self._owner = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self) -> 'MemoryWatch':
+        self.start_rss = current_rss() or 0
+        self.peak_rss = self.start_rss
+        self.exceeded = False
+        self._owner = threading.get_ident()
+        if self.trace:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, name='memory-watch', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self._stop.set()
+        self._thread.join()
+        if self.exceeded:
+            # 清除取樣執行緒設定但尚未拋出的例外，改在此處確定地拋出
+            _set_async_exception(self._owner, None)
+        self._record(current_rss())
+        if self.trace:
+            self.traced_peak = tracemalloc.get_traced_memory()[1]
+        if self.exceeded and exc_type is None:
+            raise MemoryLimitExceeded(self.describe())
+        return False
+
+    def _record(self, rss: Optional[int]) -> bool:
+        """更新峰值；首次超過上限時返回 True"""
+        if rss is None:
+            return False
+        if rss > self.peak_rss:
+            self.peak_rss = rss
+        if self.limit_bytes and not self.exceeded and rss - self.start_rss > self.limit_bytes:
+            self.exceeded = True
+            return True
+        return False
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            if self._record(current_rss()) and not self._stop.is_set():
+                _set_async_exception(self._owner, MemoryLimitExceeded)
+
+    def check(self) -> None:
+        """已超過上限時拋出 MemoryLimitExceeded"""
+        if self.exceeded:
+            raise MemoryLimitExceeded(self.describe())
+
+    def as_dict(self) -> dict:
+        """併入 StageTimer context 的欄位"""
+        result = {
+            'peak_rss_mb': round(self.peak_rss / MB, 1),
+            'rss_growth_mb': round((self.peak_rss - self.start_rss) / MB, 1),
+        }
+        if self.traced_peak is not None:
+            result['traced_peak_mb'] = round(self.traced_peak / MB, 1)
+        return result
+
+    def describe(self) -> str:
+        text = f"RSS 峰值 {self.peak_rss / MB:.0f} MB，任務增加 {(self.peak_rss - self.start_rss) / MB:.0f} MB"
+        if self.limit_bytes:
+            text += f"，上限 {self.limit_bytes / MB:.0f} MB"
+        return text
+
+
+def log_memory_summary(logger: logging.Logger, timings: Iterable[dict], top: int = 10) -> List[dict]:
+    """
+    以文字表格輸出記憶體峰值最高的任務，並寫入結構化事件 memory_summary
+
+    Args:
+        logger: 日誌記錄器
+        timings: 含 peak_rss_mb 等欄位的 StageTimer.as_dict() 結果
+        top: 列出的任務數
+
+    Returns:
+        依峰值由大到小排序的前 top 筆
+    """
+    records = sorted((t for t in timings if 'peak_rss_mb' in t),
+                     key=lambda t: t['peak_rss_mb'], reverse=True)
+    if not records:
+        return []
+
+    rows = records[:top]
+    logger.info(f"記憶體峰值最高的股票日（前 {len(rows)} 名）:")
+    logger.info(f"  {'日期':<10}{'股票':<8}{'RSS峰值MB':>11}{'增加MB':>9}{'追蹤MB':>9}"
+                f"{'成交筆數':>10}{'五檔筆數':>10}{'輸入MB':>9}{'輸出MB':>9}")
+    for t in rows:
+        traced = f"{t['traced_peak_mb']:>9.1f}" if 'traced_peak_mb' in t else f"{'-':>9}"
+        logger.info(f"  {t.get('date', ''):<10}{t.get('stock', ''):<8}{t['peak_rss_mb']:>11.1f}"
+                    f"{t['rss_growth_mb']:>9.1f}{traced}{t.get('trade_rows', 0):>10}{t.get('depth_rows', 0):>10}"
+                    f"{t.get('input_bytes', 0) / MB:>9.2f}{t.get('output_bytes', 0) / MB:>9.2f}")
+
+    log_event(logger, 'memory_summary', top=[
+        {key: t.get(key) for key in ('date', 'stock', 'peak_rss_mb', 'rss_growth_mb', 'traced_peak_mb',
+                                     'trade_rows', 'depth_rows', 'input_bytes', 'output_bytes')}
+        for t in rows
+    ])
+    return rows
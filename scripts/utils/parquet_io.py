@@ -0,0 +1,669 @@
+"""
+Parquet 讀寫模組
+統一解碼資料的寫入方式（原子性取代檔案）與自訂 metadata 讀寫
+
+解碼檔案依 Type 分段寫入：每個 row group 只含單一 Type，並保留欄位統計資訊，
+讀取端以 read_quote_rows() 透過 pyarrow filters 只讀需要的 row group 與欄位
+（例如統計與走勢圖只需要成交欄位，不必讀取 20 個五檔欄位）
+
+每日合併檔（batch_decode --consolidate）：一個日期（或日期 × 市場）一個檔案，
+各股票依代碼排序、各自佔一段連續的 row group，footer 的股票索引記錄每支股票的 row group 範圍，
+read_consolidated_stock() 只讀該股票的 row group
+
+寫入設定檔（WRITER_PROFILES）決定壓縮、字典編碼、row group 大小、統計資訊與 page index：
+- fast-write：snappy、只對字串欄位用字典、只保留篩選用欄位的統計資訊，適合盤中與大量回補
+- small：zstd 高壓縮等級，適合長期保存
+- fast-read（預設）：snappy、字典編碼、完整統計資訊與 page index，適合伺服器讀取
+
+寫入前依正規順序（Datetime, Seq）排序，並在每個 row group 的 sorting_columns 標記；
+讀取端看到標記即不再排序，沒有標記的舊檔案只做 O(n) 的遞增檢查（見 utils/timeline.time_ordered）
+
+整數 tick 模式（price_ticks=True）：價格欄位存成 int32，footer 記錄倍率（見 utils/price_ticks.py）；
+讀取函數預設還原為浮點價格，指定 price_ticks=True 時返回整數 tick
+
+盤中分段檔（batch_decode --follow）：第一個批次寫成 {stock}.parquet，之後每個小批次寫成
+{stock}.live/{起始批次}-{結束批次}.parquet，寫入成本只與批次大小有關；追蹤結束時
+compact_live_segments() 合併回 {stock}.parquet。read_quote_rows() / read_decoded_frame()
+自動併入尚未合併的分段檔，iter_live_batches() 只讀取指定批次之後的資料（伺服器的盤中緩衝）
+"""
+import json
+import os
+import re
+import shutil
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Sequence, Tuple
+
+from .config import MARKETS, LIVE_SEGMENT_FANOUT
+from .price_ticks import apply_price_mode, price_scale_metadata, price_scale_of, to_price_ticks
+from .timeline import CANONICAL_ORDER, sort_canonical, time_ordered
+
+# 自訂 metadata 存放於 Parquet schema 的 key-value 區塊
+METADATA_KEY = b'quote_decode'
+
+# 每日合併檔的股票索引（{股票代碼: [起始 row group, 結束 row group)}）存放的 footer key
+STOCK_INDEX_KEY = b'quote_stock_index'
+
+# 盤中分段檔目錄的後綴與檔名（{起始批次:06d}-{結束批次:06d}.parquet）
+LIVE_SEGMENT_SUFFIX = '.live'
+_LIVE_SEGMENT_NAME = re.compile(r'(\d+)-(\d+)\.parquet')
+
+# fast-read 設定檔每個 row group 的列數上限（同一 Type 超過時再切分）
+ROW_GROUP_SIZE = 64 * 1024
+
+# 寫入設定檔（row_group_size 以外的鍵直接傳給 pq.ParquetWriter）
+# Type / StockCode / Datetime 的統計資訊供 row group 篩選與回放跳過使用，所有設定檔都保留
+WRITER_PROFILES = {
+    'fast-write': {
+        'compression': 'snappy',
+        'use_dictionary': ['Type', 'StockCode'],
+        'write_statistics': ['Type', 'StockCode', 'Datetime'],
+        'write_page_index': False,
+        'row_group_size': 1024 * 1024,
+    },
+    'small': {
+        'compression': 'zstd',
+        'compression_level': 9,
+        'use_dictionary': True,
+        'write_statistics': True,
+        'write_page_index': False,
+        'row_group_size': 1024 * 1024,
+    },
+    'fast-read': {
+        'compression': 'snappy',
+        'use_dictionary': True,
+        'write_statistics': True,
+        'write_page_index': True,
+        'row_group_size': ROW_GROUP_SIZE,
+    },
+}
+DEFAULT_WRITER_PROFILE = 'fast-read'
+
+DEPTH_LEVEL_COLUMNS = [
+    f'{side}{level}_{field}' for level in range(1, 6) for side in ('Bid', 'Ask') for field in ('Price', 'Volume')
+]
+# 讀取成交 / 五檔時的欄位投影（保留 Type，沿用以 Type 篩選的既有函數不需修改）
+TRADE_COLUMNS = ['Type', 'Datetime', 'Flag', 'Price', 'Volume', 'TotalVolume']
+DEPTH_COLUMNS = ['Type', 'Datetime', 'BidCount', 'AskCount'] + DEPTH_LEVEL_COLUMNS
+
+
+def writer_profile(name: str) -> Dict[str, Any]:
+    """取得寫入設定檔，名稱不存在時拋出 ValueError"""
+    if name not in WRITER_PROFILES:
+        raise ValueError(f"未知的寫入設定檔: {name}（可用: {', '.join(WRITER_PROFILES)}）")
+    return dict(WRITER_PROFILES[name])
+
+
+def _open_writer(path: Path, schema: pa.Schema, profile: str,
+                 sorted_rows: bool = True) -> Tuple[pq.ParquetWriter, int]:
+    """
+    依寫入設定檔建立 ParquetWriter，返回 (writer, row_group_size)
+
+    sorted_rows 時 row group 標記為依正規順序排序（呼叫端需先以 sort_canonical 排序）
+    """
+    options = writer_profile(profile)
+    row_group_size = options.pop('row_group_size')
+    ordering = [(column, 'ascending') for column in CANONICAL_ORDER if column in schema.names]
+    if ordering and sorted_rows:
+        options['sorting_columns'] = pq.SortingColumn.from_ordering(schema, ordering)
+    return pq.ParquetWriter(path, schema, **options), row_group_size
+
+
+def is_time_sorted(metadata: pq.FileMetaData) -> bool:
+    """所有 row group 都標記為依 Datetime 排序時返回 True（寫入時已排序，讀取端不需再排序）"""
+    try:
+        column_index = metadata.schema.names.index('Datetime')
+    except ValueError:
+        return False
+
+    for row_group in range(metadata.num_row_groups):
+        sorting_columns = metadata.row_group(row_group).sorting_columns
+        if not sorting_columns or sorting_columns[0].column_index != column_index \
+                or sorting_columns[0].descending:
+            return False
+    return True
+
+
+def read_quote_rows(parquet_path: Path, data_type: str, columns: Optional[Sequence[str]] = None,
+                    price_ticks: bool = False, include_live: bool = True) -> pd.DataFrame:
+    """
+    只讀取指定 Type 的資料列與欄位
+
+    依 Type 分段寫入的檔案會依 row group 統計資訊跳過其他 Type 的 row group；
+    舊檔案（混合 row group）結果相同，只是無法跳過
+
+    Args:
+        parquet_path: Parquet 檔案路徑
+        data_type: 'Trade' 或 'Depth'
+        columns: 欄位投影（檔案中不存在的欄位略過，None 表示全部欄位）
+        price_ticks: True 時價格欄位為整數 tick，否則為浮點價格
+        include_live: 併入尚未合併的盤中分段檔
+
+    Returns:
+        依時間排序的 DataFrame（檔案已標記排序時直接使用檔案順序）
+    """
+    def read_file(path):
+        metadata = pq.read_metadata(path)
+        file_columns = columns
+        if columns is not None:
+            available = set(metadata.schema.to_arrow_schema().names)
+            file_columns = [c for c in columns if c in available]
+        table = pq.read_table(path, columns=file_columns, filters=[('Type', '==', data_type)])
+        df = apply_price_mode(table.to_pandas(), price_scale_of(metadata.metadata), price_ticks)
+        return df if is_time_sorted(metadata) else time_ordered(df)
+
+    if not include_live:
+        return read_file(parquet_path)
+    frames = _read_with_live_segments(parquet_path, read_file)
+    return frames[0] if len(frames) == 1 else time_ordered(pd.concat(frames, ignore_index=True))
+
+
+def read_decoded_frame(parquet_path: Path, columns: Optional[Sequence[str]] = None,
+                       price_ticks: bool = False, include_live: bool = True) -> pd.DataFrame:
+    """
+    讀取整個解碼檔案（檔案順序，不篩選 Type）
+
+    與 pd.read_parquet 相同，但整數 tick 模式的檔案會依 price_ticks 轉換價格欄位；
+    盤中分段檔依批次順序接在主檔之後
+
+    Args:
+        parquet_path: Parquet 檔案路徑
+        columns: 欄位投影（None 表示全部欄位）
+        price_ticks: True 時價格欄位為整數 tick，否則為浮點價格
+        include_live: 併入尚未合併的盤中分段檔
+    """
+    def read_file(path):
+        table = pq.read_table(path, columns=columns)
+        return apply_price_mode(table.to_pandas(), price_scale_of(table.schema.metadata), price_ticks)
+
+    if not include_live:
+        return read_file(parquet_path)
+    frames = _read_with_live_segments(parquet_path, read_file)
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+
+def row_group_types(metadata: pq.FileMetaData) -> List[Optional[str]]:
+    """
+    各 row group 的 Type（由統計資訊判斷）
+
+    Returns:
+        每個 row group 一個值；混合多種 Type 或沒有統計資訊時為 None
+    """
+    try:
+        column_index = metadata.schema.names.index('Type')
+    except ValueError:
+        return [None] * metadata.num_row_groups
+
+    types = []
+    for row_group in range(metadata.num_row_groups):
+        statistics = metadata.row_group(row_group).column(column_index).statistics
+        if statistics is not None and statistics.has_min_max and statistics.min == statistics.max:
+            types.append(statistics.min)
+        else:
+            types.append(None)
+    return types
+
+
+def read_decoded_metadata(parquet_path: Path) -> Dict[str, Any]:
+    """
+    讀取解碼檔案的自訂 metadata（只讀 footer，不讀資料）
+
+    Args:
+        parquet_path: Parquet 檔案路徑
+
+    Returns:
+        metadata 字典，沒有時返回空字典
+    """
+    try:
+        schema_metadata = pq.read_schema(parquet_path).metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return {}
+
+    raw = schema_metadata.get(METADATA_KEY)
+    return json.loads(raw) if raw else {}
+
+
+def write_decoded_frame(df: pd.DataFrame, output_path: Path,
+                        metadata: Optional[Dict[str, Any]] = None,
+                        profile: str = DEFAULT_WRITER_PROFILE, price_ticks: bool = False) -> None:
+    """
+    寫入解碼後的 DataFrame
+
+    先寫入暫存檔再以 os.replace 取代，讀取端（伺服器、轉換程式）不會讀到寫到一半的檔案；
+    資料先依正規順序（Datetime, Seq）排序，再依 Type 穩定排序並分段寫入，
+    每個 row group 只含單一 Type 且標記為已排序
+
+    Args:
+        df: 資料
+        output_path: 輸出路徑
+        metadata: 自訂 metadata（存於 footer）
+        profile: 寫入設定檔名稱（見 WRITER_PROFILES）
+        price_ticks: 價格欄位存成 int32 tick（footer 記錄倍率）
+    """
+    _write_type_grouped(sort_canonical(df), Path(output_path), metadata, profile, price_ticks)
+
+
+def _write_type_grouped(df: pd.DataFrame, output_path: Path, metadata: Optional[Dict[str, Any]],
+                        profile: str, price_ticks: bool, sorted_rows: bool = True) -> None:
+    """依 Type 穩定排序後分段寫入暫存檔，再以 os.replace 取代（sorted_rows 時標記為已排序）"""
+    if 'Type' in df.columns:
+        df = df.sort_values('Type', kind='stable').reset_index(drop=True)
+    table = _frame_to_table(to_price_ticks(df) if price_ticks else df, metadata, price_ticks)
+
+    tmp_path = output_path.with_name(output_path.name + '.tmp')
+    writer, row_group_size = _open_writer(tmp_path, table.schema, profile, sorted_rows)
+    with writer:
+        _write_segments(writer, table, _segment_boundaries(df, ['Type']), row_group_size)
+    os.replace(tmp_path, output_path)
+
+
+def _frame_to_table(df: pd.DataFrame, metadata: Optional[Dict[str, Any]], price_ticks: bool) -> pa.Table:
+    """DataFrame 轉為 Arrow Table，並附上自訂 metadata 與價格倍率"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    schema_metadata = dict(table.schema.metadata or {})
+    if metadata:
+        schema_metadata[METADATA_KEY] = json.dumps(metadata).encode('utf-8')
+    if price_ticks:
+        schema_metadata.update(price_scale_metadata())
+    return table.replace_schema_metadata(schema_metadata)
+
+
+def _segment_boundaries(df: pd.DataFrame, keys: Sequence[str]) -> List[int]:
+    """依 keys 欄位值變化切分的起訖位置 [0, ..., len(df)]（df 需已依 keys 排序）"""
+    keys = [k for k in keys if k in df.columns]
+    if not keys or len(df) == 0:
+        return [0, len(df)]
+
+    changed = np.zeros(len(df) - 1, dtype=bool)
+    for key in keys:
+        values = df[key].to_numpy()
+        changed |= values[1:] != values[:-1]
+    return [0] + (np.flatnonzero(changed) + 1).tolist() + [len(df)]
+
+
+def _write_segments(writer: pq.ParquetWriter, table: pa.Table, boundaries: List[int],
+                    row_group_size: int = ROW_GROUP_SIZE) -> List[int]:
+    """
+    每一段各自寫成 row group（超過 row_group_size 時再切分）
+
+    Returns:
+        每一段寫出的 row group 數
+    """
+    counts = []
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        if end <= start:
+            counts.append(0)
+            continue
+        writer.write_table(table.slice(start, end - start), row_group_size=row_group_size)
+        counts.append(-(-(end - start) // row_group_size))
+    return counts
+
+
+def live_segment_dir(parquet_path: Path) -> Path:
+    """盤中分段檔目錄（{stock}.parquet 旁的 {stock}.live）"""
+    parquet_path = Path(parquet_path)
+    return parquet_path.with_name(parquet_path.stem + LIVE_SEGMENT_SUFFIX)
+
+
+def _live_segment_path(parquet_path: Path, first: int, last: int) -> Path:
+    return live_segment_dir(parquet_path) / f'{first:06d}-{last:06d}.parquet'
+
+
+def live_segments(parquet_path: Path,
+                  base_metadata: Optional[Dict[str, Any]] = None) -> List[Tuple[int, int, Path]]:
+    """
+    尚未合併進主檔的盤中分段檔
+
+    只有主檔是盤中追蹤模式寫出的（metadata 有 live_offsets）時分段檔才有效；
+    已合併進主檔（批次不大於主檔的 live_batch）或被較大分段檔涵蓋（合併中斷留下）的分段檔略過
+
+    Args:
+        parquet_path: 主檔路徑
+        base_metadata: 主檔的自訂 metadata（None 時讀取 footer）
+
+    Returns:
+        [(起始批次, 結束批次, 路徑), ...]，依批次排序
+    """
+    segment_dir = live_segment_dir(parquet_path)
+    if not segment_dir.is_dir():
+        return []
+    if base_metadata is None:
+        base_metadata = read_decoded_metadata(parquet_path)
+    if 'live_offsets' not in base_metadata:
+        return []
+
+    candidates = []
+    for entry in os.scandir(segment_dir):
+        match = _LIVE_SEGMENT_NAME.fullmatch(entry.name)
+        if match:
+            candidates.append((int(match.group(1)), int(match.group(2)), Path(entry.path)))
+    candidates.sort(key=lambda c: (c[0], -c[1]))
+
+    segments = []
+    covered = base_metadata.get('live_batch', 0)
+    for first, last, path in candidates:
+        if last > covered:
+            segments.append((first, last, path))
+            covered = last
+    return segments
+
+
+def read_live_state(parquet_path: Path) -> Tuple[Dict[str, int], Optional[int]]:
+    """
+    盤中追蹤的續傳狀態（只讀 footer）
+
+    Returns:
+        (已寫入的位移 {market: offset}, 最後寫入的批次)；
+        主檔不存在或不是盤中追蹤模式寫出的檔案時返回 ({}, None)
+    """
+    base_metadata = read_decoded_metadata(parquet_path)
+    if 'live_offsets' not in base_metadata:
+        return {}, None
+    segments = live_segments(parquet_path, base_metadata)
+    if not segments:
+        return base_metadata['live_offsets'], base_metadata.get('live_batch', 0)
+    return read_decoded_metadata(segments[-1][2]).get('live_offsets', {}), segments[-1][1]
+
+
+def iter_live_batches(parquet_path: Path, after: int, columns: Optional[Sequence[str]] = None,
+                      price_ticks: bool = False) -> Iterator[Tuple[int, pd.DataFrame]]:
+    """
+    依批次順序產生 after 之後的盤中資料（只讀取含有這些批次的分段檔）
+
+    分段檔的 live_batches 記錄各批次的成交 / 五檔筆數，合併後的分段檔依此切回各批次，
+    不依賴整個檔案的排序；讀取期間分段檔被合併時拋出 FileNotFoundError，呼叫端可稍後重讀
+
+    Args:
+        parquet_path: 主檔路徑
+        after: 已讀過的最後批次
+        columns: 欄位投影（需含 Type；分段檔中不存在的欄位略過）
+        price_ticks: True 時價格欄位為整數 tick，否則為浮點價格
+
+    Yields:
+        (批次, DataFrame)：成交在前、五檔在後，各自依正規順序
+    """
+    for _, last, path in live_segments(parquet_path):
+        if last <= after:
+            continue
+
+        parquet_file = pq.ParquetFile(path)
+        read_columns = columns
+        if columns is not None:
+            available = set(parquet_file.schema_arrow.names)
+            read_columns = [c for c in columns if c in available]
+        table = parquet_file.read(columns=read_columns)
+        key_value = table.schema.metadata or {}
+        batches = json.loads(key_value[METADATA_KEY]).get('live_batches', []) if METADATA_KEY in key_value else []
+        df = apply_price_mode(table.to_pandas(), price_scale_of(key_value), price_ticks)
+
+        rows_by_type = {data_type: df[df['Type'] == data_type] for data_type in ('Trade', 'Depth')}
+        starts = {'Trade': 0, 'Depth': 0}
+        for batch, trade_rows, depth_rows in batches:
+            parts = []
+            for data_type, rows in (('Trade', trade_rows), ('Depth', depth_rows)):
+                parts.append(rows_by_type[data_type].iloc[starts[data_type]:starts[data_type] + rows])
+                starts[data_type] += rows
+            if batch > after:
+                yield batch, pd.concat(parts, ignore_index=True)
+
+
+def _read_with_live_segments(parquet_path: Path, read_file) -> List[pd.DataFrame]:
+    """
+    以 read_file(path) 分別讀取主檔與尚未合併的分段檔，返回 [主檔, 分段檔...]
+
+    讀取期間分段檔被合併（檔案消失）或主檔被合併結果取代時重新讀取，不會漏讀或重複讀取
+    """
+    parquet_path = Path(parquet_path)
+    while True:
+        if not live_segment_dir(parquet_path).is_dir():
+            return [read_file(parquet_path)]
+
+        stat = os.stat(parquet_path)
+        frames = [read_file(parquet_path)]
+        try:
+            frames += [read_file(path) for _, _, path in live_segments(parquet_path)]
+        except FileNotFoundError:
+            continue
+        after = os.stat(parquet_path)
+        if (after.st_ino, after.st_mtime_ns) == (stat.st_ino, stat.st_mtime_ns):
+            return frames
+
+
+def write_live_segment(df: pd.DataFrame, parquet_path: Path, batch: int, live_offsets: Dict[str, int],
+                       profile: str = DEFAULT_WRITER_PROFILE, price_ticks: bool = False,
+                       fanout: int = LIVE_SEGMENT_FANOUT) -> None:
+    """
+    盤中追蹤模式：將一個批次寫成分段檔，不重寫主檔（寫入成本只與批次大小有關）
+
+    最後 fanout 個分段檔涵蓋的批次數相同時合併為一個（逐層合併：每筆資料最多重寫
+    log_fanout(批次數) 次，分段檔數維持在 fanout × 層數以內）。合併時各批次的資料依序相接、
+    不重新排序，metadata 的 live_batches 記錄各批次的成交 / 五檔筆數，
+    iter_live_batches() 可據此只取出尚未讀過的批次
+
+    Args:
+        df: 此批次的資料
+        parquet_path: 主檔路徑
+        batch: 批次編號（大於主檔與既有分段檔的批次）
+        live_offsets: 寫入此批次後各市場的位移 {market: offset}
+        profile: 寫入設定檔名稱（見 WRITER_PROFILES）
+        price_ticks: 價格欄位存成 int32 tick
+        fanout: 每層合併的分段檔數
+    """
+    live_segment_dir(parquet_path).mkdir(exist_ok=True)
+    types = df['Type'] if 'Type' in df.columns else pd.Series(dtype=object)
+    metadata = {'live_offsets': live_offsets,
+                'live_batches': [[batch, int((types == 'Trade').sum()), int((types == 'Depth').sum())]]}
+    write_decoded_frame(df, _live_segment_path(parquet_path, batch, batch), metadata=metadata,
+                        profile=profile, price_ticks=price_ticks)
+
+    segments = live_segments(parquet_path)
+    while len(segments) >= fanout and len({last - first for first, last, _ in segments[-fanout:]}) == 1:
+        merged = _merge_live_segments(parquet_path, segments[-fanout:], profile, price_ticks)
+        segments = segments[:-fanout] + [merged]
+
+
+def _merge_live_segments(parquet_path: Path, segments: List[Tuple[int, int, Path]],
+                         profile: str, price_ticks: bool) -> Tuple[int, int, Path]:
+    """將相鄰的分段檔依批次順序相接為一個分段檔（先寫入合併結果，再刪除原分段檔）"""
+    frames = []
+    batches = []
+    metadata = {}
+    for _, _, path in segments:
+        frames.append(read_decoded_frame(path, include_live=False))
+        metadata = read_decoded_metadata(path)
+        batches += metadata.get('live_batches', [])
+
+    first, last = segments[0][0], segments[-1][1]
+    merged_path = _live_segment_path(parquet_path, first, last)
+    _write_type_grouped(pd.concat(frames, ignore_index=True), merged_path,
+                        {'live_offsets': metadata.get('live_offsets', {}), 'live_batches': batches},
+                        profile, price_ticks, sorted_rows=False)
+    for _, _, path in segments:
+        path.unlink()
+    return first, last, merged_path
+
+
+def compact_live_segments(parquet_path: Path, profile: str = DEFAULT_WRITER_PROFILE,
+                          price_ticks: bool = False) -> int:
+    """
+    將盤中分段檔合併回主檔（追蹤結束時執行一次，整日資料只在此排序、重寫一次）
+
+    主檔 metadata 的 live_batch 記錄已合併的最後批次：主檔取代後、分段檔刪除前中斷時，
+    讀取端依此略過已合併的分段檔
+
+    Args:
+        parquet_path: 主檔路徑
+        profile: 寫入設定檔名稱（見 WRITER_PROFILES）
+        price_ticks: 價格欄位存成 int32 tick
+
+    Returns:
+        合併的分段檔數
+    """
+    parquet_path = Path(parquet_path)
+    segments = live_segments(parquet_path)
+    if segments:
+        frames = [read_decoded_frame(parquet_path, include_live=False)]
+        frames += [read_decoded_frame(path, include_live=False) for _, _, path in segments]
+        live_offsets = read_decoded_metadata(segments[-1][2]).get('live_offsets', {})
+        write_decoded_frame(pd.concat(frames, ignore_index=True), parquet_path,
+                            metadata={'live_offsets': live_offsets, 'live_batch': segments[-1][1]},
+                            profile=profile, price_ticks=price_ticks)
+    shutil.rmtree(live_segment_dir(parquet_path), ignore_errors=True)
+    return len(segments)
+
+
+def consolidated_path(consolidated_dir: Path, date: str, market: Optional[str] = None) -> Path:
+    """每日合併檔路徑：{date}.parquet 或 {date}_{market}.parquet"""
+    name = f'{date}_{market}.parquet' if market else f'{date}.parquet'
+    return Path(consolidated_dir) / name
+
+
+def consolidated_files(consolidated_dir: Path, date: str) -> List[Path]:
+    """指定日期存在的每日合併檔（日期檔優先，其次各市場檔）"""
+    candidates = [consolidated_path(consolidated_dir, date)]
+    candidates += [consolidated_path(consolidated_dir, date, market) for market in MARKETS]
+    return [path for path in candidates if path.exists()]
+
+
+def consolidated_dates(consolidated_dir: Path) -> List[str]:
+    """有每日合併檔的日期（由舊到新）"""
+    consolidated_dir = Path(consolidated_dir)
+    if not consolidated_dir.exists():
+        return []
+    dates = {path.stem.split('_')[0] for path in consolidated_dir.glob('*.parquet')}
+    return sorted(d for d in dates if d.isdigit())
+
+
+def write_consolidated_frames(frames: Dict[str, pd.DataFrame], output_path: Path,
+                              metadata: Optional[Dict[str, Any]] = None,
+                              profile: str = DEFAULT_WRITER_PROFILE,
+                              price_ticks: bool = False) -> Dict[str, List[int]]:
+    """
+    將多支股票的解碼資料寫成一個每日合併檔
+
+    股票依代碼排序，每支股票內依 Type 穩定排序後分段寫入（row group 只含單一股票、單一 Type），
+    並在 footer 寫入股票索引；同 write_decoded_frame 以暫存檔原子性取代
+
+    Args:
+        frames: {股票代碼: DataFrame}
+        output_path: 輸出路徑
+        metadata: 自訂 metadata（存於 footer）
+        profile: 寫入設定檔名稱（見 WRITER_PROFILES）
+        price_ticks: 價格欄位存成 int32 tick（footer 記錄倍率）
+
+    Returns:
+        股票索引 {股票代碼: [起始 row group, 結束 row group)}
+    """
+    output_path = Path(output_path)
+    stocks = sorted(stock for stock, frame in frames.items() if len(frame) > 0)
+    parts = []
+    for stock in stocks:
+        frame = sort_canonical(frames[stock])
+        if 'Type' in frame.columns:
+            frame = frame.sort_values('Type', kind='stable')
+        parts.append(frame.assign(StockCode=stock))
+    df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=['Type', 'StockCode'])
+    table = _frame_to_table(to_price_ticks(df) if price_ticks else df, metadata, price_ticks)
+
+    # 先切股票、再切 Type，記錄每支股票佔用的 row group 範圍
+    stock_bounds = _segment_boundaries(df, ['StockCode'])
+    index = {}
+    row_group = 0
+
+    tmp_path = output_path.with_name(output_path.name + '.tmp')
+    writer, row_group_size = _open_writer(tmp_path, table.schema, profile)
+    with writer:
+        for stock, start, end in zip(stocks, stock_bounds[:-1], stock_bounds[1:]):
+            boundaries = [start + b for b in _segment_boundaries(df.iloc[start:end], ['Type'])]
+            count = sum(_write_segments(writer, table, boundaries, row_group_size))
+            index[stock] = [row_group, row_group + count]
+            row_group += count
+        writer.add_key_value_metadata({STOCK_INDEX_KEY: json.dumps(index).encode('utf-8')})
+    os.replace(tmp_path, output_path)
+    return index
+
+
+def read_stock_index(parquet_path: Path) -> Dict[str, Tuple[int, int]]:
+    """
+    讀取每日合併檔的股票索引（只讀 footer，依檔案修改時間快取）
+
+    Returns:
+        {股票代碼: (起始 row group, 結束 row group)}，非合併檔時返回空字典
+    """
+    parquet_path = Path(parquet_path)
+    try:
+        mtime_ns = parquet_path.stat().st_mtime_ns
+    except OSError:
+        return {}
+    return _read_stock_index(str(parquet_path), mtime_ns)
+
+
+@lru_cache(maxsize=1024)
+def _read_stock_index(parquet_path: str, mtime_ns: int) -> Dict[str, Tuple[int, int]]:
+    try:
+        key_value = pq.read_metadata(parquet_path).metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return {}
+    raw = key_value.get(STOCK_INDEX_KEY)
+    if not raw:
+        return {}
+    return {stock: (start, end) for stock, (start, end) in json.loads(raw).items()}
+
+
+def find_consolidated_stock(consolidated_dir: Path, date: str, stock: str) -> Optional[Path]:
+    """找出含有指定股票的每日合併檔，沒有時返回 None"""
+    for path in consolidated_files(consolidated_dir, date):
+        if stock in read_stock_index(path):
+            return path
+    return None
+
+
+def read_consolidated_stock(parquet_path: Path, stock: str, data_type: Optional[str] = None,
+                            columns: Optional[Sequence[str]] = None, price_ticks: bool = False) -> pd.DataFrame:
+    """
+    由每日合併檔讀取單一股票（只讀該股票的 row group）
+
+    Args:
+        parquet_path: 每日合併檔路徑
+        stock: 股票代碼
+        data_type: 'Trade' / 'Depth'，None 表示全部
+        columns: 欄位投影（檔案中不存在的欄位略過，None 表示全部欄位）
+        price_ticks: True 時價格欄位為整數 tick，否則為浮點價格
+
+    Returns:
+        DataFrame（指定 data_type 時依時間排序；股票不在檔案中時為空）
+    """
+    parquet_file = pq.ParquetFile(parquet_path)
+    if columns is not None:
+        available = set(parquet_file.schema_arrow.names)
+        columns = [c for c in columns if c in available]
+
+    scale = price_scale_of(parquet_file.metadata.metadata)
+    start, end = read_stock_index(parquet_path).get(stock, (0, 0))
+    row_groups = list(range(start, end))
+    if data_type is not None:
+        types = row_group_types(parquet_file.metadata)
+        row_groups = [rg for rg in row_groups if types[rg] in (data_type, None)]
+
+    if not row_groups:
+        schema = parquet_file.schema_arrow
+        if columns is not None:
+            schema = pa.schema([schema.field(c) for c in columns])
+        return apply_price_mode(schema.empty_table().to_pandas(), scale, price_ticks)
+
+    read_columns = columns
+    if data_type is not None and columns is not None and 'Type' not in columns:
+        read_columns = list(columns) + ['Type']
+    df = apply_price_mode(parquet_file.read_row_groups(row_groups, columns=read_columns).to_pandas(),
+                          scale, price_ticks)
+    if data_type is not None:
+        df = df[df['Type'] == data_type].reset_index(drop=True)
+        if read_columns is not columns:
+            df = df.drop(columns=['Type'])
+        if not is_time_sorted(parquet_file.metadata):
+            df = time_ordered(df)
+    return df
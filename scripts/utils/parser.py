@@ -35,6 +35,7 @@ def parse_trade_line(line: str, date_str: str) -> Optional[Dict[str, Any]]:
     格式: Trade,股票代碼,成交時間,試撮旗標,成交價,成交單量,成交總量[,序號]
     - 試撮旗標: 0=一般揭示, 1=試算揭示
     - 成交價: 需除以 10000 (4位小數)
+    - 序號: 行情序號，保留為 Seq 欄位（同一微秒內的排序依據），沒有時為 None
 
     Args:
         line: 原始資料行
@@ -64,6 +65,7 @@ def parse_trade_line(line: str, date_str: str) -> Optional[Dict[str, Any]]:
             'StockCode': stock_code,
             'Datetime': dt,
             'Timestamp': int(timestamp) if timestamp.isdigit() else None,
+            'Seq': parse_sequence(fields[7]) if len(fields) > 7 else None,
             'Flag': flag,
             'Price': price,
             'Volume': volume,
@@ -80,6 +82,7 @@ def parse_depth_line(line: str, date_str: str) -> Optional[Dict[str, Any]]:
     格式: Depth,股票代碼,報價時間,BID:委買檔數,買盤檔位...,ASK:委賣檔數,賣盤檔位...[,序號]
     - 買賣盤檔位格式: 價格*數量
     - 價格: 需除以 10000 (4位小數)
+    - 序號: 行情序號，保留為 Seq 欄位，沒有時為 None
 
     Args:
         line: 原始資料行
@@ -120,6 +123,7 @@ def parse_depth_line(line: str, date_str: str) -> Optional[Dict[str, Any]]:
             'StockCode': stock_code,
             'Datetime': dt,
             'Timestamp': int(timestamp) if timestamp.isdigit() else None,
+            'Seq': None,
             'BidCount': bid_count,
             'AskCount': ask_count
         }
@@ -140,6 +144,8 @@ def parse_depth_line(line: str, date_str: str) -> Optional[Dict[str, Any]]:
         last_field = fields[-1]
         end_idx = -1 if '*' not in last_field else None
         ask_fields = fields[ask_idx+1:end_idx] if end_idx else fields[ask_idx+1:]
+        if end_idx and ask_idx != len(fields) - 1:
+            result['Seq'] = parse_sequence(last_field)
 
         for i in range(5):
             price, volume = None, None
@@ -156,6 +162,12 @@ def parse_depth_line(line: str, date_str: str) -> Optional[Dict[str, Any]]:
         return None
 
 
+def parse_sequence(value: str) -> Optional[int]:
+    """解析行情序號欄位，不是整數時返回 None"""
+    value = value.strip()
+    return int(value) if value.isdigit() else None
+
+
 def split_price_volume(value: str) -> tuple[Optional[float], Optional[int]]:
     """
     拆分價格*數量的字串
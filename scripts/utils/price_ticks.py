@@ -0,0 +1,140 @@
+"""
+定點整數價格模組
+原始行情的價格本來就是整數（價格 × PRICE_DECIMAL_DIVISOR，以下稱 tick），
+整數 tick 模式全程保留這個整數，不轉成浮點數：
+
+- 儲存：batch_decode --price-ticks 將價格欄位存成 int32，footer 記錄倍率（PRICE_SCALE_KEY）
+- 計算：VWAP 以整數累計成交金額，內外盤判斷為整數比較
+- 輸出：payload 的價格為整數 tick，另附 price_scale（價格 = tick / price_scale）；
+  payload 採用能精確表示所有價格的最粗倍率（見 payload_price_scale，本行情價格最多兩位小數，通常為 100），
+  數字位數少於儲存倍率與浮點價格，payload 較小
+
+讀取端（parquet_io.read_quote_rows 等）預設將 tick 還原為浮點數（與解析時的 int / 10000 相同），
+既有程式不受影響；指定 price_ticks=True 時取得整數 tick（浮點價格的舊檔案會換算）
+"""
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from .config import PRICE_DECIMAL_DIVISOR
+
+PRICE_SCALE = PRICE_DECIMAL_DIVISOR
+
+# payload 可用的價格倍率（由粗到細，皆為 PRICE_SCALE 的因數）
+PAYLOAD_PRICE_SCALES = (100, 1000, PRICE_SCALE)
+
+# 價格倍率存放的 footer key（沒有此 key 的檔案為浮點價格）
+PRICE_SCALE_KEY = b'quote_price_scale'
+
+# 以 tick 表示時使用的 pandas 型別（五檔可能無報價，使用可為空值的整數型別）
+TICK_DTYPE = 'Int32'
+
+PRICE_COLUMNS = ['Price'] + [f'{side}{level}_Price' for side in ('Bid', 'Ask') for level in range(1, 6)]
+
+
+def price_scale_of(key_value: Optional[Dict[bytes, bytes]]) -> Optional[int]:
+    """由 Parquet footer（或 Arrow schema）的 key-value metadata 取得價格倍率，浮點價格時返回 None"""
+    raw = (key_value or {}).get(PRICE_SCALE_KEY)
+    return int(raw) if raw else None
+
+
+def price_scale_metadata(scale: int = PRICE_SCALE) -> Dict[bytes, bytes]:
+    """寫入 footer 的價格倍率 metadata"""
+    return {PRICE_SCALE_KEY: str(scale).encode('utf-8')}
+
+
+def to_price_ticks(df: pd.DataFrame, scale: int = PRICE_SCALE) -> pd.DataFrame:
+    """
+    浮點價格欄位換算為整數 tick（已是整數的欄位不變）
+
+    Returns:
+        價格欄位為 Int32 的 DataFrame（無報價為 <NA>）；沒有需要換算的欄位時返回原物件
+    """
+    columns = [c for c in PRICE_COLUMNS
+               if c in df.columns and not pd.api.types.is_integer_dtype(df[c])]
+    if not columns:
+        return df
+    return df.assign(**{
+        c: (pd.to_numeric(df[c], errors='coerce') * scale).round().astype(TICK_DTYPE) for c in columns
+    })
+
+
+def from_price_ticks(df: pd.DataFrame, scale: int = PRICE_SCALE) -> pd.DataFrame:
+    """整數 tick 還原為浮點價格（與解析時的 int / scale 結果相同）"""
+    columns = [c for c in PRICE_COLUMNS if c in df.columns]
+    if not columns:
+        return df
+    return df.assign(**{c: df[c].astype('float64') / scale for c in columns})
+
+
+def apply_price_mode(df: pd.DataFrame, scale: Optional[int], price_ticks: bool = False) -> pd.DataFrame:
+    """
+    依檔案的價格倍率與呼叫端需要的表示方式轉換價格欄位
+
+    Args:
+        df: 讀出的資料（Arrow 轉換後，含空值的整數欄位為 float64）
+        scale: 檔案的價格倍率（price_scale_of），None 表示檔案為浮點價格
+        price_ticks: True 時返回整數 tick，否則返回浮點價格
+    """
+    if not price_ticks:
+        return df if scale is None else from_price_ticks(df, scale)
+    if scale is None or scale != PRICE_SCALE:
+        return to_price_ticks(df if scale is None else from_price_ticks(df, scale))
+    columns = [c for c in PRICE_COLUMNS if c in df.columns]
+    return df.assign(**{c: df[c].astype(TICK_DTYPE) for c in columns}) if columns else df
+
+
+def payload_price_scale(*frames: pd.DataFrame) -> int:
+    """
+    能精確表示所有價格的最粗 payload 倍率
+
+    Args:
+        frames: 價格欄位為 PRICE_SCALE 倍率整數 tick 的 DataFrame（見 apply_price_mode）
+    """
+    ticks = [frame[c].dropna().to_numpy(dtype=np.int64)
+             for frame in frames for c in PRICE_COLUMNS if c in frame.columns]
+    for scale in PAYLOAD_PRICE_SCALES:
+        step = PRICE_SCALE // scale
+        if all((values % step == 0).all() for values in ticks):
+            return scale
+    return PRICE_SCALE
+
+
+def rescale_price_ticks(df: pd.DataFrame, scale: int) -> pd.DataFrame:
+    """PRICE_SCALE 倍率的 tick 換算為 payload 倍率 scale（scale 需由 payload_price_scale 取得，換算無誤差）"""
+    step = PRICE_SCALE // scale
+    columns = [c for c in PRICE_COLUMNS if c in df.columns]
+    if step == 1 or not columns:
+        return df
+    return df.assign(**{c: df[c] // step for c in columns})
+
+
+def tick_value(value):
+    """單一 tick 轉為 Python int；無報價時為 NaN（比較結果與浮點價格模式相同）"""
+    return float('nan') if pd.isna(value) else int(value)
+
+
+def rounded_div(numerator, denominator):
+    """
+    整數除法四捨五入（適用 Python int 與 NumPy 整數陣列，分子分母皆需為非負）
+
+    分母為 0 時返回 0
+    """
+    if isinstance(denominator, np.ndarray):
+        safe = np.where(denominator > 0, denominator, 1)
+        return np.where(denominator > 0, (2 * numerator + safe) // (2 * safe), 0)
+    return (2 * numerator + denominator) // (2 * denominator) if denominator > 0 else 0
+
+
+def vwap_ticks(prices: np.ndarray, volumes: np.ndarray) -> np.ndarray:
+    """
+    以整數累計成交金額計算 VWAP（單位 tick，四捨五入到整數）
+
+    Args:
+        prices: 成交價 tick
+        volumes: 成交量
+    """
+    cumulative_amount = np.cumsum(np.asarray(prices, dtype=np.int64) * np.asarray(volumes, dtype=np.int64))
+    cumulative_volume = np.cumsum(np.asarray(volumes, dtype=np.int64))
+    return rounded_div(cumulative_amount, cumulative_volume)
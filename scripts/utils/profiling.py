@@ -0,0 +1,248 @@
+"""
+效能剖析模組
+在 worker 行程/執行緒內以 cProfile（可選 tracemalloc）剖析每個任務，
+結束後合併為單一 pstats 檔、flame graph 用的 collapsed stack 檔，並輸出熱點摘要
+
+使用方式：
+    profile_dir = resolve_profile_dir(args, 'data_convert')
+    task = ProfiledTask(process_stock_file, profile_dir, trace_memory=args.profile_memory)
+    executor.submit(task, args)        # 與原本的 func(args) 相同
+    ...
+    report_profiles(profile_dir, logger, top=args.profile_top)
+"""
+import argparse
+import cProfile
+import json
+import os
+import pstats
+import threading
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .config import PROFILE_DIR
+
+# 每個 worker（行程 + 執行緒）一個累計的 Profile
+_profilers: Dict[Tuple[int, int], cProfile.Profile] = {}
+_profilers_lock = threading.Lock()
+
+MERGED_STATS_FILE = 'merged.prof'
+COLLAPSED_FILE = 'merged.collapsed'
+MEMORY_FILE_PREFIX = 'memory-'
+
+# collapsed stack 展開的最大深度與最小權重（微秒），避免遞迴呼叫圖爆炸
+COLLAPSE_MAX_DEPTH = 64
+COLLAPSE_MIN_MICROSECONDS = 1.0
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    """加入 --profile / --profile-memory / --profile-top 參數"""
+    parser.add_argument('--profile', nargs='?', const='', default=None, metavar='DIR',
+                        help=f'以 cProfile 剖析每個 worker，結果存到 DIR（預設: {PROFILE_DIR}/<程式>-<時間>）')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='搭配 --profile：同時以 tracemalloc 記錄每個任務的記憶體峰值（較慢）')
+    parser.add_argument('--profile-top', type=int, default=20,
+                        help='搭配 --profile：熱點摘要筆數 (預設: 20)')
+
+
+def resolve_profile_dir(args: argparse.Namespace, name: str) -> Optional[Path]:
+    """
+    依 --profile 參數決定剖析輸出目錄
+
+    Returns:
+        輸出目錄，未啟用剖析時返回 None
+    """
+    if args.profile is None:
+        return None
+    if args.profile:
+        return Path(args.profile)
+    return PROFILE_DIR / f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+
+
+class ProfiledTask:
+    """
+    包裝 worker 函數，呼叫時以 cProfile 剖析（可被 ProcessPoolExecutor pickle）
+
+    同一 worker 的所有任務累計在同一個 Profile，每個任務結束後覆寫該 worker 的 .prof 檔，
+    行程池結束時不需要額外的收尾步驟
+    """
+
+    def __init__(self, func: Callable, profile_dir: Path, trace_memory: bool = False):
+        self.func = func
+        self.profile_dir = Path(profile_dir)
+        self.trace_memory = trace_memory
+
+    def __call__(self, *args, **kwargs):
+        key = (os.getpid(), threading.get_ident())
+        with _profilers_lock:
+            profiler = _profilers.setdefault(key, cProfile.Profile())
+
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ 同一行程只能有一個作用中的 profiler（多執行緒時），此任務不剖析
+            profiler = None
+        if profiler is None:
+            return self.func(*args, **kwargs)
+
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(str(self.profile_dir / f"worker-{key[0]}-{key[1]}.prof"))
+            if self.trace_memory:
+                self._record_memory(key, args)
+
+    def _record_memory(self, key: Tuple[int, int], args: tuple) -> None:
+        """以 JSON Lines 記錄此任務的記憶體峰值（同一行程的執行緒共用 tracemalloc，峰值會重疊）"""
+        _, peak = tracemalloc.get_traced_memory()
+        task = args[0] if args else None
+        label = str(task[0] if isinstance(task, tuple) and task else task)
+        with open(self.profile_dir / f"{MEMORY_FILE_PREFIX}{key[0]}.jsonl", 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'task': label, 'peak_mb': round(peak / 1024 / 1024, 3)},
+                               ensure_ascii=False) + '\n')
+
+
+def merge_profiles(profile_dir: Path) -> Optional[pstats.Stats]:
+    """
+    合併目錄下所有 worker 的 .prof 檔
+
+    Returns:
+        合併後的 Stats，沒有任何剖析檔時返回 None
+    """
+    files = sorted(str(p) for p in Path(profile_dir).glob('worker-*.prof'))
+    if not files:
+        return None
+
+    stats = pstats.Stats(files[0])
+    for path in files[1:]:
+        stats.add(path)
+    return stats
+
+
+def _func_label(func: tuple) -> str:
+    """pstats 函數鍵 (filename, lineno, name) 轉為 flame graph 的框架名稱"""
+    filename, lineno, name = func
+    if filename == '~':
+        return name
+    return f"{name} ({os.path.basename(filename)}:{lineno})"
+
+
+def write_collapsed_stacks(stats: pstats.Stats, output_path: Path) -> int:
+    """
+    由 pstats 的呼叫圖產生 collapsed stack 檔（flamegraph.pl / speedscope 可直接讀取）
+
+    pstats 只保留呼叫者→被呼叫者的邊，因此從根節點展開時依邊的累計時間比例分配，
+    與 flameprof 等工具的做法相同；遞迴呼叫在重複出現時截斷
+
+    Returns:
+        寫出的 stack 行數
+    """
+    raw = stats.stats
+    callees: Dict[tuple, List[Tuple[tuple, float]]] = {}
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    roots = [func for func, (_, _, _, _, callers) in raw.items() if not callers]
+    lines: Dict[str, float] = {}
+
+    def expand(func: tuple, stack: List[str], factor: float) -> None:
+        cumulative = raw[func][3]
+        self_time = raw[func][2] * factor
+        frames = stack + [_func_label(func)]
+        if self_time * 1e6 >= COLLAPSE_MIN_MICROSECONDS:
+            key = ';'.join(frames)
+            lines[key] = lines.get(key, 0.0) + self_time
+
+        if len(frames) >= COLLAPSE_MAX_DEPTH or cumulative <= 0:
+            return
+        for child, edge_cumulative in callees.get(func, []):
+            if _func_label(child) in frames or child not in raw:
+                continue
+            child_cumulative = raw[child][3]
+            if child_cumulative <= 0:
+                continue
+            child_factor = factor * edge_cumulative / child_cumulative
+            if child_cumulative * child_factor * 1e6 >= COLLAPSE_MIN_MICROSECONDS:
+                expand(child, frames, child_factor)
+
+    for root in roots:
+        expand(root, [], 1.0)
+
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for key, seconds in lines.items():
+            f.write(f"{key} {int(round(seconds * 1e6))}\n")
+    return len(lines)
+
+
+def top_functions(stats: pstats.Stats, top: int = 20, sort: str = 'tottime') -> List[dict]:
+    """
+    熱點函數列表
+
+    Args:
+        stats: pstats.Stats
+        top: 筆數
+        sort: 'tottime'（自身耗時）或 'cumtime'（含子呼叫）
+
+    Returns:
+        [{'function', 'ncalls', 'tottime', 'cumtime'}, ...]
+    """
+    index = 2 if sort == 'tottime' else 3
+    items = sorted(stats.stats.items(), key=lambda item: item[1][index], reverse=True)[:top]
+    return [{'function': _func_label(func), 'ncalls': nc, 'tottime': tt, 'cumtime': ct}
+            for func, (_, nc, tt, ct, _) in items]
+
+
+def load_memory_peaks(profile_dir: Path) -> List[dict]:
+    """讀取所有 worker 的任務記憶體峰值，依峰值由大到小排序"""
+    records = []
+    for path in Path(profile_dir).glob(f'{MEMORY_FILE_PREFIX}*.jsonl'):
+        with open(path, 'r', encoding='utf-8') as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    return sorted(records, key=lambda r: r['peak_mb'], reverse=True)
+
+
+def report_profiles(profile_dir: Path, logger, top: int = 20) -> Optional[Path]:
+    """
+    合併剖析結果、寫出 merged.prof / merged.collapsed，並以日誌輸出熱點摘要
+
+    Args:
+        profile_dir: 剖析輸出目錄
+        logger: 日誌記錄器
+        top: 熱點筆數
+
+    Returns:
+        合併後的 pstats 檔案路徑，沒有剖析資料時返回 None
+    """
+    profile_dir = Path(profile_dir)
+    stats = merge_profiles(profile_dir)
+    if stats is None:
+        logger.warning("沒有剖析資料")
+        return None
+
+    merged_path = profile_dir / MERGED_STATS_FILE
+    stats.dump_stats(str(merged_path))
+    stack_count = write_collapsed_stacks(stats, profile_dir / COLLAPSED_FILE)
+
+    logger.info(f"剖析熱點（自身耗時前 {top} 名，共 {stats.total_tt:.2f} 秒）:")
+    logger.info(f"  {'tottime':>9}{'cumtime':>9}{'ncalls':>11}  函數")
+    for item in top_functions(stats, top):
+        logger.info(f"  {item['tottime']:>9.3f}{item['cumtime']:>9.3f}{item['ncalls']:>11}  {item['function']}")
+
+    memory_peaks = load_memory_peaks(profile_dir)
+    if memory_peaks:
+        logger.info(f"記憶體峰值最高的任務（前 {min(top, len(memory_peaks))} 名）:")
+        for record in memory_peaks[:top]:
+            logger.info(f"  {record['peak_mb']:>10.1f} MB  {record['task']}")
+
+    logger.info(f"合併 pstats: {merged_path}")
+    logger.info(f"Collapsed stacks ({stack_count} 行): {profile_dir / COLLAPSED_FILE}")
+    return merged_path
@@ -0,0 +1,372 @@
+"""
+伺服器請求計時與指標模組
+供 parquet_server.py、web_viewer.py 與 static_server.py 共用：
+
+- 各階段耗時寫入 Server-Timing 標頭（瀏覽器開發者工具可直接檢視；屬內部資訊，
+  預設不送出，環境變數 QUOTE_SERVER_TIMING=1 或伺服器的 --server-timing 啟用）
+- 各路由/階段的延遲累計為直方圖
+- 管理者可加上 ?profile=1 取得該請求的 cProfile 結果
+- /metrics 以 Prometheus 文字格式輸出請求數、延遲、回應大小、進行中請求數、
+  快取命中/未命中/淘汰與行程 RSS（不依賴 prometheus_client）
+"""
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import sys
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 延遲直方圖的區間上限（秒）
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 回應大小直方圖的區間上限（bytes）
+DEFAULT_SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 512 * 1024, 1024 ** 2, 5 * 1024 ** 2,
+                        20 * 1024 ** 2, 100 * 1024 ** 2)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 管理者權杖的環境變數；未設定時只允許本機（loopback）請求剖析
+ADMIN_TOKEN_ENV = 'QUOTE_ADMIN_TOKEN'
+ADMIN_TOKEN_HEADER = 'X-Admin-Token'
+
+PROFILE_TOP = 40
+
+# 回應附加 Server-Timing 標頭的環境變數（預設關閉）
+SERVER_TIMING_ENV = 'QUOTE_SERVER_TIMING'
+
+
+class Histogram:
+    """累積式直方圖（區間計數、總和、次數），執行緒安全"""
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # 最後一格為 +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = len(self.buckets)
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                index = i
+                break
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> dict:
+        """{'buckets': [(上限, 累積次數), ...], 'sum', 'count'}，最後一格上限為 inf"""
+        with self._lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        cumulative = []
+        running = 0
+        for upper, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            running += bucket_count
+            cumulative.append((upper, running))
+        return {'buckets': cumulative, 'sum': total, 'count': count}
+
+
+def _format_labels(labelnames: Tuple[str, ...], labels: Tuple[str, ...], extra: str = '') -> str:
+    """組成 Prometheus 標籤字串，例如 {route="/api/data",le="0.5"}"""
+    parts = []
+    for name, value in zip(labelnames, labels):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{name}="{escaped}"')
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _MetricVec:
+    """帶標籤的指標基底；除了直接累計外，也可登記回呼函數（render 時取值）"""
+
+    metric_type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+        self._lock = threading.Lock()
+
+    def set_function(self, labels: Tuple[str, ...], func: Callable[[], float]) -> None:
+        """登記回呼函數（例如快取物件自己維護的計數）"""
+        with self._lock:
+            self._functions[tuple(labels)] = func
+
+    def samples(self) -> List[Tuple[str, Tuple[str, ...], float]]:
+        with self._lock:
+            values = list(self._values.items())
+            functions = list(self._functions.items())
+        samples = [(self.name, labels, value) for labels, value in values]
+        for labels, func in functions:
+            try:
+                value = func()
+            except Exception:
+                continue
+            if value is not None:
+                samples.append((self.name, labels, value))
+        return samples
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class CounterVec(_MetricVec):
+    """只增不減的計數"""
+
+    metric_type = 'counter'
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class GaugeVec(_MetricVec):
+    """可增可減的量測值"""
+
+    metric_type = 'gauge'
+
+    def set(self, *labels: str, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class HistogramVec(_MetricVec):
+    """帶標籤的直方圖"""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self.histograms: Dict[Tuple[str, ...], Histogram] = {}
+
+    def observe(self, *labels: str, value: float) -> None:
+        histogram = self.histograms.get(labels)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(labels, Histogram(self.buckets))
+        histogram.observe(value)
+
+    def snapshot(self) -> Dict[Tuple[str, ...], dict]:
+        with self._lock:
+            items = list(self.histograms.items())
+        return {labels: histogram.snapshot() for labels, histogram in items}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, snap in sorted(self.snapshot().items()):
+            for upper, count in snap['buckets']:
+                le = f'le="{_format_value(upper)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {count}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(snap['sum'])}")
+            lines.append(f"{self.name}_count{label_text} {snap['count']}")
+        return lines
+
+
+class PhaseLatency(HistogramVec):
+    """依 (路由, 階段) 分組的延遲直方圖；階段 'total' 為整個請求"""
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__('quote_http_request_duration_seconds',
+                         'HTTP request latency by route and phase (phase="total" is the whole request)',
+                         ('route', 'phase'), buckets)
+
+    def observe_request(self, route: str, stages: Dict[str, float], total: float) -> None:
+        """記錄一個請求的各階段耗時與總耗時"""
+        for phase, seconds in stages.items():
+            self.observe(route, phase, value=seconds)
+        self.observe(route, 'total', value=total)
+
+
+def process_rss_bytes() -> Optional[float]:
+    """
+    目前行程的常駐記憶體 (bytes)
+
+    Linux 讀取 /proc/self/statm；其他平台使用 psutil，都沒有時以 getrusage 的高水位代替
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return float(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE'))
+    except (OSError, ValueError, AttributeError):
+        pass
+    if psutil is not None:
+        return float(psutil.Process().memory_info().rss)
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return float(peak if sys.platform == 'darwin' else peak * 1024)
+    return None
+
+
+class ServerMetrics:
+    """
+    HTTP 伺服器的標準指標組
+
+    使用方式：
+        METRICS.start_request()
+        ...
+        METRICS.finish_request(route, status, timer.stages, total_seconds, response_bytes)
+        body = METRICS.render()    # /metrics
+    """
+
+    def __init__(self):
+        self.requests = CounterVec('quote_http_requests_total', 'HTTP requests by route and status code',
+                                   ('route', 'status'))
+        self.latency = PhaseLatency()
+        self.response_bytes = HistogramVec('quote_http_response_bytes', 'HTTP response size in bytes',
+                                           ('route',), DEFAULT_SIZE_BUCKETS)
+        self.in_flight = GaugeVec('quote_http_requests_in_flight', 'HTTP requests currently being served')
+        self.cache_events = CounterVec('quote_cache_events_total', 'Cache lookups and evictions',
+                                       ('cache', 'event'))
+        self.cache_entries = GaugeVec('quote_cache_entries', 'Entries currently held by each cache', ('cache',))
+        self.rss = GaugeVec('process_resident_memory_bytes', 'Resident memory size in bytes')
+        self.rss.set_function((), process_rss_bytes)
+        self.in_flight.set(value=0)
+
+        self.metrics = [self.requests, self.latency, self.response_bytes, self.in_flight,
+                        self.cache_events, self.cache_entries, self.rss]
+
+    def register_cache(self, name: str, cache) -> None:
+        """
+        登記快取；快取物件需提供 hits / misses / evictions 屬性與 __len__
+        """
+        for event, attr in (('hit', 'hits'), ('miss', 'misses'), ('eviction', 'evictions')):
+            self.cache_events.set_function((name, event), lambda a=attr: getattr(cache, a))
+        self.cache_entries.set_function((name,), lambda: len(cache))
+
+    def start_request(self) -> None:
+        self.in_flight.inc()
+
+    def finish_request(self, route: str, status: int, stages: Dict[str, float], total: float,
+                       response_bytes: Optional[int] = None) -> None:
+        self.in_flight.dec()
+        self.requests.inc(route, str(status))
+        self.latency.observe_request(route, stages, total)
+        if response_bytes is not None:
+            self.response_bytes.observe(route, value=response_bytes)
+
+    def render(self) -> str:
+        """Prometheus 文字格式"""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class CountingWriter:
+    """包裝 wfile，累計寫出的位元組數（回應大小直方圖用）"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        return self.raw.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+def format_server_timing(stages: Dict[str, float], total: Optional[float] = None) -> str:
+    """
+    組成 Server-Timing 標頭值
+
+    Args:
+        stages: {階段: 秒數}
+        total: 總耗時（秒，可選）
+
+    Returns:
+        例如 'read;dur=12.3, convert;dur=80.1, total;dur=95.0'
+    """
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ', '.join(parts)
+
+
+def server_timing_enabled() -> bool:
+    """環境變數 QUOTE_SERVER_TIMING 為 1 / true / yes 時，回應附加 Server-Timing 標頭"""
+    return os.environ.get(SERVER_TIMING_ENV, '').strip().lower() in ('1', 'true', 'yes')
+
+
+def is_admin_request(headers, client_ip: str) -> bool:
+    """
+    判斷請求是否具管理者權限
+
+    設定環境變數 QUOTE_ADMIN_TOKEN 時需帶相同的 X-Admin-Token 標頭；
+    未設定時只允許本機請求
+    """
+    token = os.environ.get(ADMIN_TOKEN_ENV)
+    if token:
+        return hmac.compare_digest(headers.get(ADMIN_TOKEN_HEADER, ''), token)
+    return client_ip in ('127.0.0.1', '::1', 'localhost')
+
+
+# 同時只允許一個剖析中的請求（Python 3.12+ 同一行程只能有一個作用中的 profiler）
+_profile_lock = threading.Lock()
+
+
+def profile_call(func: Callable, *args, top: int = PROFILE_TOP, **kwargs) -> Optional[str]:
+    """
+    以 cProfile 執行 func，返回 pstats 文字報告（依累計時間排序）
+
+    Returns:
+        報告文字；已有其他請求正在剖析時返回 None
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return None
+
+    try:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            func(*args, **kwargs)
+        finally:
+            profiler.disable()
+
+        output = io.StringIO()
+        stats = pstats.Stats(profiler, stream=output)
+        stats.sort_stats('cumulative').print_stats(top)
+        output.write('\n')
+        stats.sort_stats('tottime').print_stats(top)
+        return output.getvalue()
+    finally:
+        _profile_lock.release()
@@ -0,0 +1,86 @@
+"""
+盤中追蹤讀取模組
+追蹤持續增長中的 Quote 檔案，只讀取新增的完整資料行，並以 checkpoint 記錄位移
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+DEFAULT_MAX_CHUNK_BYTES = 8 * 1024 * 1024
+
+
+class QuoteFileTail:
+    """
+    追蹤單一 Quote 檔案
+
+    offset 永遠停在最後一個完整資料行（含換行）之後，
+    尚未寫完的半行留待下次讀取
+    """
+
+    def __init__(self, file_path: Path, offset: int = 0, max_chunk_bytes: int = DEFAULT_MAX_CHUNK_BYTES):
+        self.file_path = Path(file_path)
+        self.offset = offset
+        self.max_chunk_bytes = max_chunk_bytes
+
+    def read_new_lines(self) -> List[Tuple[int, str]]:
+        """
+        讀取自上次位移之後新增的完整資料行
+
+        Returns:
+            [(該行結尾的位移, 資料行), ...]，檔案不存在或沒有新資料時返回空列表
+        """
+        if not self.file_path.exists():
+            return []
+
+        if self.file_path.stat().st_size <= self.offset:
+            return []
+
+        with open(self.file_path, 'rb') as f:
+            f.seek(self.offset)
+            chunk = f.read(self.max_chunk_bytes)
+
+        last_newline = chunk.rfind(b'\n')
+        if last_newline == -1:
+            return []
+
+        lines = []
+        position = self.offset
+        for raw_line in chunk[:last_newline + 1].splitlines(keepends=True):
+            position += len(raw_line)
+            lines.append((position, raw_line.decode('utf-8', errors='ignore')))
+
+        self.offset = position
+        return lines
+
+
+def load_checkpoint(checkpoint_file: Path) -> Dict[str, int]:
+    """
+    載入 checkpoint（市場到位移的字典）
+
+    Args:
+        checkpoint_file: checkpoint 檔案路徑
+
+    Returns:
+        {market: offset}，檔案不存在時返回空字典
+    """
+    if not checkpoint_file.exists():
+        return {}
+
+    with open(checkpoint_file, 'r', encoding='utf-8') as f:
+        return {market: int(offset) for market, offset in json.load(f).items()}
+
+
+def save_checkpoint(checkpoint_file: Path, offsets: Dict[str, int]) -> None:
+    """
+    原子性寫入 checkpoint
+
+    Args:
+        checkpoint_file: checkpoint 檔案路徑
+        offsets: {market: offset}
+    """
+    checkpoint_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = checkpoint_file.with_name(checkpoint_file.name + '.tmp')
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(offsets, f)
+    os.replace(tmp_file, checkpoint_file)
@@ -0,0 +1,374 @@
+"""
+逐筆資料存取模組
+以 store[date][stock] 的方式延遲讀取 decoded_quotes/{date}/{stock}.parquet，
+供筆記本與研究腳本共用，不必各自重寫「讀檔、拆 Trade/Depth、轉 Datetime、快取」
+沒有個股檔案時改由每日合併檔（decoded_daily/{date}.parquet，見 parquet_io）依股票索引讀取
+
+使用方式：
+    store = TickStore()
+    day = store['20251031']['2330']
+    day.trades                      # 成交（Datetime, Flag, Price, Volume, TotalVolume）
+    day.depth                       # 五檔（Datetime, BidCount, AskCount, Bid1_Price ... Ask5_Volume）
+    day.select('Price').trades      # 只讀取需要的欄位
+    day.bars('1m')                  # 成交 K 棒（open/high/low/close/volume/trades/vwap）
+    day.book_at('09:30:00')         # 該時間點（含）之前最近一筆五檔
+    store.load('20251031', ['2330', '2317'])   # 平行預先載入多個股票日
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as dt_time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+
+from .config import DECODED_DIR, CONSOLIDATED_DIR, DEFAULT_MAX_WORKERS
+from .parquet_io import (consolidated_dates, consolidated_files, find_consolidated_stock,
+                         read_consolidated_stock, read_quote_rows, read_stock_index)
+from .timeline import time_ordered
+
+TRADE_COLUMNS = ['Datetime', 'Flag', 'Price', 'Volume', 'TotalVolume']
+DEPTH_COLUMNS = ['Datetime', 'BidCount', 'AskCount'] + [
+    f'{side}{level}_{field}' for level in range(1, 6) for side in ('Bid', 'Ask') for field in ('Price', 'Volume')
+]
+KIND_TYPES = {'trades': 'Trade', 'depth': 'Depth'}
+KIND_COLUMNS = {'trades': TRADE_COLUMNS, 'depth': DEPTH_COLUMNS}
+
+# K 棒週期縮寫：'1m' → '1min'
+_BAR_UNITS = {'s': 's', 'm': 'min', 'h': 'h'}
+
+
+class FrameCache:
+    """
+    已解碼 DataFrame 的 LRU 快取（執行緒安全）
+
+    以 (路徑, mtime, 種類, 欄位) 為鍵，檔案更新後自動失效；
+    同時限制筆數與總記憶體，任一超過即淘汰最久未使用者
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: Optional[int] = 1024 ** 3):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: 'OrderedDict[tuple, Tuple[pd.DataFrame, int]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: tuple) -> Optional[pd.DataFrame]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: tuple, frame: pd.DataFrame) -> None:
+        size = int(frame.memory_usage(index=True).sum())
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= previous[1]
+            self._entries[key] = (frame, size)
+            self.total_bytes += size
+            while len(self._entries) > 1 and (
+                    len(self._entries) > self.max_entries
+                    or (self.max_bytes is not None and self.total_bytes > self.max_bytes)):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def info(self) -> Dict[str, int]:
+        return {'entries': len(self._entries), 'bytes': self.total_bytes, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
+
+
+def _bar_rule(freq: str) -> str:
+    """K 棒週期轉為 pandas resample 規則（'1m' → '1min'，其他原樣傳入）"""
+    number, unit = freq[:-1], freq[-1:]
+    if number.isdigit() and unit in _BAR_UNITS:
+        return f'{number}{_BAR_UNITS[unit]}'
+    return freq
+
+
+class StockDay:
+    """單一股票日；資料在第一次存取時才讀取，並經由 TickStore 的快取共用"""
+
+    def __init__(self, store: 'TickStore', date: str, stock: str, columns: Optional[Sequence[str]] = None):
+        self.store = store
+        self.date = date
+        self.stock = stock
+        self.columns = tuple(columns) if columns else None
+
+    def __repr__(self) -> str:
+        return f"StockDay(date={self.date!r}, stock={self.stock!r}, columns={self.columns!r})"
+
+    @property
+    def path(self) -> Optional[Path]:
+        """資料所在檔案（個股檔案或每日合併檔）"""
+        return self.store.source(self.date, self.stock)
+
+    def select(self, *columns: str) -> 'StockDay':
+        """只讀取指定欄位（Datetime 一定保留；不屬於成交/五檔的欄位各自略過）"""
+        return StockDay(self.store, self.date, self.stock, columns)
+
+    def _columns_for(self, kind: str) -> List[str]:
+        available = KIND_COLUMNS[kind]
+        if self.columns is None:
+            return available
+        return ['Datetime'] + [c for c in available if c in self.columns and c != 'Datetime']
+
+    @property
+    def trades(self) -> pd.DataFrame:
+        """成交資料（依時間排序）"""
+        return self.store.read(self.date, self.stock, 'trades', self._columns_for('trades'))
+
+    @property
+    def depth(self) -> pd.DataFrame:
+        """五檔資料（依時間排序）"""
+        return self.store.read(self.date, self.stock, 'depth', self._columns_for('depth'))
+
+    def bars(self, freq: str = '1m') -> pd.DataFrame:
+        """
+        由成交資料產生 K 棒
+
+        Args:
+            freq: 週期，例如 '30s'、'1m'、'5m'、'1h'（或任何 pandas resample 規則）
+
+        Returns:
+            以 K 棒起始時間為索引的 DataFrame：open, high, low, close, volume, trades, vwap；
+            沒有成交的區間不列出
+        """
+        trades = self.store.read(self.date, self.stock, 'trades', ['Datetime', 'Price', 'Volume'])
+        if trades.empty:
+            return pd.DataFrame(columns=['open', 'high', 'low', 'close', 'volume', 'trades', 'vwap'])
+
+        indexed = trades.set_index('Datetime')
+        resampler = indexed['Price'].resample(_bar_rule(freq))
+        bars = resampler.ohlc()
+        bars['volume'] = indexed['Volume'].resample(_bar_rule(freq)).sum()
+        bars['trades'] = resampler.count()
+        turnover = (indexed['Price'] * indexed['Volume']).resample(_bar_rule(freq)).sum()
+        bars['vwap'] = turnover / bars['volume'].where(bars['volume'] > 0)
+        return bars[bars['trades'] > 0]
+
+    def book_at(self, t: Union[str, dt_time, datetime, pd.Timestamp]) -> Optional[pd.Series]:
+        """
+        指定時間點（含）之前最近一筆五檔
+
+        Args:
+            t: 'HH:MM:SS[.ffffff]'、'HHMMSS'、datetime.time、datetime 或 Timestamp
+
+        Returns:
+            五檔資料列，該時間之前沒有五檔時返回 None
+        """
+        depth = self.store.read(self.date, self.stock, 'depth', self._columns_for('depth'))
+        if depth.empty:
+            return None
+
+        target = self.store.to_timestamp(self.date, t).to_datetime64()
+        position = int(depth['Datetime'].to_numpy().searchsorted(target, side='right')) - 1
+        if position < 0:
+            return None
+        return depth.iloc[position]
+
+
+class DayView:
+    """單一交易日：store[date][stock] 取得 StockDay"""
+
+    def __init__(self, store: 'TickStore', date: str):
+        self.store = store
+        self.date = date
+
+    def __repr__(self) -> str:
+        return f"DayView(date={self.date!r})"
+
+    def __getitem__(self, stock: str) -> StockDay:
+        if self.store.source(self.date, stock) is None:
+            raise KeyError(f"{self.date}/{stock}")
+        return StockDay(self.store, self.date, str(stock))
+
+    def __contains__(self, stock: str) -> bool:
+        return self.store.source(self.date, stock) is not None
+
+    def __iter__(self):
+        return iter(self.stocks())
+
+    def stocks(self) -> List[str]:
+        return self.store.stocks(self.date)
+
+    def load(self, stocks: Optional[Iterable[str]] = None, kinds: Sequence[str] = ('trades', 'depth'),
+             columns: Optional[Sequence[str]] = None) -> Dict[str, StockDay]:
+        """平行預先載入當日多個股票（預設全部）"""
+        stocks = self.stocks() if stocks is None else list(stocks)
+        loaded = self.store.fetch([(self.date, stock) for stock in stocks], kinds, columns)
+        return {stock: day for (_, stock), day in loaded.items()}
+
+
+class TickStore:
+    """
+    decoded_quotes 的延遲讀取介面
+
+    Args:
+        root: 解碼資料目錄（預設 DECODED_DIR）
+        consolidated_root: 每日合併檔目錄（預設 CONSOLIDATED_DIR）
+        max_entries: 快取的 DataFrame 數量上限
+        max_bytes: 快取的記憶體上限（None 表示只以筆數限制）
+        max_workers: 平行讀取的執行緒數（pyarrow 讀檔時會釋放 GIL）
+    """
+
+    def __init__(self, root: Union[str, Path] = DECODED_DIR, max_entries: int = 256,
+                 max_bytes: Optional[int] = 1024 ** 3, max_workers: int = DEFAULT_MAX_WORKERS,
+                 consolidated_root: Union[str, Path] = CONSOLIDATED_DIR):
+        self.root = Path(root)
+        self.consolidated_root = Path(consolidated_root)
+        self.cache = FrameCache(max_entries, max_bytes)
+        self.max_workers = max_workers
+
+    def __repr__(self) -> str:
+        return f"TickStore(root={str(self.root)!r}, cache={self.cache.info()})"
+
+    def __getitem__(self, date: str) -> DayView:
+        date = str(date)
+        if date not in self:
+            raise KeyError(date)
+        return DayView(self, date)
+
+    def __contains__(self, date: str) -> bool:
+        date = str(date)
+        return (self.root / date).is_dir() or bool(consolidated_files(self.consolidated_root, date))
+
+    def __iter__(self):
+        return iter(self.dates())
+
+    def dates(self) -> List[str]:
+        """可用日期（由舊到新）"""
+        dates = set(consolidated_dates(self.consolidated_root))
+        if self.root.exists():
+            dates.update(entry.name for entry in self.root.iterdir() if entry.is_dir() and entry.name.isdigit())
+        return sorted(dates)
+
+    def stocks(self, date: str) -> List[str]:
+        """指定日期的股票代碼"""
+        stocks = set()
+        for path in consolidated_files(self.consolidated_root, str(date)):
+            stocks.update(read_stock_index(path))
+        date_dir = self.root / str(date)
+        if date_dir.exists():
+            stocks.update(path.stem for path in date_dir.glob('*.parquet'))
+        return sorted(stocks)
+
+    def path(self, date: str, stock: str) -> Path:
+        return self.root / str(date) / f'{stock}.parquet'
+
+    def source(self, date: str, stock: str) -> Optional[Path]:
+        """股票日的資料檔：個股檔案優先，其次為含有該股票的每日合併檔；都沒有時返回 None"""
+        path = self.path(date, stock)
+        if path.exists():
+            return path
+        return find_consolidated_stock(self.consolidated_root, str(date), str(stock))
+
+    @staticmethod
+    def to_timestamp(date: str, t: Union[str, dt_time, datetime, pd.Timestamp]) -> pd.Timestamp:
+        """時間點轉為該日的 Timestamp（字串可為 'HH:MM[:SS[.ffffff]]'、'HHMM' 或 'HHMMSS'）"""
+        if isinstance(t, (datetime, pd.Timestamp)):
+            return pd.Timestamp(t)
+        day = pd.Timestamp(datetime.strptime(str(date), '%Y%m%d'))
+        if isinstance(t, dt_time):
+            return pd.Timestamp(datetime.combine(day.date(), t))
+        text = str(t)
+        if ':' not in text:
+            text = text.ljust(6, '0')
+            text = f'{text[:2]}:{text[2:4]}:{text[4:6]}' + (f'.{text[6:]}' if len(text) > 6 else '')
+        elif text.count(':') == 1:
+            text += ':00'
+        return day + pd.Timedelta(text)
+
+    def read(self, date: str, stock: str, kind: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        讀取單一股票日的成交或五檔（經過快取）
+
+        Args:
+            date: 日期 (YYYYMMDD)
+            stock: 股票代碼
+            kind: 'trades' 或 'depth'
+            columns: 讀取的欄位（預設為該種類全部欄位）
+
+        Returns:
+            依 Datetime 排序的 DataFrame（快取共用，請勿原地修改）
+        """
+        if kind not in KIND_TYPES:
+            raise ValueError(f"未知的資料種類: {kind}（可用: {', '.join(KIND_TYPES)}）")
+        path = self.source(date, stock)
+        if path is None:
+            raise FileNotFoundError(f"找不到資料: {date}/{stock}")
+        consolidated = path != self.path(date, stock)
+        columns = tuple(columns or KIND_COLUMNS[kind])
+        key = (str(path), os.stat(path).st_mtime_ns, str(stock), kind, columns)
+
+        frame = self.cache.get(key)
+        if frame is None:
+            frame = self._load(path, kind, columns, stock if consolidated else None)
+            self.cache.put(key, frame)
+        return frame
+
+    @staticmethod
+    def _load(path: Path, kind: str, columns: Tuple[str, ...], stock: Optional[str] = None) -> pd.DataFrame:
+        """只讀取需要的欄位與資料列（指定 stock 時 path 為每日合併檔，只讀該股票的 row group）"""
+        if stock is not None:
+            frame = read_consolidated_stock(path, stock, KIND_TYPES[kind], columns)
+        else:
+            frame = read_quote_rows(path, KIND_TYPES[kind], columns)
+
+        if 'Datetime' in frame.columns and not pd.api.types.is_datetime64_any_dtype(frame['Datetime']):
+            frame['Datetime'] = pd.to_datetime(frame['Datetime'])
+            frame = time_ordered(frame)
+        return frame.reset_index(drop=True)
+
+    def fetch(self, pairs: Iterable[Tuple[str, str]], kinds: Sequence[str] = ('trades', 'depth'),
+              columns: Optional[Sequence[str]] = None) -> Dict[Tuple[str, str], StockDay]:
+        """
+        以執行緒池平行讀取多個股票日並放入快取
+
+        Args:
+            pairs: [(date, stock), ...]
+            kinds: 要預先讀取的種類
+            columns: 欄位投影（同 StockDay.select）
+
+        Returns:
+            {(date, stock): StockDay}；不存在的股票日略過
+        """
+        days = {}
+        for date, stock in pairs:
+            if self.source(date, stock) is not None:
+                days[(str(date), str(stock))] = StockDay(self, str(date), str(stock), columns)
+
+        jobs = [(day, kind) for day in days.values() for kind in kinds]
+        if jobs:
+            with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(jobs)))) as executor:
+                list(executor.map(lambda job: getattr(job[0], job[1]), jobs))
+        return days
+
+    def load(self, date: str, stocks: Optional[Iterable[str]] = None, kinds: Sequence[str] = ('trades', 'depth'),
+             columns: Optional[Sequence[str]] = None) -> Dict[str, StockDay]:
+        """平行預先載入指定日期的多個股票（預設全部）"""
+        return DayView(self, str(date)).load(stocks, kinds, columns)
+
+    def cache_info(self) -> Dict[str, int]:
+        return self.cache.info()
+
+    def clear_cache(self) -> None:
+        self.cache.clear()
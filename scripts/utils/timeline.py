@@ -0,0 +1,150 @@
+"""
+統一時間軸模組
+在預處理階段將成交與五檔合併為單一、依時間排序的事件流，前端只需依序走訪
+
+輸出格式:
+{
+    'types': [0, 1, ...],          # 0=成交（索引指向 chart 陣列）, 1=五檔（索引指向 depth_history）
+    'indices': [...],              # 對應資料陣列的索引
+    'times_us': [...],             # 當日零時起算的微秒數
+    'minute_index': {'09:00': 0, '09:01': 135, ...}  # 每分鐘第一個事件的位置
+}
+
+同一時間點的順序：成交排在五檔之前。內外盤以「時間早於成交」的最近一筆五檔判斷
+（同一時間的五檔通常已反映該筆成交），所有轉換程式、統一時間軸、SSE 回放與盤中緩衝皆使用此規則
+
+payload 時間格式（format_times）:
+- 'string'（預設）：'YYYY-MM-DD HH:MM:SS.ffffff'
+- 'us'：當日零時起算的微秒整數，日期只在 payload 的 date 欄位出現一次（payload 附 time_format='us'）
+"""
+import heapq
+from itertools import count, repeat
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Sequence
+
+EVENT_TRADE = 0
+EVENT_DEPTH = 1
+
+MICROSECONDS_PER_DAY = 86_400_000_000
+MICROSECONDS_PER_MINUTE = 60_000_000
+
+# payload 時間格式
+TIME_FORMATS = ('string', 'us')
+PAYLOAD_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+# 正規順序：依時間，同一微秒內依行情序號（Seq，原始資料行最後的序號欄位）
+CANONICAL_ORDER = ['Datetime', 'Seq']
+
+
+def sort_canonical(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    依正規順序（Datetime, Seq）穩定排序
+
+    時間已嚴格遞增（沒有同時間的資料列）時只做 O(n) 檢查、不排序；
+    沒有 Seq 欄位（或全為空值）時同一時間維持原本順序
+    """
+    if len(df) == 0 or 'Datetime' not in df.columns:
+        return df
+    datetimes = df['Datetime']
+    if datetimes.is_monotonic_increasing and datetimes.is_unique:
+        return df
+
+    keys = ['Datetime']
+    if 'Seq' in df.columns and df['Seq'].notna().any():
+        keys.append('Seq')
+    return df.sort_values(keys, kind='stable')
+
+
+def time_ordered(df: pd.DataFrame, ascending: bool = True) -> pd.DataFrame:
+    """
+    取得依時間排序的 DataFrame（取代 sort_values('Datetime')）
+
+    解碼檔案已依正規順序寫入，通常只需 O(n) 的遞增檢查；
+    未排序時才以 sort_canonical 排序。降冪直接反轉（同一時間內序號大者在前）
+    """
+    if len(df) > 0 and 'Datetime' in df.columns and not df['Datetime'].is_monotonic_increasing:
+        df = sort_canonical(df)
+    return df if ascending else df.iloc[::-1]
+
+
+def datetime_to_us_of_day(datetimes: pd.Series) -> np.ndarray:
+    """
+    將 Datetime 欄位轉為當日零時起算的微秒數（單次向量化轉型）
+
+    Args:
+        datetimes: Datetime 欄位
+
+    Returns:
+        int64 陣列
+    """
+    values = pd.to_datetime(datetimes).to_numpy().astype('datetime64[us]').astype(np.int64)
+    return values % MICROSECONDS_PER_DAY
+
+
+def format_times(datetimes: pd.Series, time_format: str = 'string') -> List:
+    """
+    將 Datetime 欄位轉為 payload 的時間值（整欄一次轉換，不逐列 strftime）
+
+    Args:
+        datetimes: Datetime 欄位
+        time_format: 'string' 為 'YYYY-MM-DD HH:MM:SS.ffffff'，'us' 為當日零時起算的微秒整數
+
+    Returns:
+        與 datetimes 同順序的列表
+    """
+    datetimes = pd.to_datetime(datetimes)
+    if time_format != 'us':
+        return datetimes.dt.strftime(PAYLOAD_DATETIME_FORMAT).tolist()
+    times = datetime_to_us_of_day(datetimes).tolist()
+    missing = datetimes.isna().to_numpy()
+    if missing.any():
+        times = [None if is_missing else t for t, is_missing in zip(times, missing)]
+    return times
+
+
+def build_event_timeline(trade_times_us: Sequence[int], depth_times_us: Sequence[int]) -> Dict[str, Any]:
+    """
+    以 k-way merge 合併成交與五檔事件
+
+    兩個輸入各自已依時間排序；同一時間點成交排在五檔之前，
+    與內外盤判斷使用「時間早於成交的最近一筆五檔」的規則一致（見模組說明）。
+
+    Args:
+        trade_times_us: 成交時間（微秒，已排序，與 chart 陣列同順序）
+        depth_times_us: 五檔時間（微秒，已排序，與 depth_history 同順序）
+
+    Returns:
+        統一時間軸字典
+    """
+    trade_times = np.asarray(trade_times_us, dtype=np.int64).tolist()
+    depth_times = np.asarray(depth_times_us, dtype=np.int64).tolist()
+
+    # heapq.merge 在同一時間點依串流順序輸出：成交在前
+    streams = [
+        zip(trade_times, repeat(EVENT_TRADE), count()),
+        zip(depth_times, repeat(EVENT_DEPTH), count()),
+    ]
+
+    types = []
+    indices = []
+    times = []
+    minute_index = {}
+    last_minute = None
+
+    for time_us, event_type, index in heapq.merge(*streams, key=lambda event: event[0]):
+        minute = time_us // MICROSECONDS_PER_MINUTE
+        if minute != last_minute:
+            minute_index[f'{minute // 60:02d}:{minute % 60:02d}'] = len(times)
+            last_minute = minute
+
+        types.append(event_type)
+        indices.append(index)
+        times.append(time_us)
+
+    return {
+        'types': types,
+        'indices': indices,
+        'times_us': times,
+        'minute_index': minute_index
+    }
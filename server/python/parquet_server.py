@@ -3,15 +3,38 @@ Parquet 資料伺服器
 直接讀取 decoded_quotes 目錄下的 Parquet 檔案，即時轉換為 JSON
 無需預先轉換，節省儲存空間
 """
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import os
 import sys
 import json
+import io
+import time
+import bisect
+import heapq
+import threading
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
-from urllib.parse import unquote
+import pyarrow.parquet as pq
+from urllib.parse import unquote, urlparse, parse_qs
 from pathlib import Path
 
+# 共用工具位於 scripts/utils
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'scripts'))
+
+from utils.depth_codec import encode_depth_history
+from utils.parquet_io import (TRADE_COLUMNS, DEPTH_COLUMNS, iter_live_batches, live_segments, read_decoded_metadata,
+                              read_quote_rows, row_group_types)
+from utils.hot_tier import ArrowHotTier, hot_tier_max_mb
+from utils.json_io import JSON_BACKEND, encode_json
+from utils.price_ticks import (apply_price_mode, payload_price_scale, price_scale_of, rescale_price_ticks, rounded_div,
+                               tick_value, vwap_ticks)
+from utils.timeline import build_event_timeline, datetime_to_us_of_day, format_times, time_ordered
+from utils.logger import StageTimer
+from utils.server_metrics import (PROMETHEUS_CONTENT_TYPE, CountingWriter, ServerMetrics, format_server_timing,
+                                  is_admin_request, profile_call, server_timing_enabled)
+
 
 def determine_inner_outer(current_price, prev_bid1, prev_ask1):
     """判斷內外盤"""
@@ -23,157 +46,564 @@ def determine_inner_outer(current_price, prev_bid1, prev_ask1):
         return '–'
 
 
-def convert_parquet_to_json(parquet_path):
-    """將 Parquet 檔案轉換為 JSON 格式"""
+def build_depth_entry(row, to_price=float, timestamp=None):
+    """
+    將單筆 Depth 資料轉為 {'timestamp', 'bids', 'asks'}（to_price=int 時價格為整數 tick）
+
+    timestamp 為呼叫端以 format_times 整欄轉換好的時間，未指定時格式化 row['Datetime']
+    """
+    bids = []
+    asks = []
+
+    for i in range(1, 6):
+        bid_price = row.get(f'Bid{i}_Price')
+        bid_volume = row.get(f'Bid{i}_Volume')
+        if pd.notna(bid_price) and pd.notna(bid_volume):
+            bids.append({
+                'price': to_price(bid_price),
+                'volume': int(bid_volume)
+            })
+
+    for i in range(1, 6):
+        ask_price = row.get(f'Ask{i}_Price')
+        ask_volume = row.get(f'Ask{i}_Volume')
+        if pd.notna(ask_price) and pd.notna(ask_volume):
+            asks.append({
+                'price': to_price(ask_price),
+                'volume': int(ask_volume)
+            })
+
+    return {
+        'timestamp': row['Datetime'].strftime('%Y-%m-%d %H:%M:%S.%f') if timestamp is None else timestamp,
+        'bids': bids,
+        'asks': asks
+    }
+
+
+# Arrow IPC 熱層（run_server 依 --hot-tier-mb 建立，None 表示停用）
+HOT_TIER = None
+
+# 回應是否附加 Server-Timing 標頭（run_server 依 --server-timing 設定；各階段耗時屬內部資訊，預設關閉）
+SERVER_TIMING = False
+
+
+def read_stock_rows(parquet_path, data_type, columns, price_ticks=False):
+    """讀取成交或五檔：啟用熱層時由記憶體映射的 Arrow IPC 讀取，否則直接讀取 Parquet"""
+    if HOT_TIER is not None:
+        return HOT_TIER.read_quote_rows(parquet_path, data_type, columns, price_ticks=price_ticks)
+    return read_quote_rows(parquet_path, data_type, columns, price_ticks=price_ticks)
+
+
+def convert_parquet_to_json(parquet_path, depth_encoding='full', timer=None, price_ticks=False,
+                            time_format='string'):
+    """
+    將 Parquet 檔案轉換為 JSON 格式
+
+    depth_encoding='delta' 時 depth_history 改為差分編碼（見 utils/depth_codec.py）；
+    price_ticks=True 時所有價格（含 VWAP、統計）為 payload 倍率的整數 tick，另附 price_scale（見 utils/price_ticks.py）；
+    time_format='us' 時所有時間為當日零時起算的微秒整數，日期只在 date 欄位出現一次（見 utils/timeline.py）；
+    指定 timer（StageTimer）時累計 read / trades / depth_history / chart / stats / timeline 各階段耗時
+    """
+    timer = timer or StageTimer()
+    to_price = int if price_ticks else float
     try:
-        # 讀取 Parquet
-        df = pd.read_parquet(parquet_path)
-
-        if len(df) == 0:
+        # 分別讀取 Trade 與 Depth（只讀需要的 row group 與欄位）
+        with timer.stage('read'):
+            trade_df = read_stock_rows(parquet_path, 'Trade', TRADE_COLUMNS, price_ticks)
+            depth_df = read_stock_rows(parquet_path, 'Depth', DEPTH_COLUMNS, price_ticks)
+            if price_ticks:
+                # 換算為能精確表示所有價格的最粗倍率，payload 數字較短
+                price_scale = payload_price_scale(trade_df, depth_df)
+                trade_df = rescale_price_ticks(trade_df, price_scale)
+                depth_df = rescale_price_ticks(depth_df, price_scale)
+
+        if len(trade_df) == 0 and len(depth_df) == 0:
             return None
 
-        # 分離 Trade 和 Depth
-        trade_df = df[df['Type'] == 'Trade'].copy()
-        depth_df = df[df['Type'] == 'Depth'].copy()
-
-        stock_code = df['StockCode'].iloc[0]
-        date_str = df['Datetime'].iloc[0].strftime('%Y%m%d')
+        # 檔名即股票代碼；日期取最早一筆資料
+        stock_code = Path(parquet_path).stem
+        first_times = [frame['Datetime'].iloc[0] for frame in (trade_df, depth_df) if len(frame) > 0]
+        date_str = min(first_times).strftime('%Y%m%d')
 
         # 處理 trades
         trades = []
-        if len(trade_df) > 0:
-            trade_df = trade_df.sort_values('Datetime', ascending=False).reset_index(drop=True)
-
-            prev_bid1 = None
-            prev_ask1 = None
-
-            for idx, row in trade_df.iterrows():
-                prev_depth = depth_df[depth_df['Datetime'] < row['Datetime']].tail(1)
-
-                if len(prev_depth) > 0:
-                    prev_bid1 = prev_depth.iloc[0].get('Bid1_Price')
-                    prev_ask1 = prev_depth.iloc[0].get('Ask1_Price')
-
-                inner_outer = determine_inner_outer(row['Price'], prev_bid1, prev_ask1)
-
-                trades.append({
-                    'time': row['Datetime'].strftime('%Y-%m-%d %H:%M:%S.%f'),
-                    'price': float(row['Price']),
-                    'volume': int(row['Volume']),
-                    'inner_outer': inner_outer,
-                    'flag': int(row['Flag'])
-                })
+        with timer.stage('trades'):
+            # 依時間遞增排序一次，chart / stats / timeline 共用；成交列表由新到舊
+            trade_asc = time_ordered(trade_df).reset_index(drop=True)
+            if len(trade_asc) > 0:
+                trade_desc = trade_asc.iloc[::-1].reset_index(drop=True)
+                trade_times = format_times(trade_desc['Datetime'], time_format)
+
+                prev_bid1 = None
+                prev_ask1 = None
+
+                for idx, row in trade_desc.iterrows():
+                    # 時間早於成交的最近一筆五檔（同一時間的五檔排在成交之後，見 utils/timeline.py）
+                    prev_depth = depth_df[depth_df['Datetime'] < row['Datetime']].tail(1)
+
+                    if len(prev_depth) > 0:
+                        prev_bid1 = prev_depth.iloc[0].get('Bid1_Price')
+                        prev_ask1 = prev_depth.iloc[0].get('Ask1_Price')
+                        if price_ticks:
+                            prev_bid1, prev_ask1 = tick_value(prev_bid1), tick_value(prev_ask1)
+
+                    inner_outer = determine_inner_outer(row['Price'], prev_bid1, prev_ask1)
+
+                    trades.append({
+                        'time': trade_times[idx],
+                        'price': to_price(row['Price']),
+                        'volume': int(row['Volume']),
+                        'inner_outer': inner_outer,
+                        'flag': int(row['Flag'])
+                    })
 
         # 處理 depth_history
         depth_history = []
-        if len(depth_df) > 0:
-            depth_df = depth_df.sort_values('Datetime').reset_index(drop=True)
-
-            for _, row in depth_df.iterrows():
-                bids = []
-                asks = []
-
-                for i in range(1, 6):
-                    bid_price = row.get(f'Bid{i}_Price')
-                    bid_volume = row.get(f'Bid{i}_Volume')
-                    if pd.notna(bid_price) and pd.notna(bid_volume):
-                        bids.append({
-                            'price': float(bid_price),
-                            'volume': int(bid_volume)
-                        })
-
-                for i in range(1, 6):
-                    ask_price = row.get(f'Ask{i}_Price')
-                    ask_volume = row.get(f'Ask{i}_Volume')
-                    if pd.notna(ask_price) and pd.notna(ask_volume):
-                        asks.append({
-                            'price': float(ask_price),
-                            'volume': int(ask_volume)
-                        })
-
-                depth_history.append({
-                    'timestamp': row['Datetime'].strftime('%Y-%m-%d %H:%M:%S.%f'),
-                    'bids': bids,
-                    'asks': asks
-                })
-
-        # 處理 depth（當前）
-        depth = None
-        if len(depth_history) > 0:
-            latest_depth = depth_history[-1]
-            depth = {
-                'bids': latest_depth['bids'],
-                'asks': latest_depth['asks'],
-                'timestamp': latest_depth['timestamp']
-            }
+        with timer.stage('depth_history'):
+            if len(depth_df) > 0:
+                depth_df = time_ordered(depth_df).reset_index(drop=True)
+                depth_times = format_times(depth_df['Datetime'], time_format)
+
+                if depth_encoding == 'delta':
+                    depth_history = encode_depth_history(depth_df, depth_times, price_ticks=price_ticks)
+                else:
+                    depth_history = [build_depth_entry(row, to_price, timestamp)
+                                     for (_, row), timestamp in zip(depth_df.iterrows(), depth_times)]
+
+            # 處理 depth（當前）
+            depth = None
+            if len(depth_df) > 0:
+                latest_depth = depth_history[-1] if isinstance(depth_history, list) \
+                    else build_depth_entry(depth_df.iloc[-1], to_price, depth_times[-1])
+                depth = {
+                    'bids': latest_depth['bids'],
+                    'asks': latest_depth['asks'],
+                    'timestamp': latest_depth['timestamp']
+                }
 
         # 處理 chart
         chart = None
-        if len(trade_df) > 0:
-            trade_df_asc = trade_df.sort_values('Datetime').reset_index(drop=True)
-
-            timestamps = trade_df_asc['Datetime'].dt.strftime('%Y-%m-%d %H:%M:%S.%f').tolist()
-            prices = trade_df_asc['Price'].astype(float).tolist()
-            volumes = trade_df_asc['Volume'].astype(int).tolist()
-            total_volumes = trade_df_asc['Volume'].cumsum().astype(int).tolist()
-
-            trade_df_asc['cumulative_amount'] = (trade_df_asc['Price'] * trade_df_asc['Volume']).cumsum()
-            trade_df_asc['cumulative_volume'] = trade_df_asc['Volume'].cumsum()
-            vwap = (trade_df_asc['cumulative_amount'] / trade_df_asc['cumulative_volume']).astype(float).tolist()
-
-            chart = {
-                'timestamps': timestamps,
-                'prices': prices,
-                'volumes': volumes,
-                'total_volumes': total_volumes,
-                'vwap': vwap
-            }
+        with timer.stage('chart'):
+            if len(trade_asc) > 0:
+                # 數值欄位保留 NumPy 陣列，由 utils.json_io 直接序列化
+                timestamps = format_times(trade_asc['Datetime'], time_format)
+                volumes = trade_asc['Volume'].astype(int).to_numpy()
+                total_volumes = trade_asc['Volume'].cumsum().astype(int).to_numpy()
+
+                if price_ticks:
+                    # 以整數累計成交金額，VWAP 四捨五入到整數 tick
+                    prices = trade_asc['Price'].to_numpy(dtype=np.int64)
+                    vwap = vwap_ticks(prices, trade_asc['Volume'].to_numpy())
+                else:
+                    prices = trade_asc['Price'].astype(float).to_numpy()
+                    cumulative_amount = (trade_asc['Price'] * trade_asc['Volume']).cumsum()
+                    vwap = (cumulative_amount / trade_asc['Volume'].cumsum()).astype(float).to_numpy()
+
+                chart = {
+                    'timestamps': timestamps,
+                    'prices': prices,
+                    'volumes': volumes,
+                    'total_volumes': total_volumes,
+                    'vwap': vwap
+                }
 
         # 處理 stats
         stats = None
-        if len(trade_df) > 0:
-            trade_df_asc = trade_df.sort_values('Datetime').reset_index(drop=True)
-
-            open_price = float(trade_df_asc.iloc[0]['Price'])
-            current_price = float(trade_df_asc.iloc[-1]['Price'])
-            high_price = float(trade_df_asc['Price'].max())
-            low_price = float(trade_df_asc['Price'].min())
-
-            total_amount = (trade_df_asc['Price'] * trade_df_asc['Volume']).sum()
-            total_volume = trade_df_asc['Volume'].sum()
-            avg_price = float(total_amount / total_volume) if total_volume > 0 else 0.0
-
-            trade_count = len(trade_df_asc)
-            change = current_price - open_price
-            change_pct = (change / open_price * 100) if open_price > 0 else 0.0
-
-            stats = {
-                'current_price': current_price,
-                'open_price': open_price,
-                'high_price': high_price,
-                'low_price': low_price,
-                'avg_price': avg_price,
-                'total_volume': int(total_volume),
-                'trade_count': trade_count,
-                'change': change,
-                'change_pct': change_pct
-            }
-
-        return {
+        with timer.stage('stats'):
+            if len(trade_asc) > 0:
+                open_price = to_price(trade_asc.iloc[0]['Price'])
+                current_price = to_price(trade_asc.iloc[-1]['Price'])
+                high_price = to_price(trade_asc['Price'].max())
+                low_price = to_price(trade_asc['Price'].min())
+
+                total_volume = trade_asc['Volume'].sum()
+                if price_ticks:
+                    total_amount = int((trade_asc['Price'].astype('int64') * trade_asc['Volume']).sum())
+                    avg_price = rounded_div(total_amount, int(total_volume))
+                else:
+                    total_amount = (trade_asc['Price'] * trade_asc['Volume']).sum()
+                    avg_price = float(total_amount / total_volume) if total_volume > 0 else 0.0
+
+                trade_count = len(trade_asc)
+                change = current_price - open_price
+                change_pct = (change / open_price * 100) if open_price > 0 else 0.0
+
+                stats = {
+                    'current_price': current_price,
+                    'open_price': open_price,
+                    'high_price': high_price,
+                    'low_price': low_price,
+                    'avg_price': avg_price,
+                    'total_volume': int(total_volume),
+                    'trade_count': trade_count,
+                    'change': change,
+                    'change_pct': change_pct
+                }
+
+        # 處理 timeline（統一時間軸，索引對應 chart 與 depth_history）
+        with timer.stage('timeline'):
+            timeline = build_event_timeline(
+                datetime_to_us_of_day(trade_asc['Datetime']),
+                datetime_to_us_of_day(depth_df['Datetime'])
+            )
+
+        result = {
             'chart': chart,
             'depth': depth,
             'depth_history': depth_history,
             'trades': trades,
             'stats': stats,
+            'timeline': timeline,
             'stock_code': stock_code,
             'date': date_str
         }
+        if price_ticks:
+            result['price_scale'] = price_scale
+        if time_format == 'us':
+            result['time_format'] = 'us'
+        return result
 
     except Exception as e:
         print(f"Error converting parquet: {e}")
         return None
 
 
+def _event_from_record(record):
+    """將單筆資料轉為回放事件 (事件名稱, JSON 字串)"""
+    if record['Type'] == 'Trade':
+        payload = {
+            'time': record['Datetime'].strftime('%Y-%m-%d %H:%M:%S.%f'),
+            'price': float(record['Price']),
+            'volume': int(record['Volume']),
+            'flag': int(record['Flag'])
+        }
+        return 'trade', json.dumps(payload, ensure_ascii=False)
+    return 'depth', json.dumps(build_depth_entry(record), ensure_ascii=False)
+
+
+def load_row_group_events(parquet_path, row_group, columns=None):
+    """
+    讀取單一 row group 並轉為依時間排序的回放事件
+
+    Returns:
+        [(time_us, event_name, data_json), ...]
+    """
+    table = pq.ParquetFile(parquet_path).read_row_group(row_group, columns=columns)
+    df = apply_price_mode(table.to_pandas(), price_scale_of(table.schema.metadata))
+    if df.empty:
+        return []
+
+    df = time_ordered(df).reset_index(drop=True)
+    times_us = datetime_to_us_of_day(df['Datetime']).tolist()
+
+    events = []
+    for time_us, record in zip(times_us, df.to_dict('records')):
+        event_name, data = _event_from_record(record)
+        events.append((time_us, event_name, data))
+    return events
+
+
+class RowGroupEventCache:
+    """
+    已解碼 row group 的共用 LRU 快取
+
+    所有回放連線共用同一份快取，同一檔案的同一 row group 只解碼一次；
+    以 (路徑, mtime, row group) 為鍵，檔案更新後自動失效
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, parquet_path, row_group, columns=None):
+        """取得 row group 事件（未命中時讀取並快取）"""
+        key = (parquet_path, os.stat(parquet_path).st_mtime_ns, row_group,
+               tuple(columns) if columns else None)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        events = load_row_group_events(parquet_path, row_group, columns)
+
+        with self._lock:
+            self._entries[key] = events
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        return events
+
+
+REPLAY_CACHE = RowGroupEventCache()
+
+
+def _row_group_max_us(metadata, row_group):
+    """由 row group 統計資訊取得 Datetime 最大值（當日微秒），無統計時返回 None"""
+    try:
+        column_index = metadata.schema.names.index('Datetime')
+        statistics = metadata.row_group(row_group).column(column_index).statistics
+        if statistics is None or not statistics.has_min_max:
+            return None
+        max_time = pd.Timestamp(statistics.max)
+        return ((max_time.hour * 60 + max_time.minute) * 60 + max_time.second) * 1_000_000 \
+            + max_time.microsecond
+    except (ValueError, TypeError):
+        return None
+
+
+def _iter_row_group_stream(parquet_path, metadata, row_groups, start_us, columns, cache):
+    """依序產生一串 row group（同一 Type 內已依時間排序）的回放事件"""
+    for row_group in row_groups:
+        max_us = _row_group_max_us(metadata, row_group)
+        if max_us is not None and max_us < start_us:
+            continue
+
+        for event in cache.get(parquet_path, row_group, columns):
+            if event[0] >= start_us:
+                yield event
+
+
+def iter_replay_events(parquet_path, start_us=0, cache=REPLAY_CACHE):
+    """
+    依時間順序產生回放事件
+
+    解碼檔案的 row group 依 Type 分段（見 utils/parquet_io.py），成交與五檔各自是
+    依時間排序的 row group 串流，以 heapq.merge 合併；同一時間點成交排在五檔之前，
+    與統一時間軸、盤中緩衝及內外盤判斷一致（見 utils/timeline.py）。舊檔案（混合 row group）整個檔案即為一個串流。
+    盤中分段檔（見 parquet_io.live_segments）的每個 row group 各自是一個串流（合併後的分段檔
+    依批次相接，row group 之間不保證時間順序）。
+    整個 row group 都早於起始時間時，直接依統計資訊跳過不讀取
+    """
+    metadata = pq.ParquetFile(parquet_path).metadata
+    row_groups_by_type = {}
+    for row_group, data_type in enumerate(row_group_types(metadata)):
+        row_groups_by_type.setdefault(data_type, []).append(row_group)
+
+    # [(Type, 路徑, metadata, row groups), ...]
+    streams = [(data_type, parquet_path, metadata, row_groups)
+               for data_type, row_groups in row_groups_by_type.items()]
+    for _, _, segment_path in live_segments(parquet_path):
+        segment_metadata = pq.ParquetFile(segment_path).metadata
+        for row_group, data_type in enumerate(row_group_types(segment_metadata)):
+            streams.append((data_type, str(segment_path), segment_metadata, [row_group]))
+
+    stream_columns = {'Trade': TRADE_COLUMNS, 'Depth': DEPTH_COLUMNS}
+    streams.sort(key=lambda stream: {'Trade': 0, 'Depth': 1}.get(stream[0], 2))
+    iterators = [
+        _iter_row_group_stream(path, stream_metadata, row_groups, start_us, stream_columns.get(data_type), cache)
+        for data_type, path, stream_metadata, row_groups in streams
+    ]
+    if len(iterators) == 1:
+        return iterators[0]
+    return heapq.merge(*iterators, key=lambda event: event[0])
+
+
+def parse_replay_start(value):
+    """
+    解析回放起始時間
+
+    支援 'HH:MM:SS'、'HH:MM:SS.ffffff'、'HHMMSS' 或當日微秒整數，空值為 0
+    """
+    if not value:
+        return 0
+    if ':' in value:
+        hms, _, fraction = value.partition('.')
+        hour, minute, second = (int(part) for part in hms.split(':'))
+        microsecond = int(fraction.ljust(6, '0')[:6]) if fraction else 0
+        return ((hour * 60 + minute) * 60 + second) * 1_000_000 + microsecond
+    if len(value) == 6:
+        return ((int(value[:2]) * 60 + int(value[2:4])) * 60 + int(value[4:])) * 1_000_000
+    return int(value)
+
+
+# 盤中緩衝讀取分段檔的欄位投影（成交與五檔欄位）
+TAIL_COLUMNS = TRADE_COLUMNS + [column for column in DEPTH_COLUMNS if column not in TRADE_COLUMNS]
+
+
+class StockTailBuffer:
+    """
+    單一股票的盤中資料緩衝（只附加）
+
+    盤中追蹤模式的新資料寫在分段檔（見 utils/parquet_io.write_live_segment），緩衝記錄已讀到的批次，
+    每次輪詢只讀取之後的批次並依到達順序附加為帶序號的事件；主檔只在建立緩衝或被重寫時讀取一次，
+    合併回主檔的若只是已讀過的批次則不重讀。輪詢請求只回傳序號之後的事件，成本取決於新資料量
+    """
+
+    def __init__(self, parquet_path):
+        self.parquet_path = parquet_path
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        """清空緩衝"""
+        self.base_identity = None
+        self.batch = None     # 已讀到的盤中批次（None：主檔不是盤中追蹤模式寫出的，沒有分段檔）
+        self.events = []      # [(time_us, 'trade' 或 'depth', payload), ...]，索引即序號
+        self.times_us = []
+        self.time_sorted = True  # 較晚到達的批次含有更早的資料時為 False
+        self.prev_bid1 = None
+        self.prev_ask1 = None
+        self.stats = None
+        self._totals = {'amount': 0.0, 'volume': 0}
+
+    def refresh(self):
+        """讀取尚未讀過的資料並附加到緩衝"""
+        stat = os.stat(self.parquet_path)
+        base_identity = (stat.st_ino, stat.st_mtime_ns)
+        if base_identity != self.base_identity:
+            metadata = read_decoded_metadata(self.parquet_path)
+            base_batch = metadata.get('live_batch', 0) if 'live_offsets' in metadata else None
+            if self.base_identity is None or base_batch is None or base_batch != self.batch:
+                # 新建立的緩衝、主檔被重寫，或合併進主檔的批次尚未讀過：整個重新讀取主檔
+                self._reset()
+                self._append_frame(pd.concat(
+                    [read_quote_rows(self.parquet_path, data_type, columns, include_live=False)
+                     for data_type, columns in (('Trade', TRADE_COLUMNS), ('Depth', DEPTH_COLUMNS))],
+                    ignore_index=True))
+                self.batch = base_batch
+            self.base_identity = base_identity
+
+        if self.batch is None:
+            return
+        try:
+            for batch, batch_df in iter_live_batches(self.parquet_path, self.batch, TAIL_COLUMNS):
+                self._append_frame(batch_df)
+                self.batch = batch
+        except FileNotFoundError:
+            pass  # 分段檔在讀取期間被合併，下次輪詢再讀
+
+    def _append_frame(self, df):
+        """
+        依時間順序附加一批資料（df 中成交在前）
+
+        同一時間點成交排在五檔之前，與 convert_parquet_to_json 的內外盤判斷一致
+        """
+        df = df.sort_values('Datetime', kind='stable')
+        times_us = datetime_to_us_of_day(df['Datetime']).tolist()
+        if times_us and self.times_us and times_us[0] < self.times_us[-1]:
+            self.time_sorted = False
+        for time_us, record in zip(times_us, df.to_dict('records')):
+            self._append(time_us, record)
+
+    def _append(self, time_us, record):
+        """附加單筆事件並更新統計"""
+        if record['Type'] == 'Depth':
+            self.prev_bid1 = record.get('Bid1_Price')
+            self.prev_ask1 = record.get('Ask1_Price')
+            self.events.append((time_us, 'depth', build_depth_entry(record)))
+            self.times_us.append(time_us)
+            return
+
+        price = float(record['Price'])
+        volume = int(record['Volume'])
+        self.events.append((time_us, 'trade', {
+            'time': record['Datetime'].strftime('%Y-%m-%d %H:%M:%S.%f'),
+            'price': price,
+            'volume': volume,
+            'inner_outer': determine_inner_outer(price, self.prev_bid1, self.prev_ask1),
+            'flag': int(record['Flag'])
+        }))
+        self.times_us.append(time_us)
+
+        self._totals['amount'] += price * volume
+        self._totals['volume'] += volume
+        if self.stats is None:
+            self.stats = {'open_price': price, 'high_price': price, 'low_price': price, 'trade_count': 0}
+        stats = self.stats
+        stats['current_price'] = price
+        stats['high_price'] = max(stats['high_price'], price)
+        stats['low_price'] = min(stats['low_price'], price)
+        stats['trade_count'] += 1
+        stats['total_volume'] = self._totals['volume']
+        stats['avg_price'] = self._totals['amount'] / self._totals['volume'] if self._totals['volume'] > 0 else 0.0
+        stats['change'] = price - stats['open_price']
+        stats['change_pct'] = (stats['change'] / stats['open_price'] * 100) if stats['open_price'] > 0 else 0.0
+
+    def since(self, seq=None, since_us=None):
+        """
+        取得序號（或時間）之後的新事件
+
+        Returns:
+            {'seq': 下次輪詢用的序號, 'trades': [...], 'depth': [...], 'stats': {...}}
+        """
+        with self.lock:
+            self.refresh()
+
+            if seq is not None or since_us is None:
+                new_events = self.events[max(seq or 0, 0):]
+            elif self.time_sorted:
+                new_events = self.events[bisect.bisect_right(self.times_us, since_us):]
+            else:
+                # 有較晚到達的早期資料時 times_us 不是遞增，逐筆比較
+                new_events = [event for event in self.events if event[0] > since_us]
+
+            return {
+                'seq': len(self.events),
+                'trades': [payload for _, kind, payload in new_events if kind == 'trade'],
+                'depth': [payload for _, kind, payload in new_events if kind == 'depth'],
+                'stats': dict(self.stats) if self.stats else None
+            }
+
+
+class TailBufferRegistry:
+    """盤中緩衝登錄表：每支活躍股票一個緩衝，超過上限時淘汰最久未使用者"""
+
+    def __init__(self, max_buffers=32):
+        self.max_buffers = max_buffers
+        self._buffers = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._buffers)
+
+    def get(self, parquet_path):
+        """取得（或建立）股票的緩衝"""
+        with self._lock:
+            buffer = self._buffers.get(parquet_path)
+            if buffer is None:
+                buffer = StockTailBuffer(parquet_path)
+                self._buffers[parquet_path] = buffer
+                self.misses += 1
+            else:
+                self.hits += 1
+            self._buffers.move_to_end(parquet_path)
+            while len(self._buffers) > self.max_buffers:
+                self._buffers.popitem(last=False)
+                self.evictions += 1
+            return buffer
+
+
+TAIL_BUFFERS = TailBufferRegistry()
+
+# 請求數、各路由/階段延遲、回應大小、快取與記憶體指標（/metrics）
+METRICS = ServerMetrics()
+METRICS.register_cache('replay_row_groups', REPLAY_CACHE)
+METRICS.register_cache('tail_buffers', TAIL_BUFFERS)
+
+
+def route_label(path):
+    """請求路徑轉為路由名稱（直方圖分組用，避免以日期/股票代碼分組）"""
+    parts = path.split('/')
+    if len(parts) >= 3 and parts[1] == 'api':
+        return f'/api/{parts[2]}'
+    return 'static'
+
+
 class ParquetHTTPRequestHandler(BaseHTTPRequestHandler):
     """處理 HTTP 請求的處理器"""
 
@@ -182,24 +612,142 @@ class ParquetHTTPRequestHandler(BaseHTTPRequestHandler):
         script_dir = os.path.dirname(os.path.abspath(__file__))
         self.project_root = os.path.dirname(os.path.dirname(script_dir))
         self.decoded_dir = os.path.join(self.project_root, 'data', 'decoded_quotes')
+        self.cache_control = 'public, max-age=3600'
+        self.timer = StageTimer()
+        self.request_start = time.perf_counter()
+        self.status_code = None
         super().__init__(*args, **kwargs)
 
+    def send_response(self, code, message=None):
+        """記錄狀態碼（請求計數指標用）"""
+        self.status_code = code
+        super().send_response(code, message)
+
     def end_headers(self):
-        """添加 CORS 標頭"""
+        """添加 CORS 標頭（啟用 --server-timing 時另加 Server-Timing）"""
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.send_header('Cache-Control', 'public, max-age=3600')
+        self.send_header('Cache-Control', self.cache_control)
+        if SERVER_TIMING:
+            self.send_header('Access-Control-Expose-Headers', 'Server-Timing')
+            self.send_header('Server-Timing', format_server_timing(
+                self.timer.stages, time.perf_counter() - self.request_start))
         super().end_headers()
 
+    def stream_replay(self, parquet_path, speed, start_us):
+        """
+        以 Server-Sent Events 依時間順序推送成交與五檔事件
+
+        speed 為播放倍速（<= 0 表示不控速，直接全部推送）
+        """
+        self.send_response(200)
+        self.send_header('Content-type', 'text/event-stream; charset=utf-8')
+        self.cache_control = 'no-cache'
+        self.end_headers()
+
+        wall_start = time.monotonic()
+        first_us = None
+        pending = []
+
+        try:
+            for time_us, event_name, data in iter_replay_events(parquet_path, start_us):
+                if speed > 0:
+                    if first_us is None:
+                        first_us = time_us
+                    delay = (time_us - first_us) / 1_000_000 / speed - (time.monotonic() - wall_start)
+                    if delay > 0:
+                        # 先送出已到期的事件，再等待下一個事件
+                        if pending:
+                            self.wfile.write(''.join(pending).encode('utf-8'))
+                            pending = []
+                        time.sleep(delay)
+
+                pending.append(f'event: {event_name}\nid: {time_us}\ndata: {data}\n\n')
+                if len(pending) >= 256:
+                    self.wfile.write(''.join(pending).encode('utf-8'))
+                    pending = []
+
+            pending.append('event: end\ndata: {}\n\n')
+            self.wfile.write(''.join(pending).encode('utf-8'))
+        except (BrokenPipeError, ConnectionResetError):
+            # 客戶端中斷回放
+            pass
+
     def do_OPTIONS(self):
         """處理 CORS 預檢請求"""
         self.send_response(200)
         self.end_headers()
 
     def do_GET(self):
-        """處理 GET 請求"""
-        path = unquote(self.path)
+        """
+        處理 GET 請求
+
+        請求數、各階段延遲與回應大小累計到 METRICS（啟用 --server-timing 時另寫入 Server-Timing 標頭）；
+        管理者加上 ?profile=1 時改為返回該請求的 cProfile 報告
+        """
+        parsed_url = urlparse(self.path)
+        path = unquote(parsed_url.path)
+        query = parse_qs(parsed_url.query)
+        self.timer = StageTimer()
+        self.request_start = time.perf_counter()
+        self.status_code = None
+        if not isinstance(self.wfile, CountingWriter):
+            self.wfile = CountingWriter(self.wfile)
+        self.wfile.bytes_written = 0
+
+        if query.get('profile', [''])[0] == '1':
+            self.send_profile(path, query)
+            return
+
+        if path == '/metrics':
+            self.send_metrics()
+            return
+
+        METRICS.start_request()
+        try:
+            self.route_request(path, query)
+        finally:
+            METRICS.finish_request(route_label(path), self.status_code or 500, self.timer.stages,
+                                   time.perf_counter() - self.request_start, self.wfile.bytes_written)
+
+    def send_metrics(self):
+        """以 Prometheus 文字格式返回伺服器指標"""
+        body = METRICS.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-type', PROMETHEUS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.cache_control = 'no-cache'
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_profile(self, path, query):
+        """以 cProfile 執行請求，丟棄原本的回應，改為返回 pstats 文字報告"""
+        if not is_admin_request(self.headers, self.client_address[0]):
+            self.send_error(403, json.dumps({'error': '需要管理者權限'}))
+            return
+
+        real_wfile = self.wfile
+        self.wfile = io.BytesIO()
+        try:
+            report = profile_call(self.route_request, path, query)
+        finally:
+            self.wfile = real_wfile
+
+        if report is None:
+            self.send_error(429, json.dumps({'error': '已有其他請求正在剖析'}))
+            return
+
+        body = report.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.cache_control = 'no-store'
+        self.end_headers()
+        self.wfile.write(body)
+
+    def route_request(self, path, query):
+        """依路徑分派請求"""
 
         # 根路徑重定向
         if path == '/':
@@ -252,14 +800,22 @@ class ParquetHTTPRequestHandler(BaseHTTPRequestHandler):
                 parquet_path = os.path.join(self.decoded_dir, date, f'{stock_code}.parquet')
 
                 if os.path.exists(parquet_path):
-                    # 即時轉換 Parquet 為 JSON
-                    data = convert_parquet_to_json(parquet_path)
+                    # 即時轉換 Parquet 為 JSON（?prices=ticks 時價格為整數 tick + price_scale，
+                    # ?times=us 時時間為當日微秒整數）
+                    depth_encoding = query.get('depth', ['full'])[0]
+                    price_ticks = query.get('prices', [''])[0] == 'ticks'
+                    time_format = 'us' if query.get('times', [''])[0] == 'us' else 'string'
+                    data = convert_parquet_to_json(parquet_path, depth_encoding=depth_encoding, timer=self.timer,
+                                                   price_ticks=price_ticks, time_format=time_format)
 
                     if data:
+                        with self.timer.stage('serialize'):
+                            body = encode_json(data)
                         self.send_response(200)
                         self.send_header('Content-type', 'application/json')
                         self.end_headers()
-                        self.wfile.write(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+                        with self.timer.stage('write'):
+                            self.wfile.write(body)
                         return
                     else:
                         self.send_error(500, json.dumps({'error': '資料轉換失敗'}))
@@ -268,6 +824,61 @@ class ParquetHTTPRequestHandler(BaseHTTPRequestHandler):
                     self.send_error(404, json.dumps({'error': '找不到資料'}))
                     return
 
+        # API: /api/since/{date}/{stock_code}?seq=N 或 ?since=09:30:00
+        elif path.startswith('/api/since/'):
+            parts = path.split('/')
+            if len(parts) >= 5:
+                date = parts[3]
+                stock_code = parts[4]
+                parquet_path = os.path.join(self.decoded_dir, date, f'{stock_code}.parquet')
+
+                if not os.path.exists(parquet_path):
+                    self.send_error(404, json.dumps({'error': '找不到資料'}))
+                    return
+
+                try:
+                    seq = int(query['seq'][0]) if 'seq' in query else None
+                    since_us = parse_replay_start(query['since'][0]) if 'since' in query else None
+                except ValueError:
+                    self.send_error(400, json.dumps({'error': '參數錯誤'}))
+                    return
+
+                with self.timer.stage('refresh'):
+                    data = TAIL_BUFFERS.get(parquet_path).since(seq=seq, since_us=since_us)
+                data['stock_code'] = stock_code
+                data['date'] = date
+
+                with self.timer.stage('serialize'):
+                    body = encode_json(data)
+                self.send_response(200)
+                self.send_header('Content-type', 'application/json')
+                self.cache_control = 'no-cache'
+                self.end_headers()
+                self.wfile.write(body)
+                return
+
+        # API: /api/replay/{date}/{stock_code}?speed=1&start=09:30:00
+        elif path.startswith('/api/replay/'):
+            parts = path.split('/')
+            if len(parts) >= 5:
+                date = parts[3]
+                stock_code = parts[4]
+                parquet_path = os.path.join(self.decoded_dir, date, f'{stock_code}.parquet')
+
+                if not os.path.exists(parquet_path):
+                    self.send_error(404, json.dumps({'error': '找不到資料'}))
+                    return
+
+                try:
+                    speed = float(query.get('speed', ['1'])[0])
+                    start_us = parse_replay_start(query.get('start', [''])[0])
+                except ValueError:
+                    self.send_error(400, json.dumps({'error': '參數錯誤'}))
+                    return
+
+                self.stream_replay(parquet_path, speed, start_us)
+                return
+
         # 靜態檔案服務
         # 嘗試從 frontend-app/dist 或 frontend 提供檔案
         for base_dir in ['frontend-app/dist', 'frontend']:
@@ -305,10 +916,24 @@ class ParquetHTTPRequestHandler(BaseHTTPRequestHandler):
                          format % args))
 
 
-def run_server(port=5000):
-    """啟動伺服器"""
+def run_server(port=5000, hot_tier_mb=0, hot_tier_warm=1, server_timing=False):
+    """
+    啟動伺服器
+
+    hot_tier_mb > 0 時啟用 Arrow IPC 熱層（大小上限 MB），並在背景預先建立最新 hot_tier_warm 個日期；
+    server_timing 時每個回應附加 Server-Timing 標頭
+    """
+    global HOT_TIER, SERVER_TIMING
+    SERVER_TIMING = server_timing
+    if hot_tier_mb > 0:
+        HOT_TIER = ArrowHotTier(max_bytes=int(hot_tier_mb * 1024 * 1024))
+        METRICS.register_cache('arrow_hot_tier', HOT_TIER)
+        decoded_dir = os.path.join(PROJECT_ROOT, 'data', 'decoded_quotes')
+        threading.Thread(target=HOT_TIER.warm, args=(decoded_dir, hot_tier_warm),
+                         name='hot-tier-warm', daemon=True).start()
+
     server_address = ('', port)
-    httpd = HTTPServer(server_address, ParquetHTTPRequestHandler)
+    httpd = ThreadingHTTPServer(server_address, ParquetHTTPRequestHandler)
 
     print("=" * 80)
     print("Parquet 資料伺服器（即時轉換版本）")
@@ -317,7 +942,15 @@ def run_server(port=5000):
     print(f"API 端點:")
     print(f"  - http://localhost:{port}/api/dates")
     print(f"  - http://localhost:{port}/api/stocks/{{date}}")
-    print(f"  - http://localhost:{port}/api/data/{{date}}/{{stock_code}}")
+    print(f"  - http://localhost:{port}/api/data/{{date}}/{{stock_code}}?depth=delta  (五檔差分編碼)")
+    print(f"  - http://localhost:{port}/api/data/{{date}}/{{stock_code}}?prices=ticks  (整數 tick 價格)")
+    print(f"  - http://localhost:{port}/api/data/{{date}}/{{stock_code}}?times=us  (當日微秒整數時間)")
+    print(f"  - http://localhost:{port}/api/since/{{date}}/{{stock_code}}?seq=N  (盤中增量輪詢)")
+    print(f"  - http://localhost:{port}/api/replay/{{date}}/{{stock_code}}?speed=1&start=09:00:00  (SSE 回放)")
+    print(f"  - http://localhost:{port}/metrics  (Prometheus 指標)")
+    if HOT_TIER is not None:
+        print(f"Arrow IPC 熱層: {HOT_TIER.root}（上限 {hot_tier_mb:.0f} MB，預熱最新 {hot_tier_warm} 個日期）")
+    print(f"JSON 序列化: {JSON_BACKEND}")
     print(f"前端頁面:")
     print(f"  - http://localhost:{port}/")
     print("=" * 80)
@@ -337,6 +970,13 @@ if __name__ == '__main__':
 
     parser = argparse.ArgumentParser(description='Parquet 資料伺服器')
     parser.add_argument('--port', type=int, default=5000, help='伺服器埠號 (預設: 5000)')
+    parser.add_argument('--hot-tier-mb', type=float, default=hot_tier_max_mb(),
+                        help='Arrow IPC 熱層大小上限 MB，0 表示停用（預設: 環境變數 QUOTE_HOT_TIER_MB 或 0）')
+    parser.add_argument('--hot-tier-warm', type=int, default=1,
+                        help='啟動時預先建立熱層的最新日期數 (預設: 1)')
+    parser.add_argument('--server-timing', action='store_true', default=server_timing_enabled(),
+                        help='回應附加 Server-Timing 標頭（各階段耗時，預設: 環境變數 QUOTE_SERVER_TIMING 或關閉）')
 
     args = parser.parse_args()
-    run_server(args.port)
+    run_server(args.port, hot_tier_mb=args.hot_tier_mb, hot_tier_warm=args.hot_tier_warm,
+               server_timing=args.server_timing)
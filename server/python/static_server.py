@@ -7,8 +7,26 @@ from http.server import HTTPServer, SimpleHTTPRequestHandler
 import os
 import sys
 import json
+import time
 from urllib.parse import unquote
 
+# 共用工具位於 scripts/utils
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'scripts'))
+
+from utils.server_metrics import PROMETHEUS_CONTENT_TYPE, CountingWriter, ServerMetrics
+
+# 請求數、各路由延遲、回應大小與記憶體指標（/metrics）
+METRICS = ServerMetrics()
+
+
+def route_label(path):
+    """請求路徑轉為路由名稱（指標分組用，避免以日期/股票代碼分組）"""
+    parts = path.split('/')
+    if len(parts) >= 3 and parts[1] == 'api':
+        return f'/api/{parts[2]}'
+    return 'static'
+
 class CORSHTTPRequestHandler(SimpleHTTPRequestHandler):
     """支援 CORS 的 HTTP 請求處理器"""
 
@@ -16,8 +34,14 @@ class CORSHTTPRequestHandler(SimpleHTTPRequestHandler):
         # 設定工作目錄為專案根目錄（server/python 的上兩層）
         script_dir = os.path.dirname(os.path.abspath(__file__))
         project_root = os.path.dirname(os.path.dirname(script_dir))
+        self.status_code = None
         super().__init__(*args, directory=project_root, **kwargs)
 
+    def send_response(self, code, message=None):
+        """記錄狀態碼（請求計數指標用）"""
+        self.status_code = code
+        super().send_response(code, message)
+
     def end_headers(self):
         """添加 CORS 標頭"""
         self.send_header('Access-Control-Allow-Origin', '*')
@@ -33,10 +57,32 @@ class CORSHTTPRequestHandler(SimpleHTTPRequestHandler):
         self.end_headers()
 
     def do_GET(self):
-        """處理 GET 請求"""
-        # 解析路徑
+        """處理 GET 請求，並累計請求數、延遲與回應大小到 METRICS"""
         path = unquote(self.path)
-
+        if path == '/metrics':
+            body = METRICS.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-type', PROMETHEUS_CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        start = time.perf_counter()
+        self.status_code = None
+        if not isinstance(self.wfile, CountingWriter):
+            self.wfile = CountingWriter(self.wfile)
+        self.wfile.bytes_written = 0
+
+        METRICS.start_request()
+        try:
+            self.route_request(path)
+        finally:
+            METRICS.finish_request(route_label(path), self.status_code or 500, {},
+                                   time.perf_counter() - start, self.wfile.bytes_written)
+
+    def route_request(self, path):
+        """依路徑分派請求"""
         # 根路徑重定向到 index.html
         if path == '/':
             path = '/index.html'
@@ -141,6 +187,7 @@ def run_server(port=5000):
     print(f"  - http://localhost:{port}/api/dates")
     print(f"  - http://localhost:{port}/api/stocks/{{date}}")
     print(f"  - http://localhost:{port}/api/data/{{date}}/{{stock_code}}")
+    print(f"  - http://localhost:{port}/metrics  (Prometheus 指標)")
     print(f"前端頁面:")
     print(f"  - http://localhost:{port}/")
     print(f"  - http://localhost:{port}/index.html")
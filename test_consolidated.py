@@ -0,0 +1,121 @@
+"""
+測試每日合併檔（batch_decode --consolidate，utils/parquet_io.py）
+write_consolidated_frames 寫入多支股票後，footer 的股票索引必須指到各股票的 row group，
+read_consolidated_stock 讀出的每支股票與單獨寫入的股票檔案相同
+
+執行方式:
+    python test_consolidated.py
+    python -m pytest test_consolidated.py
+"""
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+
+from utils import parquet_io
+from utils.data_loader import parse_quote_line
+from utils.parquet_io import (TRADE_COLUMNS, DEPTH_COLUMNS, consolidated_path, find_consolidated_stock,
+                              read_consolidated_stock, read_decoded_frame, read_quote_rows, read_stock_index,
+                              row_group_types, write_consolidated_frames, write_decoded_frame)
+
+DATE = '20251031'
+# 股票代碼與筆數（寫入順序刻意不依代碼排序）
+STOCK_ROWS = {'3105': 130, '1101': 75, '2330': 240, '1102': 9}
+
+
+def make_stock_frame(stock, count, seed):
+    """產生一支股票的解析記錄（成交與五檔交錯，時間遞增，含相同時間點）"""
+    rng = random.Random(seed)
+    records = []
+    for seq in range(1, count + 1):
+        timestamp = 90000000000 + (seq // 3) * 10000
+        price = 500000 + rng.randrange(-10, 10) * 500
+        if seq % 2:
+            line = f'Trade,{stock},{timestamp},1,{price},{rng.randrange(1, 99)},0,{seq}'
+        else:
+            bids = ','.join(f'{price - 500 * level}*{rng.randrange(1, 300)}' for level in range(1, 6))
+            asks = ','.join(f'{price + 500 * level}*{rng.randrange(1, 300)}' for level in range(1, 6))
+            line = f'Depth,{stock},{timestamp},BID:5,{bids},ASK:5,{asks},{seq}'
+        records.append(parse_quote_line(line, {stock}, DATE)[2])
+    frame = pd.DataFrame(records)
+    return frame.sample(frac=1, random_state=seed).reset_index(drop=True)  # 寫入端負責排序
+
+
+def write_both(tmp, price_ticks=False):
+    """同一批資料分別寫成每日合併檔與各股票檔案"""
+    frames = {stock: make_stock_frame(stock, count, seed)
+              for seed, (stock, count) in enumerate(STOCK_ROWS.items())}
+    consolidated_dir = Path(tmp) / 'daily'
+    consolidated_dir.mkdir()
+    stock_dir = Path(tmp) / 'stocks'
+    stock_dir.mkdir()
+
+    output_path = consolidated_path(consolidated_dir, DATE)
+    index = write_consolidated_frames(frames, output_path, price_ticks=price_ticks)
+    for stock, frame in frames.items():
+        write_decoded_frame(frame, stock_dir / f'{stock}.parquet', price_ticks=price_ticks)
+    return index, output_path, consolidated_dir, stock_dir
+
+
+def test_stock_index_round_trip():
+    """股票索引依代碼排序、row group 範圍連續不重疊，每個 row group 只含單一股票與單一 Type"""
+    # 縮小 row group，讓每支股票跨多個 row group
+    with tempfile.TemporaryDirectory() as tmp, \
+            mock.patch.dict(parquet_io.WRITER_PROFILES['fast-read'], row_group_size=16):
+        index, output_path, consolidated_dir, _ = write_both(tmp)
+
+        assert list(index) == sorted(STOCK_ROWS)
+        assert read_stock_index(output_path) == {stock: tuple(bounds) for stock, bounds in index.items()}
+
+        metadata = parquet_io.pq.read_metadata(output_path)
+        ranges = sorted(index.values())
+        assert ranges[0][0] == 0 and ranges[-1][1] == metadata.num_row_groups
+        assert all(previous[1] == current[0] for previous, current in zip(ranges, ranges[1:]))
+        assert None not in row_group_types(metadata)
+
+        table = parquet_io.pq.ParquetFile(output_path)
+        for stock, (start, end) in index.items():
+            if STOCK_ROWS[stock] > 4 * 16:
+                assert end - start > 2
+            for row_group in range(start, end):
+                codes = table.read_row_group(row_group, columns=['StockCode']).column('StockCode').to_pylist()
+                assert set(codes) == {stock}
+
+        for stock in STOCK_ROWS:
+            assert find_consolidated_stock(consolidated_dir, DATE, stock) == output_path
+        assert find_consolidated_stock(consolidated_dir, DATE, '9999') is None
+
+
+def test_read_consolidated_stock_matches_stock_files():
+    """每支股票由合併檔讀出的資料（全部 / 成交 / 五檔、欄位投影、整數 tick）與股票檔案相同"""
+    for price_ticks in (False, True):
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.dict(parquet_io.WRITER_PROFILES['fast-read'], row_group_size=16):
+            _, output_path, _, stock_dir = write_both(tmp, price_ticks=price_ticks)
+
+            for stock in STOCK_ROWS:
+                stock_path = stock_dir / f'{stock}.parquet'
+                pd.testing.assert_frame_equal(
+                    read_consolidated_stock(output_path, stock, price_ticks=price_ticks),
+                    read_decoded_frame(stock_path, price_ticks=price_ticks))
+                for data_type, columns in (('Trade', TRADE_COLUMNS), ('Depth', DEPTH_COLUMNS), ('Trade', None)):
+                    pd.testing.assert_frame_equal(
+                        read_consolidated_stock(output_path, stock, data_type, columns, price_ticks=price_ticks),
+                        read_quote_rows(stock_path, data_type, columns, price_ticks=price_ticks))
+
+            missing = read_consolidated_stock(output_path, '9999', 'Trade', TRADE_COLUMNS)
+            assert missing.empty and list(missing.columns) == TRADE_COLUMNS
+
+
+if __name__ == '__main__':
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_') and callable(value)]
+    for test in tests:
+        test()
+        print(f"通過: {test.__name__}")
+    print(f"全部 {len(tests)} 項測試通過")
@@ -0,0 +1,126 @@
+"""
+測試五檔差分編碼（utils/depth_codec.py）
+encode_depth_history → decode_depth_history 必須還原出與完整格式 depth_history 相同的內容
+
+執行方式:
+    python test_depth_codec.py
+    python -m pytest test_depth_codec.py
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+
+from utils.depth_codec import encode_depth_history, decode_depth_history
+from utils.price_ticks import to_price_ticks
+from data_convert import prepare_depth_history, payload_times
+
+
+def make_depth_frame(books):
+    """
+    由 [(買盤 [(價, 量), ...], 賣盤 [(價, 量), ...]), ...] 建立 Depth 資料（每筆間隔 1 秒，缺少的檔位為 NaN）
+    """
+    rows = []
+    start = pd.Timestamp('2025-10-31 09:00:00')
+    for i, (bids, asks) in enumerate(books):
+        row = {'Type': 'Depth', 'Datetime': start + pd.Timedelta(seconds=i)}
+        for side, levels in (('Bid', bids), ('Ask', asks)):
+            for level in range(1, 6):
+                price, volume = levels[level - 1] if level <= len(levels) else (np.nan, np.nan)
+                row[f'{side}{level}_Price'] = price
+                row[f'{side}{level}_Volume'] = volume
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+BASE_BIDS = [(100.0, 10), (99.5, 20), (99.0, 30), (98.5, 40), (98.0, 50)]
+BASE_ASKS = [(100.5, 11), (101.0, 21), (101.5, 31), (102.0, 41), (102.5, 51)]
+
+
+def sample_books():
+    """涵蓋單一檔位變動、檔位消失 / 恢復、價格移動與無變動的快照序列"""
+    books = [(list(BASE_BIDS), list(BASE_ASKS))]
+
+    bids, asks = list(BASE_BIDS), list(BASE_ASKS)
+    bids[1] = (99.5, 25)                      # 只有買2數量變動
+    books.append((list(bids), list(asks)))
+
+    books.append((list(bids), list(asks)))    # 無變動
+
+    asks = asks[:3]                           # 賣4、賣5 消失
+    books.append((list(bids), list(asks)))
+
+    bids = [(100.5, 5)] + bids[:4]            # 價格上移，買盤全部位移
+    books.append((list(bids), list(asks)))
+
+    asks = list(BASE_ASKS)                    # 賣4、賣5 恢復
+    books.append((list(bids), list(asks)))
+
+    books.append(([], list(asks)))            # 買盤全部消失
+    books.append((list(BASE_BIDS), list(BASE_ASKS)))
+    return books
+
+
+def round_trip(depth_df, keyframe_interval, price_ticks=False):
+    """返回 (完整格式, 解碼後的差分格式, 差分編碼結果)"""
+    full = prepare_depth_history(depth_df, encoding='full', price_ticks=price_ticks)
+    timestamps = payload_times(depth_df['Datetime'], 'string')
+    encoded = encode_depth_history(depth_df, timestamps, keyframe_interval=keyframe_interval,
+                                   price_ticks=price_ticks)
+    return full, decode_depth_history(encoded), encoded
+
+
+def test_round_trip_across_keyframe_boundary():
+    """間隔 3：第 0、3、6 筆為完整快照，其餘為差分；各種間隔都須還原出相同內容"""
+    depth_df = make_depth_frame(sample_books())
+    for interval in (1, 2, 3, len(depth_df), 100):
+        full, decoded, encoded = round_trip(depth_df, interval)
+        assert decoded == full, f'keyframe_interval={interval}'
+        assert len(encoded['keyframes']) == (len(depth_df) + interval - 1) // interval
+        assert all(encoded['deltas'][i] == [] for i in range(0, len(depth_df), interval))
+
+
+def test_single_level_change():
+    """只有一檔變動時差分只有一筆 [side, level, price, volume]"""
+    depth_df = make_depth_frame(sample_books()[:3])
+    full, decoded, encoded = round_trip(depth_df, keyframe_interval=100)
+    assert decoded == full
+    assert encoded['deltas'][1] == [[0, 1, 99.5, 25]]
+    assert encoded['deltas'][2] == []
+
+
+def test_level_removed():
+    """檔位消失時差分的價量為 None，解碼後不出現在 bids / asks"""
+    depth_df = make_depth_frame(sample_books()[2:4])
+    full, decoded, encoded = round_trip(depth_df, keyframe_interval=100)
+    assert decoded == full
+    assert encoded['deltas'][1] == [[1, 3, None, None], [1, 4, None, None]]
+    assert len(decoded[1]['asks']) == 3
+
+
+def test_price_ticks_round_trip():
+    """整數 tick 價格同樣可還原"""
+    depth_df = to_price_ticks(make_depth_frame(sample_books()))
+    full, decoded, _ = round_trip(depth_df, keyframe_interval=3, price_ticks=True)
+    assert decoded == full
+    assert full[0]['bids'][0] == {'price': 1000000, 'volume': 10}
+
+
+def test_empty_input():
+    """沒有 Depth 資料時編碼與解碼皆為空"""
+    depth_df = make_depth_frame([]).reindex(columns=['Type', 'Datetime'])
+    encoded = encode_depth_history(depth_df, [])
+    assert encoded['timestamps'] == [] and encoded['keyframes'] == [] and encoded['deltas'] == []
+    assert decode_depth_history(encoded) == []
+    assert prepare_depth_history(depth_df) == []
+
+
+if __name__ == '__main__':
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_') and callable(value)]
+    for test in tests:
+        test()
+        print(f"通過: {test.__name__}")
+    print(f"全部 {len(tests)} 項測試通過")
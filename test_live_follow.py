@@ -0,0 +1,194 @@
+"""
+測試盤中追蹤模式（batch_decode --follow）的續傳
+Quote 檔案分次增長（含寫到一半的最後一行），在寫入分段檔後、保存 checkpoint 前中斷再重啟，
+合併後的解碼檔案必須與一次解碼整個檔案的結果完全相同（不重複、不遺漏）
+
+執行方式:
+    python test_live_follow.py
+    python -m pytest test_live_follow.py
+"""
+import functools
+import logging
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+
+import batch_decode
+from utils.tail_reader import QuoteFileTail, load_checkpoint
+from utils.parquet_io import live_segments, live_segment_dir, read_decoded_frame, read_decoded_metadata
+
+DATE = '20251031'
+LIMIT_UP = {DATE: {'1101', '3105'}}
+STOCKS = {'TSE': ['1101', '1102'], 'OTC': ['3105', '3106']}  # 1102、3106 不是目標股票
+LOGGER = logging.getLogger('test_live_follow')
+
+
+def make_quote_bytes(market, count=600, seed=0):
+    """產生一個市場的 Quote 檔案內容（成交與五檔交錯，時間遞增，最後一欄為序號）"""
+    rng = random.Random(f'{market}-{seed}')
+    lines = []
+    for seq in range(1, count + 1):
+        stock = rng.choice(STOCKS[market])
+        timestamp = 90000000000 + seq * 250000 + rng.randrange(1000)
+        price = 500000 + rng.randrange(-20, 20) * 500
+        if rng.random() < 0.4:
+            lines.append(f'Trade,{stock},{timestamp},1,{price},{rng.randrange(1, 99)},0,{seq}\n')
+        else:
+            bids = ','.join(f'{price - 500 * level}*{rng.randrange(1, 300)}' for level in range(1, 6))
+            asks = ','.join(f'{price + 500 * level}*{rng.randrange(1, 300)}' for level in range(1, 6))
+            lines.append(f'Depth,{stock},{timestamp},BID:5,{bids},ASK:5,{asks},{seq}\n')
+    return ''.join(lines).encode('utf-8')
+
+
+def write_prefix(data_dir, contents, fraction):
+    """各市場的 Quote 檔案寫到指定比例（通常停在一行的中間）"""
+    for market, data in contents.items():
+        (data_dir / f'{market}Quote.{DATE}').write_bytes(data[:int(len(data) * fraction)])
+
+
+def follow(data_dir, output_dir, checkpoint_dir, max_chunk_bytes=4096, **patches):
+    """以小區塊讀取執行一次追蹤（無新資料即結束）"""
+    tail = functools.partial(QuoteFileTail, max_chunk_bytes=max_chunk_bytes)
+    with mock.patch.multiple(batch_decode, LIVE_CHECKPOINT_DIR=checkpoint_dir, QuoteFileTail=tail, **patches):
+        return batch_decode.follow_date(DATE, LIMIT_UP, data_dir, output_dir, LOGGER, until='0000')
+
+
+def batch_reference(data_dir, root):
+    """一次解碼完整檔案的結果"""
+    output_dir = root / 'reference'
+    batch_decode.process_date(DATE, LIMIT_UP, data_dir, output_dir, LOGGER)
+    return output_dir / DATE
+
+
+def test_tail_holds_back_partial_line():
+    """最後一行寫到一半時不讀取，offset 停在最後一個換行之後，補完後整行讀出"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'quote.txt'
+        path.write_bytes(b'Trade,1101\nDepth,11')
+        tail = QuoteFileTail(path)
+        assert [line for _, line in tail.read_new_lines()] == ['Trade,1101\n']
+        assert tail.offset == 11
+        assert tail.read_new_lines() == []
+
+        path.write_bytes(b'Trade,1101\nDepth,1101\n')
+        assert tail.read_new_lines() == [(22, 'Depth,1101\n')]
+        assert tail.offset == 22
+
+
+def test_resume_after_crash_before_checkpoint():
+    """
+    寫入分段檔後、保存 checkpoint 前當機：重啟時依分段檔 metadata 的位移略過已寫入的資料行，
+    批次編號接續；結束時合併回主檔，結果與一次解碼相同
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        data_dir, output_dir, checkpoint_dir = root / 'raw', root / 'decoded', root / 'checkpoints'
+        data_dir.mkdir()
+        checkpoint_dir.mkdir()
+        contents = {market: make_quote_bytes(market) for market in STOCKS}
+        checkpoint_file = checkpoint_dir / f'{DATE}.json'
+
+        # 第一段：寫入 3 次 checkpoint 後，第 4 次保存前當機（分段檔已寫入）
+        write_prefix(data_dir, contents, 0.37)
+        real_save = batch_decode.save_checkpoint
+        calls = []
+
+        def crashing_save(path, offsets):
+            calls.append(dict(offsets))
+            if len(calls) > 3:
+                raise RuntimeError('模擬當機')
+            real_save(path, offsets)
+
+        try:
+            follow(data_dir, output_dir, checkpoint_dir, save_checkpoint=crashing_save)
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError('應在保存 checkpoint 時中斷')
+
+        stock_path = output_dir / DATE / '1101.parquet'
+        segments_before = live_segments(stock_path)
+        assert segments_before, '當機後應留有未合併的分段檔'
+        assert load_checkpoint(checkpoint_file) == calls[2], 'checkpoint 停在當機前'
+
+        # 第二段：檔案繼續增長（仍停在行中間），重啟後批次編號接續，結束時合併
+        write_prefix(data_dir, contents, 0.71)
+        compacted = {}
+        real_compact = batch_decode.compact_live_segments
+
+        def recording_compact(path, *args):
+            compacted[Path(path).stem] = live_segments(path)
+            return real_compact(path, *args)
+
+        follow(data_dir, output_dir, checkpoint_dir, compact_live_segments=recording_compact)
+        resumed = compacted['1101']
+        assert resumed[0][0] == segments_before[0][0]
+        assert all(first == previous[1] + 1 for previous, (first, _, _) in zip(resumed, resumed[1:])), \
+            '批次編號接續，不重複也不跳號'
+        assert resumed[-1][1] > segments_before[-1][1]
+        assert not live_segment_dir(stock_path).exists()
+
+        for market, offset in load_checkpoint(checkpoint_file).items():
+            written = contents[market][:int(len(contents[market]) * 0.71)]
+            assert written[offset - 1:offset] == b'\n', '位移必須停在完整資料行之後'
+            assert b'\n' not in written[offset:], '完整資料行都已讀取'
+
+        # 第三段：檔案寫完，續傳到結尾
+        write_prefix(data_dir, contents, 1.0)
+        follow(data_dir, output_dir, checkpoint_dir)
+
+        reference_dir = batch_reference(data_dir, root)
+        for reference in sorted(reference_dir.glob('*.parquet')):
+            result = output_dir / DATE / reference.name
+            pd.testing.assert_frame_equal(read_decoded_frame(result), read_decoded_frame(reference))
+            assert not live_segment_dir(result).exists()
+            metadata = read_decoded_metadata(result)
+            assert metadata['live_batch'] > 0 and metadata['live_offsets']
+        assert sorted(p.name for p in (output_dir / DATE).glob('*.parquet')) == ['1101.parquet', '3105.parquet']
+
+
+def test_interrupt_compacts_on_exit():
+    """收到中斷（Ctrl+C）時仍將分段檔合併回主檔；checkpoint 落後也不會重複寫入"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        data_dir, output_dir, checkpoint_dir = root / 'raw', root / 'decoded', root / 'checkpoints'
+        data_dir.mkdir()
+        checkpoint_dir.mkdir()
+        contents = {market: make_quote_bytes(market, seed=1) for market in STOCKS}
+
+        write_prefix(data_dir, contents, 0.5)
+        real_save = batch_decode.save_checkpoint
+        calls = []
+
+        def interrupted_save(path, offsets):
+            calls.append(dict(offsets))
+            if len(calls) == 5:
+                raise KeyboardInterrupt
+            real_save(path, offsets)
+
+        follow(data_dir, output_dir, checkpoint_dir, save_checkpoint=interrupted_save)
+        assert len(calls) == 5
+        assert not live_segment_dir(output_dir / DATE / '1101.parquet').exists()
+
+        write_prefix(data_dir, contents, 1.0)
+        follow(data_dir, output_dir, checkpoint_dir)
+
+        reference_dir = batch_reference(data_dir, root)
+        for reference in sorted(reference_dir.glob('*.parquet')):
+            pd.testing.assert_frame_equal(read_decoded_frame(output_dir / DATE / reference.name),
+                                          read_decoded_frame(reference))
+
+
+if __name__ == '__main__':
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_') and callable(value)]
+    for test in tests:
+        test()
+        print(f"通過: {test.__name__}")
+    print(f"全部 {len(tests)} 項測試通過")
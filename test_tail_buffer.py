@@ -0,0 +1,143 @@
+"""
+測試伺服器的盤中緩衝（server/python/parquet_server.py 的 StockTailBuffer，/api/since）
+盤中追蹤模式逐批寫入分段檔時，依序號或時間輪詢，每筆事件只回傳一次，
+統計與 /api/data 對整個檔案重新計算的結果相同
+
+執行方式:
+    python test_tail_buffer.py
+    python -m pytest test_tail_buffer.py
+"""
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+sys.path.insert(0, os.path.join(ROOT, 'server', 'python'))
+
+import parquet_server
+from utils.data_loader import parse_quote_line
+from utils.parquet_io import compact_live_segments, live_segments, write_decoded_frame, write_live_segment
+
+DATE = '20251031'
+STOCK = '1101'
+
+
+def make_batches(count, size=15, start_seq=1, start_us=0, seed=0):
+    """產生 count 個批次的解析記錄（成交與五檔交錯，時間遞增）"""
+    rng = random.Random(seed)
+    batches = []
+    seq = start_seq
+    for _ in range(count):
+        records = []
+        for _ in range(size):
+            timestamp = 90000000000 + start_us + seq * 100000
+            price = 500000 + rng.randrange(-10, 10) * 500
+            if rng.random() < 0.5:
+                line = f'Trade,{STOCK},{timestamp},1,{price},{rng.randrange(1, 99)},0,{seq}'
+            else:
+                bids = ','.join(f'{price - 500 * level}*{rng.randrange(1, 300)}' for level in range(1, 6))
+                asks = ','.join(f'{price + 500 * level}*{rng.randrange(1, 300)}' for level in range(1, 6))
+                line = f'Depth,{STOCK},{timestamp},BID:5,{bids},ASK:5,{asks},{seq}'
+            records.append(parse_quote_line(line, {STOCK}, DATE)[2])
+            seq += 1
+        batches.append(pd.DataFrame(records))
+    return batches
+
+
+def write_batch(path, batch, df):
+    """與 batch_decode.append_live_records 相同：第 0 批寫成主檔，之後寫成分段檔"""
+    offsets = {'TSE': (batch + 1) * 1000}
+    if batch == 0:
+        write_decoded_frame(df, path, metadata={'live_offsets': offsets, 'live_batch': 0})
+    else:
+        write_live_segment(df, path, batch, offsets)
+
+
+def event_keys(response):
+    """回應中的事件（序列化後比對，確保每筆只出現一次）"""
+    return [json.dumps(event, sort_keys=True, default=str) for event in response['trades'] + response['depth']]
+
+
+def assert_stats_match_full_recompute(buffer, path):
+    expected = parquet_server.convert_parquet_to_json(str(path))['stats']
+    actual = buffer.since(len(buffer.events))['stats']
+    assert set(actual) == set(expected)
+    for key, value in expected.items():
+        assert math.isclose(actual[key], value, rel_tol=1e-12, abs_tol=1e-9), (key, actual[key], value)
+
+
+def test_poll_by_seq_returns_each_event_once():
+    """每寫入一批就以上次的序號輪詢：只回傳新事件，合併（含逐層合併與結束時合併）不重複回傳"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / f'{STOCK}.parquet'
+        batches = make_batches(20)
+        buffer = parquet_server.StockTailBuffer(str(path))
+
+        seq = 0
+        received = []
+        for batch, df in enumerate(batches):
+            write_batch(path, batch, df)
+            response = buffer.since(seq)
+            new_events = event_keys(response)
+            assert len(new_events) == len(df) and response['seq'] == seq + len(df)
+            received += new_events
+            seq = response['seq']
+
+        assert any(last > first for first, last, _ in live_segments(path)), '應已發生分段檔合併'
+        assert event_keys(buffer.since(seq)) == []
+
+        # 全部事件只出現一次，且與重新建立的緩衝一致
+        fresh = parquet_server.StockTailBuffer(str(path)).since(0)
+        assert len(received) == sum(len(df) for df in batches) == fresh['seq']
+        assert sorted(received) == sorted(event_keys(fresh))
+        assert_stats_match_full_recompute(buffer, path)
+
+        # 結束時合併回主檔：已讀過的批次不重新讀取，也不產生新事件
+        assert compact_live_segments(path) > 0
+        response = buffer.since(seq)
+        assert response['seq'] == seq and event_keys(response) == []
+        assert_stats_match_full_recompute(buffer, path)
+
+
+def test_late_batch_and_poll_by_time():
+    """含較早時間的晚到批次只回傳一次；依時間輪詢返回所有時間晚於指定值的事件"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / f'{STOCK}.parquet'
+        batches = make_batches(4, start_us=60_000_000)
+        for batch, df in enumerate(batches):
+            write_batch(path, batch, df)
+        buffer = parquet_server.StockTailBuffer(str(path))
+        seq = buffer.since(0)['seq']
+
+        since_us = int(buffer.times_us[len(buffer.times_us) // 2])
+        by_time = buffer.since(since_us=since_us)
+        assert len(event_keys(by_time)) == sum(1 for time_us in buffer.times_us if time_us > since_us)
+
+        # 晚到的批次：時間早於已讀取的所有資料
+        late = make_batches(1, size=6, start_seq=1000, start_us=0, seed=1)[0]
+        write_batch(path, len(batches), late)
+        response = buffer.since(seq)
+        assert len(event_keys(response)) == len(late) and response['seq'] == seq + len(late)
+        assert event_keys(buffer.since(response['seq'])) == []
+
+        # 依時間輪詢：times_us 不再遞增，仍返回所有時間晚於指定值的事件（含晚到批次）
+        for since_us in (0, buffer.times_us[0], max(buffer.times_us) - 1, max(buffer.times_us)):
+            expected = [event for event in buffer.events if event[0] > since_us]
+            assert len(event_keys(buffer.since(since_us=since_us))) == len(expected)
+        everything = event_keys(buffer.since(since_us=-1))
+        assert len(everything) == len(set(everything)) == response['seq']
+
+
+if __name__ == '__main__':
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_') and callable(value)]
+    for test in tests:
+        test()
+        print(f"通過: {test.__name__}")
+    print(f"全部 {len(tests)} 項測試通過")
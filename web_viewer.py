@@ -1,7 +1,11 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, g, Response
+from flask.json.provider import DefaultJSONProvider
+import numpy as np
 import pandas as pd
 import os
 import glob
+import sys
+import time
 from datetime import datetime
 
 app = Flask(__name__)
@@ -10,6 +14,51 @@ app = Flask(__name__)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, 'data', 'processed_data')
 
+# 共用工具位於 scripts/utils
+sys.path.insert(0, os.path.join(BASE_DIR, 'scripts'))
+from utils.depth_codec import encode_depth_history
+from utils.parquet_io import TRADE_COLUMNS, DEPTH_COLUMNS, read_quote_rows, read_decoded_frame
+from utils.hot_tier import ArrowHotTier, hot_tier_max_mb
+from utils.json_io import encode_json, json_default
+from utils.logger import StageTimer
+from utils.timeline import time_ordered
+from utils.server_metrics import (PROMETHEUS_CONTENT_TYPE, ServerMetrics, format_server_timing,
+                                  is_admin_request, profile_call, server_timing_enabled)
+
+class NumpyJSONProvider(DefaultJSONProvider):
+    """
+    jsonify 改用 utils.json_io 序列化：payload 中的 NumPy 陣列直接寫成 JSON，鍵排序與跳脫同 Flask 預設
+
+    只覆寫公開的 dumps：緊湊格式（jsonify 非 debug 模式）走 encode_json，
+    其他格式（debug 模式的縮排等）仍由標準 json 產生
+    """
+
+    @staticmethod
+    def default(o):
+        try:
+            return json_default(o)
+        except TypeError:
+            return DefaultJSONProvider.default(o)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs.get('separators') != (',', ':') or set(kwargs) - {'separators', 'sort_keys', 'ensure_ascii'}:
+            return super().dumps(obj, **kwargs)
+        return encode_json(obj, sort_keys=kwargs.get('sort_keys', self.sort_keys),
+                           ensure_ascii=kwargs.get('ensure_ascii', self.ensure_ascii)).decode('utf-8')
+
+app.json = NumpyJSONProvider(app)
+
+# 請求數、各路由/階段延遲、回應大小與記憶體指標（/metrics）
+METRICS = ServerMetrics()
+
+# Arrow IPC 熱層（環境變數 QUOTE_HOT_TIER_MB > 0 時啟用，見 utils/hot_tier.py）
+HOT_TIER = ArrowHotTier(max_bytes=int(hot_tier_max_mb() * 1024 * 1024)) if hot_tier_max_mb() > 0 else None
+if HOT_TIER is not None:
+    METRICS.register_cache('arrow_hot_tier', HOT_TIER)
+
+# 回應是否附加 Server-Timing 標頭（環境變數 QUOTE_SERVER_TIMING=1 時啟用；各階段耗時屬內部資訊，預設關閉）
+SERVER_TIMING = server_timing_enabled()
+
 def get_available_dates():
     """獲取所有可用的日期"""
     if not os.path.exists(DATA_DIR):
@@ -36,15 +85,24 @@ def get_available_stocks(date):
 
     return sorted(stocks)
 
-def load_stock_data(date, stock_code):
-    """載入股票資料"""
+def load_stock_data(date, stock_code, data_type=None, columns=None):
+    """
+    載入股票資料
+
+    指定 data_type（'Trade' / 'Depth'）時只讀取該類型的 row group，
+    columns 為欄位投影（例如走勢圖與統計不需要 20 個五檔欄位）；
+    啟用熱層時改由記憶體映射的 Arrow IPC 讀取
+    """
     file_path = os.path.join(DATA_DIR, date, f"{stock_code}.parquet")
     if not os.path.exists(file_path):
         return None
 
     try:
-        df = pd.read_parquet(file_path)
-        return df
+        if data_type is None:
+            return read_decoded_frame(file_path, columns=columns)
+        if HOT_TIER is not None:
+            return HOT_TIER.read_quote_rows(file_path, data_type, columns)
+        return read_quote_rows(file_path, data_type, columns)
     except Exception as e:
         print(f"載入資料錯誤: {e}")
         return None
@@ -65,7 +123,7 @@ def prepare_chart_data(df):
         return None
 
     # 按時間排序
-    trade_df = trade_df.sort_values('Datetime')
+    trade_df = time_ordered(trade_df)
 
     # 將 Datetime 轉換為 datetime 類型（如果還不是）
     if not pd.api.types.is_datetime64_any_dtype(trade_df['Datetime']):
@@ -89,34 +147,25 @@ def prepare_chart_data(df):
         return None
 
     # 計算 VWAP（成交量加權平均價）
-    # 針對每一筆 tick 計算累積 VWAP
-    vwap_values = []
-    cumulative_pv = 0  # 累積的 價格*成交量
-    cumulative_volume = 0  # 累積成交量
-
-    for idx, row in trade_df_market.iterrows():
-        price = row['Price'] if pd.notna(row['Price']) else 0
-        volume = row['FilteredVolume'] if pd.notna(row['FilteredVolume']) else 0
+    # 針對每一筆 tick 計算累積 VWAP（累積量為 0 時以當筆價格代替）
+    prices = trade_df_market['Price'].fillna(0).to_numpy()
+    volumes = trade_df_market['FilteredVolume'].fillna(0).to_numpy()
 
-        cumulative_pv += price * volume
-        cumulative_volume += volume
-
-        if cumulative_volume > 0:
-            vwap = cumulative_pv / cumulative_volume
-        else:
-            vwap = price
-
-        vwap_values.append(vwap)
+    cumulative_pv = (prices * volumes).cumsum()  # 累積的 價格*成交量
+    cumulative_volume = volumes.cumsum()  # 累積成交量
+    has_volume = cumulative_volume > 0
+    vwap_values = np.where(has_volume, cumulative_pv / np.where(has_volume, cumulative_volume, 1), prices)
 
     # 準備時間序列資料（包含所有 tick）
     # 前端會根據這些資料顯示：
     # 1. 完整視圖：每分鐘的收盤價
     # 2. 回放模式：顯示當前時間之前的所有 tick（包括分鐘內跳動）
+    # 數值欄位保留 NumPy 陣列，由 utils.json_io 直接序列化
     chart_data = {
         'timestamps': trade_df_market['Datetime'].astype(str).tolist(),
-        'prices': trade_df_market['Price'].fillna(0).tolist(),
-        'volumes': trade_df_market['FilteredVolume'].fillna(0).tolist(),
-        'total_volumes': trade_df_market['TotalVolume'].fillna(0).tolist(),
+        'prices': prices,
+        'volumes': volumes,
+        'total_volumes': trade_df_market['TotalVolume'].fillna(0).to_numpy(),
         'vwap': vwap_values  # VWAP 資料
     }
 
@@ -134,7 +183,7 @@ def prepare_depth_data(df):
         return None
 
     # 取最新一筆
-    depth_df = depth_df.sort_values('Datetime', ascending=False)
+    depth_df = time_ordered(depth_df, ascending=False)
     latest = depth_df.iloc[0]
 
     # 準備買賣五檔
@@ -171,8 +220,8 @@ def prepare_depth_data(df):
         'timestamp': str(latest['Datetime']) if 'Datetime' in latest else ''
     }
 
-def prepare_depth_history(df):
-    """準備五檔歷史資料（所有五檔變化，用於回放）"""
+def prepare_depth_history(df, encoding='full'):
+    """準備五檔歷史資料（所有五檔變化，用於回放；encoding='delta' 時輸出差分編碼）"""
     if df is None or df.empty:
         return []
 
@@ -194,7 +243,11 @@ def prepare_depth_history(df):
     depth_df = depth_df[depth_df['Datetime'].dt.hour >= 9].copy()
 
     # 按時間排序（時間正序：09:00 -> 13:30）
-    depth_df = depth_df.sort_values('Datetime')
+    depth_df = time_ordered(depth_df)
+
+    # 差分編碼：定期完整快照 + 變動檔位
+    if encoding == 'delta':
+        return encode_depth_history(depth_df, [str(ts) for ts in depth_df['Datetime']])
 
     history = []
     for _, row in depth_df.iterrows():
@@ -257,12 +310,12 @@ def prepare_trade_details(df, limit=None):
         if not pd.api.types.is_datetime64_any_dtype(depth_df['Datetime']):
             depth_df['Datetime'] = pd.to_datetime(depth_df['Datetime'])
         depth_df = depth_df[depth_df['Datetime'].dt.hour >= 9].copy()
-        depth_df = depth_df.sort_values('Datetime')
+        depth_df = time_ordered(depth_df)
     else:
         depth_df = pd.DataFrame()
 
     # 按時間降序排列（最新的在前，13:30 -> 09:00）
-    trade_df = trade_df.sort_values('Datetime', ascending=False)
+    trade_df = time_ordered(trade_df, ascending=False)
 
     # 如果有 limit，只取前 N 筆；否則返回所有資料
     if limit is not None and limit > 0:
@@ -276,8 +329,8 @@ def prepare_trade_details(df, limit=None):
         # 判斷內外盤：找到該成交時間之前最近的五檔資料
         inner_outer = '–'  # 預設值
         if not depth_df.empty and trade_price > 0:
-            # 找到時間 <= trade_time 的最後一筆 Depth
-            prior_depths = depth_df[depth_df['Datetime'] <= trade_time]
+            # 找到時間 < trade_time 的最後一筆 Depth（同一時間的五檔排在成交之後，見 utils/timeline.py）
+            prior_depths = depth_df[depth_df['Datetime'] < trade_time]
             if not prior_depths.empty:
                 closest_depth = prior_depths.iloc[-1]
 
@@ -375,6 +428,60 @@ def calculate_statistics(df):
 
     return stats
 
+@app.before_request
+def start_request_timer():
+    """
+    建立請求計時器；管理者加上 ?profile=1 時改為返回該請求的 cProfile 報告
+    """
+    g.timer = StageTimer()
+    g.request_start = time.perf_counter()
+
+    if request.args.get('profile') == '1' and request.endpoint in app.view_functions:
+        if not is_admin_request(request.headers, request.remote_addr):
+            return jsonify({'error': '需要管理者權限'}), 403
+
+        report = profile_call(app.view_functions[request.endpoint], **(request.view_args or {}))
+        if report is None:
+            return jsonify({'error': '已有其他請求正在剖析'}), 429
+        return Response(report, mimetype='text/plain', headers={'Cache-Control': 'no-store'})
+
+    if request.endpoint != 'metrics':
+        METRICS.start_request()
+        g.metrics_pending = True
+
+def _finish_request_metrics(status, response_bytes=None):
+    """請求結束時累計指標（每個請求只累計一次）"""
+    if not getattr(g, 'metrics_pending', False):
+        return
+    g.metrics_pending = False
+    route = request.url_rule.rule if request.url_rule else 'static'
+    METRICS.finish_request(route, status, g.timer.stages, time.perf_counter() - g.request_start,
+                           response_bytes)
+
+@app.after_request
+def add_server_timing(response):
+    """請求數、延遲與回應大小累計到 METRICS；啟用 SERVER_TIMING 時各階段耗時寫入 Server-Timing 標頭"""
+    timer = getattr(g, 'timer', None)
+    if timer is None:
+        return response
+
+    if SERVER_TIMING:
+        total = time.perf_counter() - g.request_start
+        response.headers['Server-Timing'] = format_server_timing(timer.stages, total)
+    _finish_request_metrics(response.status_code, response.calculate_content_length())
+    return response
+
+@app.teardown_request
+def finish_failed_request(error):
+    """未處理的例外不會經過 after_request，仍需累計為 500 並減少進行中請求數"""
+    _finish_request_metrics(500)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus 指標"""
+    return Response(METRICS.render(), content_type=PROMETHEUS_CONTENT_TYPE,
+                    headers={'Cache-Control': 'no-cache'})
+
 @app.route('/')
 def index():
     """首頁"""
@@ -395,43 +502,56 @@ def api_stocks(date):
 @app.route('/api/data/<date>/<stock_code>')
 def api_data(date, stock_code):
     """API: 獲取股票完整資料"""
-    df = load_stock_data(date, stock_code)
+    timer = g.timer
+    with timer.stage('read'):
+        trade_df = load_stock_data(date, stock_code, 'Trade', TRADE_COLUMNS)
+        depth_df = load_stock_data(date, stock_code, 'Depth', DEPTH_COLUMNS)
 
-    if df is None:
+    if trade_df is None or depth_df is None:
         return jsonify({'error': '找不到資料'}), 404
-
-    # 準備各種資料
-    chart_data = prepare_chart_data(df)
-    depth_data = prepare_depth_data(df)  # 最新一筆五檔（用於靜態顯示）
-    depth_history = prepare_depth_history(df)  # 完整五檔時間序列（用於回放）
-    trade_details = prepare_trade_details(df)
-    statistics = calculate_statistics(df)
-
-    return jsonify({
-        'chart': chart_data,
-        'depth': depth_data,
-        'depth_history': depth_history,  # 新增：五檔完整時間序列
-        'trades': trade_details,
-        'stats': statistics,
-        'stock_code': stock_code,
-        'date': date
-    })
+    df = pd.concat([trade_df, depth_df], ignore_index=True)
+
+    # 準備各種資料（走勢圖與統計只用成交資料）
+    with timer.stage('chart'):
+        chart_data = prepare_chart_data(trade_df)
+    with timer.stage('depth'):
+        depth_data = prepare_depth_data(depth_df)  # 最新一筆五檔（用於靜態顯示）
+    depth_encoding = request.args.get('depth', 'full')
+    with timer.stage('depth_history'):
+        depth_history = prepare_depth_history(depth_df, encoding=depth_encoding)  # 完整五檔時間序列（用於回放）
+    with timer.stage('trades'):
+        trade_details = prepare_trade_details(df)
+    with timer.stage('stats'):
+        statistics = calculate_statistics(trade_df)
+
+    with timer.stage('serialize'):
+        return jsonify({
+            'chart': chart_data,
+            'depth': depth_data,
+            'depth_history': depth_history,  # 新增：五檔完整時間序列
+            'trades': trade_details,
+            'stats': statistics,
+            'stock_code': stock_code,
+            'date': date
+        })
 
 @app.route('/api/depth_history/<date>/<stock_code>')
 def api_depth_history(date, stock_code):
     """API: 獲取五檔歷史變化"""
-    df = load_stock_data(date, stock_code)
+    with g.timer.stage('read'):
+        depth_df = load_stock_data(date, stock_code, 'Depth', DEPTH_COLUMNS)
 
-    if df is None:
+    if depth_df is None:
         return jsonify({'error': '找不到資料'}), 404
 
-    depth_df = df[df['Type'] == 'Depth'].copy()
-
     if depth_df.empty:
         return jsonify([])
 
     # 按時間排序
-    depth_df = depth_df.sort_values('Datetime')
+    depth_df = time_ordered(depth_df)
+
+    if request.args.get('depth') == 'delta':
+        return jsonify(encode_depth_history(depth_df, [str(ts) for ts in depth_df['Datetime']]))
 
     history = []
     for _, row in depth_df.iterrows():